@@ -0,0 +1,349 @@
+import os
+import re
+import json
+import mmap
+import struct
+import hashlib
+from ColouredText import *
+import Profiling
+
+
+### CONSTANTS ###
+COMBINED_MANIFEST_FILE = ".combined_manifest.json"
+
+# Bump this whenever the layout of the combined files or their manifest changes, so the combined
+# files are rewritten from scratch.
+COMBINED_FORMAT_VERSION = 2
+
+# The combined file is laid out exactly like json.dumps({"sql_migrations": [...]}, indent=4).
+# Written in binary, with the same newlines a text mode file would get.
+COMBINED_NEWLINE = os.linesep.encode()
+COMBINED_HEAD = b'{\n    "sql_migrations": ['.replace(b"\n", COMBINED_NEWLINE)
+COMBINED_TAIL = b'\n    ]\n}'.replace(b"\n", COMBINED_NEWLINE)
+COMBINED_EMPTY = b'{\n    "sql_migrations": []\n}'.replace(b"\n", COMBINED_NEWLINE)
+COMBINED_COPY_CHUNK_SIZE = 1024*1024
+
+# The indexed combined file starts with a header, followed by one index entry per migration and
+# then the migrations themselves as compact JSON. Entries are ordered by migration index, and
+# point at their migration relative to the start of the payloads, so payloads can be copied
+# without touching their entries.
+#   Header: magic, format version, migration count, payload start
+#   Entry:  migration index, payload offset, payload length
+COMBINED_INDEX_MAGIC = b"SQLMIGIX"
+COMBINED_INDEX_HEADER = struct.Struct("<8sIIQ")
+COMBINED_INDEX_ENTRY = struct.Struct("<qQQ")
+
+
+
+### CLASSES ###
+class CombinedIndexError(Exception):
+    pass
+
+
+
+### UTILITY FUNCTIONS ###
+def find_sql_migration_files(migrationsFolder: str, fileRegex: str) -> list[str]:
+
+    # Returns the names of SQL migration files, ordered by the migration index in their name (as
+    # written by create_sqlmigration_filename()), so no file has to be parsed to order them.
+    fileNames = []
+    for fileName in os.listdir(migrationsFolder):
+        fileMatch = re.match(fileRegex, fileName)
+        if fileMatch:
+            fileNames.append((int(fileMatch.group(1)), fileName))
+
+    fileNames.sort()
+    return [fileName for _, fileName in fileNames]
+
+
+def hash_file(filePath: str) -> str:
+
+    # Hashes a file in chunks, so memory use doesn't depend on its size
+    fileHash = hashlib.sha256()
+    with open(filePath, "rb") as file:
+        for chunk in iter(lambda: file.read(COMBINED_COPY_CHUNK_SIZE), b""):
+            fileHash.update(chunk)
+
+    return fileHash.hexdigest()
+
+
+def copy_file_bytes(sourcePath: str, targetFile, start: int, length: int):
+
+    # Copies [length] bytes from [start] of a file in chunks
+    with open(sourcePath, "rb") as sourceFile:
+        sourceFile.seek(start)
+        remainingBytes = length
+        while remainingBytes > 0:
+            chunk = sourceFile.read(min(remainingBytes, COMBINED_COPY_CHUNK_SIZE))
+            if len(chunk) == 0:
+                raise IOError(f"'{sourcePath}' is shorter than its manifest says.")
+            targetFile.write(chunk)
+            remainingBytes -= len(chunk)
+
+
+def create_file_entry(filePath: str) -> dict:
+    fileStat = os.stat(filePath)
+    return {
+        "name": os.path.basename(filePath),
+        "size": fileStat.st_size,
+        "mtime": fileStat.st_mtime_ns,
+        "hash": hash_file(filePath)
+    }
+
+
+def is_file_entry_current(migrationsFolder: str, fileEntry: dict) -> bool:
+
+    # Size and mtime rule out most changes cheaply, the hash catches files rewritten within the
+    # filesystem's timestamp resolution
+    filePath = os.path.join(migrationsFolder, fileEntry.get("name", ""))
+    try:
+        fileStat = os.stat(filePath)
+        return (fileStat.st_size == fileEntry.get("size")
+                and fileStat.st_mtime_ns == fileEntry.get("mtime")
+                and hash_file(filePath) == fileEntry.get("hash"))
+    except IOError:
+        return False
+
+
+def is_output_current(filePath: str, size: int, mtime: int) -> bool:
+    try:
+        fileStat = os.stat(filePath)
+        return fileStat.st_size == size and fileStat.st_mtime_ns == mtime
+    except IOError:
+        return False
+
+
+def encode_combined_entry(sqlMigrationDict: dict, isFirst: bool) -> bytes:
+
+    # Gives the bytes json.dumps(..., indent=4) writes for one item of the "sql_migrations" list.
+    # Newlines inside strings are escaped by JSON, so every real newline starts a new line.
+    entryText = ("" if isFirst else ",") + "\n" + json.dumps(sqlMigrationDict, indent=4)
+    return entryText.replace("\n", "\n        ").encode().replace(b"\n", COMBINED_NEWLINE)
+
+
+def encode_index_payload(sqlMigrationDict: dict) -> bytes:
+    return json.dumps(sqlMigrationDict, separators=(",", ":")).encode()
+
+
+def read_index_header(buffer) -> tuple:
+
+    # Returns (migration count, payload start) of an indexed combined file
+    if len(buffer) < COMBINED_INDEX_HEADER.size:
+        raise CombinedIndexError("File is too short to be an indexed combined file.")
+
+    magic, formatVersion, count, payloadStart = COMBINED_INDEX_HEADER.unpack_from(buffer, 0)
+    if magic != COMBINED_INDEX_MAGIC or formatVersion != COMBINED_FORMAT_VERSION:
+        raise CombinedIndexError("File is not an indexed combined file, or was written by another version.")
+
+    if COMBINED_INDEX_HEADER.size + count*COMBINED_INDEX_ENTRY.size > payloadStart or payloadStart > len(buffer):
+        raise CombinedIndexError("Index of the combined file is truncated.")
+
+    return (count, payloadStart)
+
+
+def read_index_entry(buffer, position: int) -> tuple:
+    return COMBINED_INDEX_ENTRY.unpack_from(buffer, COMBINED_INDEX_HEADER.size + position*COMBINED_INDEX_ENTRY.size)
+
+
+def read_index_entries(indexPath: str, count: int) -> tuple:
+
+    # Reads the first [count] index entries, without reading any payloads.
+    # Returns a tuple of (payload start, entries).
+    with open(indexPath, "rb") as indexFile:
+        if os.fstat(indexFile.fileno()).st_size == 0:
+            raise CombinedIndexError("File is too short to be an indexed combined file.")
+
+        with mmap.mmap(indexFile.fileno(), 0, access=mmap.ACCESS_READ) as mappedFile:
+            savedCount, payloadStart = read_index_header(mappedFile)
+            if savedCount < count:
+                raise CombinedIndexError(f"'{indexPath}' has fewer migrations than its manifest says.")
+
+            return (payloadStart, [read_index_entry(mappedFile, i) for i in range(count)])
+
+
+def read_manifest(migrationsFolder: str) -> dict:
+    try:
+        with open(os.path.join(migrationsFolder, COMBINED_MANIFEST_FILE), "r") as manifestFile:
+            manifest = json.loads(manifestFile.read())
+    except (IOError, json.JSONDecodeError):
+        return None
+
+    return manifest if type(manifest) is dict and manifest.get("version") == COMBINED_FORMAT_VERSION else None
+
+
+def get_reusable_count(migrationsFolder: str, combinedPath: str, indexPath: str, manifest: dict, fileNames: list[str]) -> int:
+
+    # Returns how many of the files (from the start) are already in the combined files unchanged.
+    # Both combined files must be exactly as they were written.
+    if manifest == None:
+        return 0
+
+    if (not is_output_current(combinedPath, manifest.get("combined_size"), manifest.get("combined_mtime"))
+        or not is_output_current(indexPath, manifest.get("index_size"), manifest.get("index_mtime"))):
+        return 0
+
+    fileEntries = manifest.get("files", [])
+    if len(fileEntries) > len(fileNames):
+        return 0
+
+    for fileEntry, fileName in zip(fileEntries, fileNames):
+        if fileEntry.get("name") != fileName or not is_file_entry_current(migrationsFolder, fileEntry):
+            return 0
+
+    return len(fileEntries)
+
+
+def remove_if_exists(filePath: str):
+    if os.path.exists(filePath):
+        os.remove(filePath)
+
+
+
+### FUNCTIONS ###
+def write_combined_file(migrationsFolder: str, combinedFileName: str, indexFileName: str, fileRegex: str) -> tuple:
+
+    # Writes every SQL migration into the combined JSON file and the indexed combined file, one
+    # migration at a time, so memory use doesn't grow with the history. If the manifest shows the
+    # migrations already in the files are unchanged, their bytes are copied as they are and only
+    # new migrations are encoded.
+    # Each file is replaced atomically, readers see either the old or the new file.
+    # Returns a tuple of (migrations reused, migrations written).
+    # NOTE: Unreadable files are skipped with an error, and the next run rewrites the whole file.
+    combinedPath = os.path.join(migrationsFolder, combinedFileName)
+    indexPath = os.path.join(migrationsFolder, indexFileName)
+    manifestPath = os.path.join(migrationsFolder, COMBINED_MANIFEST_FILE)
+    fileNames = find_sql_migration_files(migrationsFolder, fileRegex)
+
+    manifest = read_manifest(migrationsFolder)
+    reusedCount = get_reusable_count(migrationsFolder, combinedPath, indexPath, manifest, fileNames)
+
+    if reusedCount > 0 and reusedCount == len(fileNames):
+        return (reusedCount, 0)
+
+    try:
+        fileEntries = manifest["files"][:reusedCount] if reusedCount > 0 else []
+        oldPayloadStart, indexEntries = read_index_entries(indexPath, reusedCount) if reusedCount > 0 else (0, [])
+    except (IOError, CombinedIndexError):
+        reusedCount = 0
+        fileEntries = []
+        indexEntries = []
+
+    bodyLength = manifest["body_length"] if reusedCount > 0 else len(COMBINED_HEAD)
+    payloadLength = indexEntries[-1][1] + indexEntries[-1][2] if reusedCount > 0 else 0
+    allRead = True
+
+    try:
+        with open(combinedPath + ".tmp", "wb") as combinedFile, open(indexPath + ".tmp", "wb") as indexFile:
+
+            # Leaves room for an index entry per file, the index is filled in once every file is read
+            payloadStart = COMBINED_INDEX_HEADER.size + len(fileNames)*COMBINED_INDEX_ENTRY.size
+            indexFile.write(bytes(payloadStart))
+
+            # Copies the unchanged start of both files, up to where the JSON list would be closed
+            if reusedCount > 0:
+                copy_file_bytes(combinedPath, combinedFile, 0, bodyLength)
+                copy_file_bytes(indexPath, indexFile, oldPayloadStart, payloadLength)
+            else:
+                combinedFile.write(COMBINED_HEAD)
+
+            for fileName in fileNames[reusedCount:]:
+                filePath = os.path.join(migrationsFolder, fileName)
+                try:
+                    fileEntry = create_file_entry(filePath)
+                    with open(filePath, "r") as file:
+                        sqlMigrationDict = json.loads(file.read())
+                    Profiling.count("files_read")
+                except IOError as err:
+                    print(pad_err(f"Could not open SQL migration file: '{filePath}': {err}"))
+                    allRead = False
+                    continue
+
+                entryBytes = encode_combined_entry(sqlMigrationDict, len(fileEntries) == 0)
+                combinedFile.write(entryBytes)
+                bodyLength += len(entryBytes)
+
+                payloadBytes = encode_index_payload(sqlMigrationDict)
+                indexFile.write(payloadBytes)
+                indexEntries.append((sqlMigrationDict["migrationIndex"], payloadLength, len(payloadBytes)))
+                payloadLength += len(payloadBytes)
+
+                fileEntries.append(fileEntry)
+
+            # An empty list is closed on the same line, like json.dumps() does
+            if len(fileEntries) == 0:
+                combinedFile.seek(0)
+                combinedFile.truncate()
+                combinedFile.write(COMBINED_EMPTY)
+            else:
+                combinedFile.write(COMBINED_TAIL)
+
+            indexFile.seek(0)
+            indexFile.write(COMBINED_INDEX_HEADER.pack(COMBINED_INDEX_MAGIC, COMBINED_FORMAT_VERSION, len(indexEntries), payloadStart))
+            for indexEntry in indexEntries:
+                indexFile.write(COMBINED_INDEX_ENTRY.pack(*indexEntry))
+
+        os.replace(combinedPath + ".tmp", combinedPath)
+        os.replace(indexPath + ".tmp", indexPath)
+
+    except (IOError, json.JSONDecodeError, CombinedIndexError) as err:
+        remove_if_exists(combinedPath + ".tmp")
+        remove_if_exists(indexPath + ".tmp")
+        raise err
+
+    # The manifest is written last. If this is interrupted, the combined files no longer match
+    # the old manifest, and are rewritten from scratch next time.
+    remove_if_exists(manifestPath)
+
+    if allRead and len(fileEntries) > 0:
+        combinedStat = os.stat(combinedPath)
+        indexStat = os.stat(indexPath)
+        newManifest = {
+            "version": COMBINED_FORMAT_VERSION,
+            "combined_size": combinedStat.st_size,
+            "combined_mtime": combinedStat.st_mtime_ns,
+            "index_size": indexStat.st_size,
+            "index_mtime": indexStat.st_mtime_ns,
+            "body_length": bodyLength,
+            "files": fileEntries
+        }
+
+        with open(manifestPath + ".tmp", "w") as manifestFile:
+            manifestFile.write(json.dumps(newManifest))
+        os.replace(manifestPath + ".tmp", manifestPath)
+
+    return (reusedCount, len(fileEntries) - reusedCount)
+
+
+def load_sql_migrations_after(indexFilePath: str, version: int) -> list[dict]:
+
+    # Loads the SQL migrations with an index above [version] from an indexed combined file, for
+    # applications that only need the migrations they haven't applied yet. The file is memory
+    # mapped and the index is binary searched, so only the returned migrations are read and parsed.
+    # Raises IOError if the file can't be opened, and CombinedIndexError if it isn't valid.
+    with open(indexFilePath, "rb") as indexFile:
+
+        # Empty files can't be memory mapped
+        if os.fstat(indexFile.fileno()).st_size == 0:
+            raise CombinedIndexError("File is too short to be an indexed combined file.")
+
+        with mmap.mmap(indexFile.fileno(), 0, access=mmap.ACCESS_READ) as mappedFile:
+            count, payloadStart = read_index_header(mappedFile)
+
+            # Finds the first entry after the version
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if read_index_entry(mappedFile, middle)[0] <= version:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            sqlMigrations = []
+            for position in range(low, count):
+                _, offset, length = read_index_entry(mappedFile, position)
+                if payloadStart + offset + length > len(mappedFile):
+                    raise CombinedIndexError("Payload of the combined file is truncated.")
+
+                sqlMigrations.append(json.loads(mappedFile[payloadStart+offset : payloadStart+offset+length]))
+
+            return sqlMigrations
@@ -1,22 +1,233 @@
+import json
 from ColouredText import *
 from Migrations import *
 from Schema import *
 from UserIO import *
 
 
+### UTILITY FUNCTIONS ###
+def is_hintable(objectType: type) -> bool:
+
+    # Hints name tables and columns. Foreign keys and indexes are only decided by the policy.
+    return objectType == Table or objectType == Column
+
+
+def is_similar(new: IMigratable, old: IMigratable, objectType: type) -> bool:
+
+    # Whether new could be old renamed along with a change to its contents: tables that still have
+    # at least half of the old table's columns, or columns of the same datatype
+    if objectType == Table:
+        newColumnNames = set([column.name for column in new.columns])
+        return len(old.columns) > 0 and len([column for column in old.columns if column.name in newColumnNames]) * 2 >= len(old.columns)
+
+    if objectType == Column:
+        return new.datatype != None and old.datatype != None and new.datatype.upper() == old.datatype.upper()
+
+    return False
+
+
+
+### CLASSES ###
+class AmbiguousMigrationError(Exception):
+    pass
+
+
+
+class MigrationDecisions:
+
+    # Decides whether changed objects are alterations, renames or new objects, by asking the user.
+    # scope is the name of the new table for columns and foreign keys, or None for tables.
+
+    ## Decisions
+    def is_alteration(self, new: IMigratable, objectType: type, scope: str) -> bool:
+        return ask_yes_no(f"Is the {objectType.__name__} '{new.get_key()}' ALTERING '{new.get_key()}'?")
+
+
+    def get_renamed_object(self, new: IMigratable, identicalOld: list[IMigratable], oldDict: dict, newDict: dict,
+                           objectType: type, scope: str, canAskForName: bool) -> IMigratable:
+
+        # Returns the old object that new renames, or None if new is a new object.
+        # identicalOld holds the old objects with the same contents as new, in their original order.
+        for old in identicalOld:
+            if ask_yes_no(f"Is the {objectType.__name__} '{new.get_key()}' RENAMING {objectType.__name__} '{old.get_key()}'?"):
+                return old
+
+        # If rename of an old item - might not even exist.
+        if canAskForName and ask_yes_no(f"Is the {objectType.__name__} '{new.get_key()}' RENAMING a {objectType.__name__}?"):
+
+            givenName = None
+            while not givenName in oldDict:
+                givenName = ask_for_input(f"What is the name of the {objectType.__name__} being renamed?")
+
+            return oldDict[givenName]
+
+        return None
+
+
+    def confirm_save(self, migration: SchemaMigration) -> bool:
+        if not ask_yes_no("Save this migration?"):
+            return False
+
+        if ask_yes_no("Give this migration a name? Use this if you're using a branched repository."):
+            migration.migrationName = ask_for_input("Write a unique name here (alphanumeric chars only, no spaces. Underscore allowed.)")
+
+        return True
+
+
+    def get_unused_hints(self) -> list[str]:
+        return []
+
+
+
+class HintedMigrationDecisions(MigrationDecisions):
+
+    # Decides without asking, for running unattended. Renames and new objects can be declared in a
+    # hints file. Anything not declared follows a fixed policy:
+    #   - An object whose contents changed under the same name is ALTERED.
+    #   - A new name with the same contents as exactly one removed object RENAMES that object.
+    #   - A new name similar to a removed object (see is_similar()) might rename and change it at
+    #     once. Treating it as NEW would drop the old object's data, so it needs a hint.
+    #   - Any other new name is a NEW object.
+    # Anything the policy can't decide on its own raises an AmbiguousMigrationError.
+    hints: dict
+    migrationName: str
+    usedHints: set
+    policyRenames: dict
+
+    ## Initialization
+    def __init__(self, hints: dict = None):
+        hints = hints if hints != None else {}
+        self.migrationName = hints.get("migration_name", None)
+        self.usedHints = set()
+        self.policyRenames = {}
+
+        # Hints are stored by scope: None for tables, the new table name for its columns
+        self.hints = {None: hints.get("tables", {})}
+        for tableName, columnHints in hints.get("columns", {}).items():
+            self.hints[tableName] = columnHints
+
+
+    def from_file(filePath: str) -> u'HintedMigrationDecisions':
+        with open(filePath, "r") as hintsFile:
+            return HintedMigrationDecisions(json.load(hintsFile))
+
+
+    ## Usage
+    def get_hinted_rename(self, new: IMigratable, objectType: type, scope: str) -> str:
+        if not is_hintable(objectType):
+            return None
+
+        renamedKey = self.hints.get(scope, {}).get("renames", {}).get(new.get_key(), None)
+        if renamedKey != None:
+            self.usedHints.add((scope, "renames", new.get_key()))
+        return renamedKey
+
+
+    def is_hinted_new(self, new: IMigratable, objectType: type, scope: str) -> bool:
+        if not is_hintable(objectType) or new.get_key() not in self.hints.get(scope, {}).get("new", []):
+            return False
+
+        self.usedHints.add((scope, "new", new.get_key()))
+        return True
+
+
+    def get_scoped_name(self, key: str, objectType: type, scope: str) -> str:
+        return f"{objectType.__name__} '{scope}.{key}'" if scope != None else f"{objectType.__name__} '{key}'"
+
+
+    ## Decisions
+    def is_alteration(self, new: IMigratable, objectType: type, scope: str) -> bool:
+
+        # Only a hinted rename can make an object with a known name something else
+        return self.get_hinted_rename(new, objectType, scope) == None
+
+
+    def get_renamed_object(self, new: IMigratable, identicalOld: list[IMigratable], oldDict: dict, newDict: dict,
+                           objectType: type, scope: str, canAskForName: bool) -> IMigratable:
+
+        newName = self.get_scoped_name(new.get_key(), objectType, scope)
+
+        renamedKey = self.get_hinted_rename(new, objectType, scope)
+        if renamedKey != None:
+            if renamedKey not in oldDict:
+                raise AmbiguousMigrationError(f"Hints rename {newName} from '{renamedKey}', which doesn't exist in the previous schema.")
+
+            print(pad_ok(f"Hinted: {newName} RENAMES '{renamedKey}'."))
+            return oldDict[renamedKey]
+
+        if self.is_hinted_new(new, objectType, scope):
+            return None
+
+        # Objects that still exist under their own name, or are renamed by a hint, aren't renamed
+        hintedOldKeys = set(self.hints.get(scope, {}).get("renames", {}).values()) if is_hintable(objectType) else set()
+        removedOld = [old for old in identicalOld if old.get_key() not in newDict and old.get_key() not in hintedOldKeys]
+        if len(removedOld) > 1:
+            raise AmbiguousMigrationError(f"{newName} has the same contents as several removed objects: "
+                                          f"{[old.get_key() for old in removedOld]}. Add a hint for it.")
+
+        if len(removedOld) == 1:
+            oldKey = removedOld[0].get_key()
+            claimedBy = self.policyRenames.get((scope, objectType, oldKey), None)
+            if claimedBy != None:
+                raise AmbiguousMigrationError(f"{newName} and '{claimedBy}' both have the same contents as the removed "
+                                              f"{self.get_scoped_name(oldKey, objectType, scope)}. Add a hint for them.")
+
+            self.policyRenames[(scope, objectType, oldKey)] = new.get_key()
+            print(pad_ok(f"{newName} RENAMES '{oldKey}', as it has the same contents."))
+            return removedOld[0]
+
+        # Removed objects that a new object with the same contents renames are accounted for
+        if is_hintable(objectType):
+            addedNew = [other for other in newDict.values() if other.get_key() not in oldDict]
+            similarOld = [old.get_key() for old in oldDict.values() if old.get_key() not in newDict and old.get_key() not in hintedOldKeys
+                          and (scope, objectType, old.get_key()) not in self.policyRenames and is_similar(new, old, objectType)
+                          and not any([other.compare_contents(old) for other in addedNew])]
+            if len(similarOld) > 0:
+                raise AmbiguousMigrationError(f"{newName} is similar to the removed {objectType.__name__}(s) {similarOld}, so it might be a rename "
+                                              f"that also changes its contents. Add a hint renaming it, or declaring it new.")
+
+        return None
+
+
+    def confirm_save(self, migration: SchemaMigration) -> bool:
+        migration.migrationName = self.migrationName
+        return True
+
+
+    def get_unused_hints(self) -> list[str]:
+
+        # Hints that matched nothing are most likely outdated, or have a typo
+        unusedHints = []
+        for scope, scopeHints in self.hints.items():
+            for key in scopeHints.get("renames", {}).keys():
+                if (scope, "renames", key) not in self.usedHints:
+                    unusedHints.append(f"rename of '{key}'" + (f" in table '{scope}'" if scope != None else ""))
+
+            for key in scopeHints.get("new", []):
+                if (scope, "new", key) not in self.usedHints:
+                    unusedHints.append(f"new '{key}'" + (f" in table '{scope}'" if scope != None else ""))
+
+        return unusedHints
+
+
+
 ### MAIN FUNCTIONS ###
-def create_object_migration(oldObject: IMigratable, newObject: IMigratable, objectType: type) -> Migration:
+def create_object_migration(oldObject: IMigratable, newObject: IMigratable, objectType: type, decisions: MigrationDecisions = None) -> Migration:
 
     migration = None
 
     if objectType == Table:
         migration: TableMigration = TableMigration.create_new_migration(oldObject, newObject)
+        scope = newObject.name if newObject != None else None
         migration.add_col_migrations(create_migrations_for_objects(oldObject.columns if oldObject != None else [], 
                                                                    newObject.columns if newObject != None else [], 
-                                                                   Column))
+                                                                   Column, decisions, scope))
         migration.add_fkey_migrations(create_migrations_for_objects(oldObject.foreignKeys if oldObject != None else [], 
                                                                     newObject.foreignKeys if newObject != None else [], 
-                                                                    ForeignKey))
+                                                                    ForeignKey, decisions, scope))
+        migration.add_index_migrations(create_migrations_for_objects(oldObject.indexes if oldObject != None else [],
+                                                                     newObject.indexes if newObject != None else [],
+                                                                     Index, decisions, scope))
     
     elif objectType == Column:
         migration: ColumnMigration = ColumnMigration.create_new_migration(oldObject, newObject)
@@ -24,37 +235,53 @@ def create_object_migration(oldObject: IMigratable, newObject: IMigratable, obje
     elif objectType == ForeignKey:
         migration: FKeyMigration = FKeyMigration.create_new_migration(oldObject, newObject)
 
+    elif objectType == Index:
+        migration: IndexMigration = IndexMigration.create_new_migration(oldObject, newObject)
+
     else:
         print(pad_err(f"ERROR: create_single_migration() given invalid objectType: {objectType}"))
 
     return migration
 
 
+def create_fingerprint_buckets(objects) -> dict:
+
+    # Groups objects by fingerprint, keeping their order within each bucket
+    buckets = {}
+    for obj in objects:
+        buckets.setdefault(obj.get_fingerprint(), []).append(obj)
+    return buckets
+
+
 def get_remove_migrations(oldObjects: list[IMigratable], newObjDict: dict, migrations: list[Migration], objectType: type) -> list[Migration]:
     
     # Adds a removal migration if for old objects whose keys aren't in the new objects, 
     # and there are no  existing migrations that migrate their key (eg. renames)
 
+    migratedKeys = set([migration.oldKey for migration in migrations])
+
     removeMigrations: list[Migration] = []
     for old in oldObjects:
 
-        if old.get_key() not in newObjDict and old.get_key() not in [migration.oldKey for migration in migrations]:
+        if old.get_key() not in newObjDict and old.get_key() not in migratedKeys:
             removeMigrations.append(create_object_migration(old, None, objectType))
 
     return removeMigrations
 
 
-def get_change_migrations(oldDict: dict, newObjects: list[IMigratable], objectType: type) -> list[Migration]:
+def get_change_migrations(oldDict: dict, newDict: dict, newObjects: list[IMigratable], objectType: type, decisions: MigrationDecisions, scope: str) -> list[Migration]:
 
     # Gets all non-removal migrations by iterating through new objects and comparing them to old ones
     createdMigrations: list[Migration] = [] 
+    oldBuckets = None
+
     for new in newObjects:
             
         # If there are no old objects, just mark this as new
         if len(oldDict.keys()) == 0:
 
             print(pad_ok(f"Assuming {objectType.__name__} '{new.get_key()}' is a NEW {objectType.__name__}."))
-            createdMigrations.append(create_object_migration(None, new, objectType))
+            createdMigrations.append(create_object_migration(None, new, objectType, decisions))
             
         # If there is an identical version, ignore the object
         elif new.get_key() in oldDict and new.compare_equivalence(oldDict[new.get_key()]):
@@ -64,64 +291,58 @@ def get_change_migrations(oldDict: dict, newObjects: list[IMigratable], objectTy
         elif new.get_key() in oldDict and not new.compare_equivalence(oldDict[new.get_key()]):
                 
             # Alteration to old object
-            if ask_yes_no(f"Is the {objectType.__name__} '{new.get_key()}' ALTERING '{new.get_key()}'?"):
-                createdMigrations.append(create_object_migration(oldDict[new.get_key()], new, objectType))
+            if decisions.is_alteration(new, objectType, scope):
+                createdMigrations.append(create_object_migration(oldDict[new.get_key()], new, objectType, decisions))
+                continue
 
             # Rename of another old object
-            # Does not run for Foreign Keys, because they can't be renamed
-            elif objectType != ForeignKey and len(oldDict.values) > 1 and ask_yes_no(f"Is the {objectType.__name__} '{new.get_key()}' RENAMING a {objectType.__name__}?"):
-                
-                givenName = None
-                while not givenName in oldDict:
-                    givenName = ask_for_input(f"What is the name of the {objectType.__name__} being renamed?")
-
-                createdMigrations.append(create_object_migration(oldDict[givenName], new, objectType))
+            # Does not ask for Foreign Keys, because they can't be renamed
+            old = decisions.get_renamed_object(new, [], oldDict, newDict, objectType, scope,
+                                               objectType != ForeignKey and len(oldDict.values()) > 1)
+            if old != None:
+                createdMigrations.append(create_object_migration(old, new, objectType, decisions))
 
             # Assuming it's a new object
             else:
                 print(pad_ok(f"Assuming {objectType.__name__} '{new.get_key()}' is a NEW {objectType.__name__}."))
-                createdMigrations.append(create_object_migration(None, new, objectType))
+                createdMigrations.append(create_object_migration(None, new, objectType, decisions))
             
         # If no old names match this name, check if it's a rename or new object
         else:
 
-            # Checks for old objects that have the same contents that don't exist anymore
-            foundIdenticalOld = False
-            for old in oldDict.values():
-                if new.compare_contents(old):
-
-                    if ask_yes_no(f"Is the {objectType.__name__} '{new.get_key()}' RENAMING {objectType.__name__} '{old.get_key()}'?"):
-                        createdMigrations.append(create_object_migration(old, new, objectType))
-                        foundIdenticalOld = True
-            
-            # If nothing that has same contents
-            if not foundIdenticalOld:
-
-                # If rename of an old item - might not even exist.
-                if len(oldDict.values()) > 0 and ask_yes_no(f"Is the {objectType.__name__} '{new.get_key()}' RENAMING a {objectType.__name__}?"):
+            # Checks for old objects that have the same contents
+            # Only old objects with the same fingerprint can have the same contents
+            if oldBuckets == None:
+                oldBuckets = create_fingerprint_buckets(oldDict.values())
 
-                    givenName = None
-                    while not givenName in oldDict:
-                        givenName = ask_for_input(f"What is the name of the {objectType.__name__} being renamed?")
+            identicalOld = [old for old in oldBuckets.get(new.get_fingerprint(), []) if new.compare_contents(old)]
 
-                    createdMigrations.append(create_object_migration(oldDict[givenName], new, objectType))
+            old = decisions.get_renamed_object(new, identicalOld, oldDict, newDict, objectType, scope, len(oldDict.values()) > 0)
+            if old != None:
+                createdMigrations.append(create_object_migration(old, new, objectType, decisions))
 
-                # If not renaming an old object, assume it's NEW
-                else:
-                    print(pad_ok(f"Assuming {objectType.__name__} '{new.get_key()}' is a NEW {objectType.__name__}."))
-                    createdMigrations.append(create_object_migration(None, new, objectType))
+            # If not renaming an old object, assume it's NEW
+            else:
+                print(pad_ok(f"Assuming {objectType.__name__} '{new.get_key()}' is a NEW {objectType.__name__}."))
+                createdMigrations.append(create_object_migration(None, new, objectType, decisions))
 
     return createdMigrations
 
 
-def create_migrations_for_objects(oldObjects: list[IMigratable], newObjects: list[IMigratable], objectType: type) -> list[Migration]:
+def create_migrations_for_objects(oldObjects: list[IMigratable], newObjects: list[IMigratable], objectType: type,
+                                  decisions: MigrationDecisions = None, scope: str = None) -> list[Migration]:
     
+    # Asks the user about any changes, unless given other decisions
+    # NOTE: HintedMigrationDecisions raise an AmbiguousMigrationError for changes they can't decide on.
+    if decisions == None:
+        decisions = MigrationDecisions()
+
     # Creates dictionaries to quickly access the objects
     oldDict = IMigratable.create_object_dict(oldObjects)
     newDict = IMigratable.create_object_dict(newObjects)
 
     # Creates all non-removal migrations
-    createdMigrations: list[Migration] = get_change_migrations(oldDict, newObjects, objectType)    
+    createdMigrations: list[Migration] = get_change_migrations(oldDict, newDict, newObjects, objectType, decisions, scope)    
 
     # Creates all remove migrations
     createdMigrations.extend(get_remove_migrations(oldObjects, newDict, createdMigrations, objectType))
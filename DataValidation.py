@@ -1,4 +1,5 @@
 import re
+import functools
 
 
 ### CONSTANTS ###
@@ -43,26 +44,96 @@ VALID_FKEY_CONSTRAINTS = [
 ]
 
 
+# Each list of patterns is compiled once into a single matcher, with one alternative per pattern.
+# match() tries the alternatives in order, so the first pattern that matches decides the result,
+# exactly like trying the patterns one by one. Datatype alternatives are named after their index
+# so the matching pattern's affinity can be found.
+DATATYPE_MATCHER = re.compile("|".join([f"(?P<type{i}>{pattern})" for i, pattern in enumerate(VALID_DATATYPES.keys())]))
+DATATYPE_AFFINITIES = {f"type{i}": affinity for i, affinity in enumerate(VALID_DATATYPES.values())}
+CONSTRAINT_MATCHER = re.compile("|".join([f"(?:{pattern})" for pattern in VALID_CONSTRAINTS]))
+FKEY_CONSTRAINT_MATCHER = re.compile("|".join([f"(?:{pattern})" for pattern in VALID_FKEY_CONSTRAINTS]))
+
+# An index term naming a column, optionally with a collation and sort order. Any other term is an
+# expression (eg. "lower(Name)").
+INDEX_COLUMN_MATCHER = re.compile(r"(\w+)(?:\s+COLLATE\s+\w+)?(?:\s+(?:ASC|DESC))?", re.IGNORECASE)
+
+# Parts of an index expression or WHERE clause that never name a column: string and blob literals,
+# and the collation or type name after COLLATE or a CAST's AS
+EXPRESSION_SKIPPED_MATCHER = re.compile(r"[xX]?'(?:[^']|'')*'|\b(?:COLLATE|AS)\s+\w+", re.IGNORECASE)
+
+# A quoted name, or a word that isn't a function name or a table name qualifying a column
+EXPRESSION_NAME_MATCHER = re.compile(r'"((?:[^"]|"")+)"|\b([A-Za-z_]\w*)\b(?!\s*[(.])')
+EXPRESSION_KEYWORDS = frozenset(["AND", "OR", "NOT", "IS", "NULL", "ISNULL", "NOTNULL", "IN", "LIKE", "GLOB", "REGEXP", "MATCH",
+                                 "ESCAPE", "BETWEEN", "CASE", "WHEN", "THEN", "ELSE", "END", "TRUE", "FALSE", "ASC", "DESC",
+                                 "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP"])
+
+# Schemas reuse a small number of distinct type and constraint strings, so results are cached
+VALIDATION_CACHE_SIZE = 4096
+
+
+### UTILITY FUNCTIONS ###
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def match_datatype(upperDatatype: str) -> str:
+
+    # Returns the affinity of the first datatype pattern matching, or None if none match
+    typeMatch = DATATYPE_MATCHER.match(upperDatatype)
+    if typeMatch == None:
+        return None
+
+    for groupName, groupValue in typeMatch.groupdict().items():
+        if groupValue != None:
+            return DATATYPE_AFFINITIES[groupName]
+
+
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def match_constraint(upperConstraint: str) -> bool:
+    return CONSTRAINT_MATCHER.match(upperConstraint) != None
+
+
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def match_fkey_constraint(upperConstraint: str) -> bool:
+    return FKEY_CONSTRAINT_MATCHER.match(upperConstraint) != None
+
+
 ### FUNCTIONS ###
-def validate_datatype(datatype: str) -> bool:
-    for validType in VALID_DATATYPES.keys():
-        if re.match(validType, datatype.upper()): return True
+def resolve_affinity(datatype: str) -> str:
 
-    return False
+    # Returns the type affinity of a datatype (eg. "VARCHAR(255)" -> "TEXT"), as listed in
+    # VALID_DATATYPES, or None if the datatype is invalid
+    return match_datatype(datatype.upper())
+
+
+def validate_datatype(datatype: str) -> bool:
+    return resolve_affinity(datatype) != None
 
 
 def validate_constraint(constraint: str) -> bool:
-    for validConstraint in VALID_CONSTRAINTS:
-        if re.match(validConstraint, constraint.upper()): return True
-        
-    return False
+    return match_constraint(constraint.upper())
 
 
 def validate_fkey_constraint(constraint: str) -> bool:
-    for validConstraint in VALID_FKEY_CONSTRAINTS:
-        if re.match(validConstraint, constraint.upper()): return True
+    return match_fkey_constraint(constraint.upper())
+
+
+def get_indexed_column_name(term: str) -> str:
+
+    # Returns the name of the column an index term indexes, or None if the term is an expression
+    columnMatch = INDEX_COLUMN_MATCHER.fullmatch(term.strip())
+    return columnMatch.group(1) if columnMatch != None else None
+
+
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def get_expression_column_names(expression: str) -> frozenset:
+
+    # Returns the names an index expression or WHERE clause uses as columns (eg. "lower(Name)" -> Name)
+    columnNames = set()
+    for nameMatch in EXPRESSION_NAME_MATCHER.finditer(EXPRESSION_SKIPPED_MATCHER.sub(" ", expression)):
+        if nameMatch.group(1) != None:
+            columnNames.add(nameMatch.group(1).replace('""', '"'))
+        elif nameMatch.group(2).upper() not in EXPRESSION_KEYWORDS:
+            columnNames.add(nameMatch.group(2))
 
-    return False
+    return frozenset(columnNames)
 
 
 def validate_datatype_cast(type1: str, type2: str) -> bool:
@@ -1,4 +1,5 @@
 class IJsonSerializable:
+    __slots__ = ()
     
     ## Interface Functions
     def to_dict(self):
@@ -9,6 +10,7 @@ class IJsonSerializable:
 
 
 class IMigratable(IJsonSerializable):
+    __slots__ = ()
 
     ## Interface Functions
     def get_key(self) -> str:
@@ -17,6 +19,11 @@ class IMigratable(IJsonSerializable):
     def compare_contents(self, other: u'IMigratable') -> bool:
         pass
 
+    # Hash of the contents compared by compare_contents(). Objects with equal contents have
+    # equal fingerprints, so differing fingerprints rule out a match without comparing.
+    def get_fingerprint(self) -> int:
+        pass
+
     def compare_equivalence(self, other: u'IMigratable') -> bool:
         return self.compare_contents(other) and self.get_key() == other.get_key()
     
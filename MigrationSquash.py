@@ -0,0 +1,129 @@
+from Schema import *
+from Migrations import *
+from ColouredText import *
+import SchemaCheckpoints
+
+
+### CLASSES ###
+class SquashError(Exception):
+    pass
+
+
+
+### UTILITY FUNCTIONS ###
+def copy_schema_with_origins(schema: DatabaseSchema) -> tuple:
+
+    # Copies a schema, and maps the id() of every copied table, column, foreign key and index to a tuple
+    # of (copied object, object it was copied from). Migrations edit objects in place and only
+    # create new objects for additions, so after replaying migrations on the copy, anything still
+    # in this map existed before the first migration - however many times it was renamed or edited.
+    # The copied objects are kept in the map so their ids can't be reused by new objects.
+    schemaCopy = DatabaseSchema.from_dict(schema.to_dict())
+    origins = {}
+
+    for originalTable, copiedTable in zip(schema.tables, schemaCopy.tables):
+        origins[id(copiedTable)] = (copiedTable, originalTable)
+
+        for originalColumn, copiedColumn in zip(originalTable.columns, copiedTable.columns):
+            origins[id(copiedColumn)] = (copiedColumn, originalColumn)
+
+        for originalFKey, copiedFKey in zip(originalTable.foreignKeys, copiedTable.foreignKeys):
+            origins[id(copiedFKey)] = (copiedFKey, originalFKey)
+
+        for originalIndex, copiedIndex in zip(originalTable.indexes, copiedTable.indexes):
+            origins[id(copiedIndex)] = (copiedIndex, originalIndex)
+
+    return (schemaCopy, origins)
+
+
+def get_origin(origins: dict, obj) -> IMigratable:
+    copiedObject, originalObject = origins.get(id(obj), (None, None))
+    return originalObject if copiedObject is obj else None
+
+
+def create_member_migrations(originalMembers: list[IMigratable], finalMembers: list[IMigratable], origins: dict, migrationClass) -> list[Migration]:
+
+    # Creates the net migrations turning a table's original columns (or foreign keys, or indexes) into its final ones
+    memberMigrations = []
+    keptMembers = set()
+
+    for finalMember in finalMembers:
+        originalMember = get_origin(origins, finalMember)
+
+        if originalMember == None:
+            memberMigrations.append(migrationClass.create_new_migration(None, finalMember))
+        else:
+            keptMembers.add(id(originalMember))
+            if not finalMember.compare_equivalence(originalMember):
+                memberMigrations.append(migrationClass.create_new_migration(originalMember, finalMember))
+
+    for originalMember in originalMembers:
+        if id(originalMember) not in keptMembers:
+            memberMigrations.append(migrationClass.create_new_migration(originalMember, None))
+
+    return memberMigrations
+
+
+
+### FUNCTIONS ###
+def squash_migrations(migrations: list[SchemaMigration], startSchema: DatabaseSchema) -> tuple:
+
+    # Combines consecutive migrations into one migration with a single net TableMigration per table,
+    # going from startSchema (the schema before the first migration) to the schema after the last.
+    # This way a table touched by many of the migrations is only rebuilt once.
+    # Returns a tuple of (squashed migration, schema after the migrations).
+    # NOTE: startSchema is not modified.
+    if len(migrations) == 0:
+        raise SquashError("There are no migrations to squash!")
+
+    finalSchema, origins = copy_schema_with_origins(startSchema)
+    for migration in migrations:
+        errors = SchemaCheckpoints.replay_migration(migration, finalSchema)
+        if len(errors) > 0:
+            raise SquashError(f"Migration #{migration.migrationIndex} produces an invalid schema: {errors[0]}")
+
+    removeMigrations: list[TableMigration] = []
+    editMigrations: list[TableMigration] = []
+    addMigrations: list[TableMigration] = []
+    keptTables = set()
+
+    for finalTable in finalSchema.tables:
+        originalTable: Table = get_origin(origins, finalTable)
+
+        # Tables created during the squashed migrations are added in their final form
+        if originalTable == None:
+            addMigrations.append(TableMigration(None,
+                                                finalTable.name,
+                                                create_member_migrations([], finalTable.columns, origins, ColumnMigration),
+                                                create_member_migrations([], finalTable.foreignKeys, origins, FKeyMigration),
+                                                create_member_migrations([], finalTable.indexes, origins, IndexMigration)))
+            continue
+
+        keptTables.add(id(originalTable))
+        tableMigration = TableMigration(originalTable.name,
+                                        finalTable.name,
+                                        create_member_migrations(originalTable.columns, finalTable.columns, origins, ColumnMigration),
+                                        create_member_migrations(originalTable.foreignKeys, finalTable.foreignKeys, origins, FKeyMigration),
+                                        create_member_migrations(originalTable.indexes, finalTable.indexes, origins, IndexMigration))
+
+        # Tables that ended up unchanged need no migration at all
+        if (originalTable.name != finalTable.name or len(tableMigration.colMigrations) > 0 or len(tableMigration.fKeyMigrations) > 0
+            or len(tableMigration.indexMigrations) > 0):
+            editMigrations.append(tableMigration)
+
+    for originalTable in startSchema.tables:
+        if id(originalTable) not in keptTables:
+            removeMigrations.append(TableMigration.create_new_migration(originalTable, None))
+
+    lastMigration = migrations[-1]
+    squashedMigration = SchemaMigration(lastMigration.migrationIndex,
+                                        removeMigrations + editMigrations + addMigrations,
+                                        lastMigration.migrationName)
+
+    # Makes sure the squashed migration ends up at the same schema as running every migration
+    squashedSchema, _ = copy_schema_with_origins(startSchema)
+    squashedErrors = SchemaCheckpoints.replay_migration(squashedMigration, squashedSchema)
+    if len(squashedErrors) > 0 or not squashedSchema.compare_equivalence(finalSchema):
+        raise SquashError(f"Squashing migrations #{migrations[0].migrationIndex} to #{lastMigration.migrationIndex} does not reproduce the same schema!")
+
+    return (squashedMigration, finalSchema)
@@ -24,7 +24,7 @@ def colour_text_if_value_changed(text: str, colour: str, value1, value2):
 
 ### CLASSES ###
 class Migration:
-
+    __slots__ = ("oldKey",)
     oldKey: str
 
     ## Checking
@@ -50,13 +50,14 @@ class Migration:
 
 
 class ColumnMigration(Migration):
+    __slots__ = ("newColumnData", "oldObjectCopy")
     newColumnData: Column
     oldObjectCopy: Column
 
 
     ## Initialization and Serialization
     def __init__(self, oldKey: str, newColumnData: Column):
-        self.oldKey = oldKey
+        self.oldKey = intern_string(oldKey)
         self.newColumnData = newColumnData
         self.oldObjectCopy = None
 
@@ -91,7 +92,8 @@ class ColumnMigration(Migration):
     def run_edit_on_old_object(self, oldObject: Column):
         oldObject.name = self.newColumnData.name
         oldObject.datatype = self.newColumnData.datatype
-        oldObject.constraints = self.newColumnData.constraints.copy()
+        oldObject.constraints = self.newColumnData.constraints
+        oldObject.invalidate_fingerprint()
 
 
     ## Checks
@@ -115,7 +117,7 @@ class ColumnMigration(Migration):
         if self.newColumnData == None:
             newColString += f"{colours.FAIL}Removed{colours.ENDC}"
         elif self.oldObjectCopy == None:
-            newColString += f"{colours.OKGREEN}{self.newColumnData.name} {self.newColumnData.datatype} {self.newColumnData.constraints}{colours.ENDC}"
+            newColString += f"{colours.OKGREEN}{self.newColumnData.name} {self.newColumnData.datatype} {list(self.newColumnData.constraints)}{colours.ENDC}"
         else:
 
             # Constructs a warning string
@@ -134,7 +136,7 @@ class ColumnMigration(Migration):
                                                       self.newColumnData.datatype, 
                                                       self.oldObjectCopy.datatype)
             
-            constraintsString = colour_text_if_value_changed(self.newColumnData.constraints, 
+            constraintsString = colour_text_if_value_changed(list(self.newColumnData.constraints), 
                                                              colours.WARNING, 
                                                              self.newColumnData.constraints, 
                                                              self.oldObjectCopy.constraints)
@@ -146,12 +148,13 @@ class ColumnMigration(Migration):
 
 
 class FKeyMigration(Migration):
+    __slots__ = ("newFKey", "oldObjectCopy")
     newFKey: ForeignKey
     oldObjectCopy: ForeignKey
 
     ## Initialization
     def __init__(self, oldKey: str, new: ForeignKey):
-        self.oldKey = oldKey
+        self.oldKey = intern_string(oldKey)
         self.newFKey = new
         self.oldObjectCopy = None
 
@@ -185,6 +188,7 @@ class FKeyMigration(Migration):
         oldObject.externalName = self.newFKey.externalName
         oldObject.onUpdate = self.newFKey.onUpdate
         oldObject.onDelete = self.newFKey.onDelete
+        oldObject.invalidate_fingerprint()
     
 
     ## Checks
@@ -229,25 +233,96 @@ class FKeyMigration(Migration):
         return f"FOREIGN KEY {self.oldObjectCopy} --> {newColString}"
 
 
+class IndexMigration(Migration):
+    __slots__ = ("newIndex", "oldObjectCopy")
+    newIndex: Index
+    oldObjectCopy: Index
+
+    ## Initialization
+    def __init__(self, oldKey: str, new: Index):
+        self.oldKey = intern_string(oldKey)
+        self.newIndex = new
+        self.oldObjectCopy = None
+
+    def from_dict(dictionary: dict):
+        return IndexMigration(dictionary.get("old_key", None),
+                              Index.from_dict(dictionary.get("new_data", None)))
+
+    def to_dict(self):
+        returnDict = {}
+
+        if self.oldKey != None: returnDict["old_key"] = self.oldKey
+        if self.newIndex != None: returnDict["new_data"] = self.newIndex.to_dict()
+
+        return returnDict
+
+
+    ## Creating Migrations
+    def create_new_migration(oldObject: Index, newObject: Index) -> u'IndexMigration':
+        newMigration = IndexMigration(oldObject.get_key() if oldObject != None else None,
+                                      newObject.copy() if newObject != None else None)
+
+        newMigration.oldObjectCopy = oldObject.copy() if oldObject != None else None
+
+        return newMigration
+
+
+    ## Running Migrations
+    def run_edit_on_old_object(self, oldObject: Index):
+        oldObject.name = self.newIndex.name
+        oldObject.columns = self.newIndex.columns
+        oldObject.unique = self.newIndex.unique
+        oldObject.where = self.newIndex.where
+        oldObject.invalidate_fingerprint()
+
+
+    ## Checks
+    def is_add(self):
+        return self.oldKey == None
+
+    def is_remove(self):
+        return self.newIndex == None
+
+
+    ## Base Functions
+    def __str__(self):
+        # "Removed" in RED if the new index is None, index data in GREEN if the old index is None,
+        # and the new index in YELLOW if neither are None (indexes are always recreated as a whole)
+        newIndexString = ""
+        if self.newIndex == None:
+            newIndexString += f"{colours.FAIL}Removed{colours.ENDC}"
+        elif self.oldObjectCopy == None:
+            newIndexString += f"{colours.OKGREEN}{self.newIndex}{colours.ENDC}"
+        else:
+            newIndexString += f"{colours.WARNING}{self.newIndex}{colours.ENDC}"
+
+        return f"INDEX {self.oldObjectCopy} --> {newIndexString}"
+
+
 class TableMigration(Migration):
+    __slots__ = ("newName", "colMigrations", "fKeyMigrations", "indexMigrations")
     newName: str
     colMigrations: list[ColumnMigration]
     fKeyMigrations: list[FKeyMigration]
+    indexMigrations: list[IndexMigration]
 
     
     ## Initialization and Serialization
-    def __init__(self, oldKey: str, newName: str, colMigrations: list[ColumnMigration], fKeyMigrations: list[FKeyMigration]):
-        self.oldKey = oldKey
-        self.newName = newName
+    def __init__(self, oldKey: str, newName: str, colMigrations: list[ColumnMigration], fKeyMigrations: list[FKeyMigration],
+                 indexMigrations: list[IndexMigration] = None):
+        self.oldKey = intern_string(oldKey)
+        self.newName = intern_string(newName)
         self.colMigrations = colMigrations
         self.fKeyMigrations = fKeyMigrations
+        self.indexMigrations = indexMigrations if indexMigrations != None else []
 
 
     def from_dict(dictionary: dict):
         return TableMigration(dictionary.get("old_key", None),
                               dictionary.get("new_name", None),
                               [ColumnMigration.from_dict(colDict) for colDict in dictionary.get("column_migrations", [])],
-                              [FKeyMigration.from_dict(colDict) for colDict in dictionary.get("foreign_key_migrations", [])])
+                              [FKeyMigration.from_dict(colDict) for colDict in dictionary.get("foreign_key_migrations", [])],
+                              [IndexMigration.from_dict(indexDict) for indexDict in dictionary.get("index_migrations", [])])
     
 
     def to_dict(self):
@@ -257,6 +332,7 @@ class TableMigration(Migration):
         if self.newName != None: returnDict["new_name"] = self.newName
         if self.colMigrations != None: returnDict["column_migrations"] = [col.to_dict() for col in self.colMigrations]
         if self.fKeyMigrations != None: returnDict["foreign_key_migrations"] = [fKey.to_dict() for fKey in self.fKeyMigrations]
+        if self.indexMigrations != None: returnDict["index_migrations"] = [index.to_dict() for index in self.indexMigrations]
 
         return returnDict
 
@@ -269,11 +345,16 @@ class TableMigration(Migration):
         self.fKeyMigrations.extend(newFKeyMigrations)
 
 
+    def add_index_migrations(self, newIndexMigrations: list[IndexMigration]):
+        self.indexMigrations.extend(newIndexMigrations)
+
+
     ## Creating Migrations
     def create_new_migration(oldObject: Table, newObject: Table) -> u'TableMigration':
         return TableMigration(oldObject.get_key() if oldObject != None else None,
                               newObject.get_key() if newObject != None else None,
                               [],
+                              [],
                               [])
     
 
@@ -299,6 +380,7 @@ class TableMigration(Migration):
                 table.remove_column(usedColumn)
                 
             elif colMigration.is_edit():
+                table.rename_column(usedColumn, colMigration.newColumnData.name)
                 colMigration.run_edit_on_old_object(usedColumn)
                 
 
@@ -320,6 +402,26 @@ class TableMigration(Migration):
             elif fKeyMigration.is_edit():
                 fKeyMigration.run_edit_on_old_object(usedFKey)
 
+        # Performs all necessary index migrations, after the columns they index exist
+        oldIndexesDict = IMigratable.create_object_dict(table.indexes)
+
+        for indexMigration in self.indexMigrations:
+
+            usedIndex: Index = oldIndexesDict.get(indexMigration.oldKey, None)
+
+            if indexMigration.is_add():
+                usedIndex = indexMigration.newIndex.copy()
+                table.add_index(usedIndex)
+
+            elif indexMigration.is_remove():
+                table.remove_index(usedIndex)
+
+            elif indexMigration.is_edit():
+                indexMigration.run_edit_on_old_object(usedIndex)
+
+        # Members were edited in place, so the table can't tell its contents changed
+        table.invalidate_fingerprint()
+
 
     ## Checking types of changes
     def is_add(self):
@@ -349,18 +451,24 @@ class TableMigration(Migration):
         for fKey in self.fKeyMigrations:
             output += f"\t{str(fKey)}\n"
 
+        for index in self.indexMigrations:
+            output += f"\t{str(index)}\n"
+
         return output
 
 
 class SchemaMigration:
+    __slots__ = ("migrationIndex", "migrationName", "loadedTableMigrations", "tableDicts")
     migrationIndex: int
     migrationName: str
-    tableMigrations: list[TableMigration]
+    loadedTableMigrations: list[TableMigration]
+    tableDicts: list[dict]
 
     ## Initialization and Serialization
     def __init__(self, newIndex: int, tables: list[TableMigration], newName: str = None  ):
         self.migrationIndex = newIndex
-        self.tableMigrations = tables
+        self.loadedTableMigrations = tables
+        self.tableDicts = None
         self.migrationName = newName
 
 
@@ -368,18 +476,37 @@ class SchemaMigration:
         return SchemaMigration(dictionary.get("index", -1),
                                [TableMigration.from_dict(table) for table in dictionary.get("tables", [])],
                                dictionary.get("name", None))
+
+
+    def from_cached_dict(dictionary: dict):
+
+        # Like from_dict(), but the table migrations are only made the first time they are used.
+        # Commands load every migration, yet only replay the ones after the latest checkpoint
+        # (the others are only hashed, through to_dict()).
+        migration = SchemaMigration(dictionary.get("index", -1), None, dictionary.get("name", None))
+        migration.tableDicts = dictionary.get("tables", [])
+        return migration
     
 
     def to_dict(self):
         returnDict = {}
 
         if self.migrationIndex != None: returnDict["index"] = self.migrationIndex
-        if self.tableMigrations != None: returnDict["tables"] = [table.to_dict() for table in self.tableMigrations]
+        if self.tableDicts != None: returnDict["tables"] = self.tableDicts
+        elif self.tableMigrations != None: returnDict["tables"] = [table.to_dict() for table in self.tableMigrations]
         if self.migrationName != None: returnDict["name"] = self.migrationName
 
         return returnDict    
 
 
+    @property
+    def tableMigrations(self) -> list[TableMigration]:
+        if self.tableDicts != None:
+            self.loadedTableMigrations = [TableMigration.from_dict(table) for table in self.tableDicts]
+            self.tableDicts = None
+        return self.loadedTableMigrations
+
+
     ## Usage
     def add_new_table_migration(self, tableMigration: TableMigration):
         self.tableMigrations.append(tableMigration)
@@ -388,7 +515,11 @@ class SchemaMigration:
     def migrate_schema(self, schema: DatabaseSchema) -> list[ValidationError]:
         
         # Gets a dictionary of old tables, so we have a way to reference all old tables before we modify any of them
-        oldTablesDict = IMigratable.create_object_dict(schema.tables)
+        oldTablesDict = schema.tablesByName.copy()
+
+        # Tracks what changed, so only the foreign keys that could be affected are relinked after
+        changedTables: set[Table] = set()
+        changedNames: set[str] = set()
 
         for tableMigration in self.tableMigrations:
             
@@ -406,15 +537,27 @@ class SchemaMigration:
                     print(pad_err(f"[Err] Tried removing a nonexistent table: {tableMigration.oldKey}"))
             
             elif tableMigration.is_edit():
-                tableMigration.run_edit_on_old_object(usedTable)
+                schema.rename_table(usedTable, tableMigration.newName)
 
             # Migrates all the columns and fKeys
             if not tableMigration.is_remove():
                 tableMigration.migrate_table(usedTable)
+                changedTables.add(usedTable)
+
+            changedNames.add(tableMigration.oldKey)
+            changedNames.add(tableMigration.newName)
+
+        # Reconnects the foreign keys of changed tables, and of all tables referencing a changed table
+        relinkedTables: set[Table] = set()
+        for table in changedTables:
+            if schema.has_table(table):
+                schema.update_table_references(table)
+                relinkedTables.add(table)
+
+        for name in changedNames:
+            relinkedTables.update(schema.get_referencing_tables(name))
 
-        # Reconnects all foreign keys with references
-        for table in schema.tables:
-            table.setup_foreign_key_refs(schema.tables)
+        schema.relink_foreign_keys(relinkedTables)
 
         # Validates the newly migrated database
         schemaErrors = schema.validate_self()
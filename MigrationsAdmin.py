@@ -1,22 +1,48 @@
 import sys
 import re
+import sqlite3
 import os
+import time
+import pathlib
+import concurrent.futures
 from ColouredText import *
 from Schema import *
 from Migrations import *
 from ValidationErrors import *
 from UserIO import *
 import test.Tests as Tests
+import benchmark.PipelineBenchmark as PipelineBenchmark
+import benchmark.TuningBenchmark as TuningBenchmark
 import CreateMigration
 import Commands
 import SQLMigrations
+import SchemaCheckpoints
+import ParseCache
+import SQLExecution
+import MigrationSquash
+import CombinedMigrations
+import Profiling
+import SchemaVerification
+import SchemaIntrospection
 import pprint
 
 ### CONSTANTS ###
 MIGRATIONS_FILE_REGEX = r'Migration_([1-9][0-9]*|0)(_\w+)?\.json'
 MIGRATIONS_SQL_FILE_REGEX = r'SQLMigration_([1-9][0-9]*|0)(_\w+)?\.json'
 SQL_MIGRATIONS_COMBINED_FILE = "SQLMigration_Combined.json"
+SQL_MIGRATIONS_INDEXED_FILE = "SQLMigration_Combined.bin"
+SQL_BASELINE_FILE = "SQLMigration_Baseline.json"
+SQL_SQUASHED_FILE_REGEX = r'SQLMigration_Squashed_(-1|[1-9][0-9]*|0)_([1-9][0-9]*|0)\.json'
 DEBUG_ON = False
+JOBS = 1
+COPY_OPTIONS = SQLExecution.CopyOptions()
+TUNING_PROFILE = None
+SQLITE_TARGET_VERSION = SQLMigrations.DEFAULT_SQLITE_VERSION
+NON_INTERACTIVE = False
+HINTS_FILE = None
+PROFILE_FILE = None
+PROFILE_STATS_FILE = None
+PROFILE_MEMORY = False
 
 
 ### UTILITY ###
@@ -32,9 +58,15 @@ def print_errors(errors: list[ValidationError], context: bool):
 
 
 def print_command_step(content: str):
+    Profiling.start_phase(content)
     print(pad_header(content))
 
 
+def print_checkpoint_loaded(migrations: list[SchemaMigration], appliedCount: int):
+    if appliedCount > 0:
+        print(pad_ok(f"Resuming from schema checkpoint at migration #{migrations[appliedCount-1].migrationIndex}"))
+
+
 
 ### FILE HANDLING ###
 def create_migration_filename(migration: SchemaMigration) -> str:
@@ -51,6 +83,11 @@ def create_sqlmigration_filename(migration: SchemaMigration) -> str:
     return f"SQLMigration_{migration.migrationIndex}_{migration.migrationName}.json"
 
 
+def create_squashed_sqlmigration_filename(fromVersion: int, toVersion: int) -> str:
+    # NOTE: This must not match MIGRATIONS_SQL_FILE_REGEX, squashed migrations are not part of the normal history
+    return f"SQLMigration_Squashed_{fromVersion}_{toVersion}.json"
+
+
 def write_sqlmigration_file(folder: str, sqlMigration: SQLMigrations.SQLMigration):
 
     # Writes a new SQL Migration file
@@ -59,48 +96,164 @@ def write_sqlmigration_file(folder: str, sqlMigration: SQLMigrations.SQLMigratio
     newFile.close()
 
 
-def get_all_migrations(migrationsFolder: str) -> list[SchemaMigration]:
+def parse_migration_text(text: str) -> SchemaMigration:
+    return SchemaMigration.from_dict(json.loads(text))
+
+
+def load_schema_file(dbSchemaFilePath: str) -> DatabaseSchema:
+
+    # Raises IOError if the file can't be opened, and ValueError if it isn't UTF-8 text or valid JSON
+    startTime = time.perf_counter()
+    schema, wasCached = ParseCache.load_file_cached(dbSchemaFilePath, DatabaseSchema.from_json, DatabaseSchema.from_dict)
+    Profiling.count("files_read")
+    Profiling.count("parse_cache_hits" if wasCached else "parse_cache_misses")
+    print_debug(f"Loaded schema in {(time.perf_counter()-startTime)*1000:.1f}ms "
+                f"(parse cache {'hit' if wasCached else 'miss'} for '{dbSchemaFilePath}').")
+    
+    return schema
+
+
+def find_files_matching(folder: str, fileRegex: str, fileDescription: str) -> list[str]:
 
     #NOTE: This assumes that the folder exists
-    folderFiles = os.listdir(migrationsFolder)
-    foundMigrations: list[SchemaMigration] = []
+    filePaths: list[str] = []
 
-    for fileName in folderFiles:
-        filePath = os.path.join(migrationsFolder,fileName)
-        if re.match(MIGRATIONS_FILE_REGEX, fileName):
-            try: 
-                file = open(filePath)
-                foundMigrations.append(SchemaMigration.from_dict(json.loads(file.read())))
-            except IOError as err:
-                print(pad_err(f"Could not open migration file: '{filePath}': {err}"))
+    for fileName in os.listdir(folder):
+        filePath = os.path.join(folder,fileName)
+        if re.match(fileRegex, fileName):
+            filePaths.append(filePath)
         else:
-            print_debug(f"Skipping file '{filePath}' because it is not a migration file.")
+            print_debug(f"Skipping file '{filePath}' because it is not {fileDescription}.")
+
+    return filePaths
+
+
+def try_load_file(filePath: str, loadFunc) -> tuple:
+
+    # Returns (result, None) if loading succeeded, or (None, error) if the file couldn't be opened
+    # (IOError) or parsed (ValueError, eg. invalid JSON or text that isn't UTF-8), so every file
+    # is tried before errors are reported
+    try:
+        return (loadFunc(filePath), None)
+    except (IOError, ValueError) as err:
+        return (None, err)
+
+
+def load_files_concurrently(filePaths: list[str], loadFunc) -> list[tuple]:
+
+    # Loads every file with loadFunc(filePath), using up to JOBS threads. Reading is dominated
+    # by I/O latency on network drives, so threads are enough to overlap it.
+    # Returns a list of (filePath, result, error) in the same order as filePaths.
+    if JOBS <= 1 or len(filePaths) <= 1:
+        loadResults = [try_load_file(filePath, loadFunc) for filePath in filePaths]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=JOBS) as executor:
+            loadResults = list(executor.map(lambda filePath: try_load_file(filePath, loadFunc), filePaths))
+
+    # Counted here rather than in loadFunc, which may run on other threads
+    Profiling.count("files_read", len([loadResult for loadResult in loadResults if loadResult[1] == None]))
+
+    return [(filePaths[i], loadResults[i][0], loadResults[i][1]) for i in range(len(filePaths))]
+
+
+def check_loaded_files(loadedFiles: list[tuple], fileDescription: str) -> list[tuple]:
+
+    # Reports the files that couldn't be opened, which are skipped, and the ones that couldn't be
+    # parsed. Those stop the command (the first parse error is raised once all are reported), as
+    # skipping one would run the command on a history with a migration missing.
+    # Returns (filePath, result) for every loaded file.
+    parseErrors = []
+    for filePath, loadResult, err in loadedFiles:
+        if isinstance(err, ValueError):
+            print(pad_err(f"Could not parse {fileDescription}: '{filePath}': {err}"))
+            parseErrors.append(err)
+        elif err != None:
+            print(pad_err(f"Could not open {fileDescription}: '{filePath}': {err}"))
+
+    if len(parseErrors) > 0:
+        raise parseErrors[0]
+
+    return [(filePath, loadResult) for filePath, loadResult, err in loadedFiles if err == None]
+
+
+def read_sql_migration_file(filePath: str) -> dict:
+    with open(filePath) as file:
+        return json.loads(file.read())
+
+
+def get_all_migrations(migrationsFolder: str) -> list[SchemaMigration]:
+
+    filePaths = find_files_matching(migrationsFolder, MIGRATIONS_FILE_REGEX, "a migration file")
+    foundMigrations: list[SchemaMigration] = []
+
+    cacheHits = 0
+    startTime = time.perf_counter()
+    loadedFiles = load_files_concurrently(filePaths, lambda filePath: ParseCache.load_file_cached(filePath, parse_migration_text, SchemaMigration.from_cached_dict))
+
+    for filePath, loadResult in check_loaded_files(loadedFiles, "migration file"):
+        migration, wasCached = loadResult
+        foundMigrations.append(migration)
+        cacheHits += 1 if wasCached else 0
+        print_debug(f"Parse cache {'hit' if wasCached else 'miss'} for '{filePath}'.")
+
+    Profiling.count("parse_cache_hits", cacheHits)
+    Profiling.count("parse_cache_misses", len(foundMigrations)-cacheHits)
+    print_debug(f"Loaded {len(foundMigrations)} migrations in {(time.perf_counter()-startTime)*1000:.1f}ms using {JOBS} job(s) "
+                f"(parse cache: {cacheHits} hits, {len(foundMigrations)-cacheHits} misses).")
 
     # Before returning, sort lowest to greatest.
     foundMigrations.sort(key=lambda migration: migration.migrationIndex)
     return foundMigrations
 
+
 def get_sql_migrations_as_dicts(migrationsFolder: str) -> list[dict]:
 
-    #NOTE: This assumes that the folder exists
-    folderFiles = os.listdir(migrationsFolder)
+    filePaths = find_files_matching(migrationsFolder, MIGRATIONS_SQL_FILE_REGEX, "an SQL migration file")
     foundMigrations: list[dict] = []
 
-    for fileName in folderFiles:
-        filePath = os.path.join(migrationsFolder,fileName)
-        if re.match(MIGRATIONS_SQL_FILE_REGEX, fileName):
-            try: 
-                file = open(filePath)
-                foundMigrations.append(json.loads(file.read()))
-            except IOError as err:
-                print(pad_err(f"Could not open SQL migration file: '{filePath}': {err}"))
-        else:
-            print_debug(f"Skipping file '{filePath}' because it is not an SQL migration file.")
+    for filePath, sqlMigrationDict in check_loaded_files(load_files_concurrently(filePaths, read_sql_migration_file), "SQL migration file"):
+        foundMigrations.append(sqlMigrationDict)
 
     # Before returning, sort lowest to greatest.
     foundMigrations.sort(key=lambda migration: migration["migrationIndex"])
     return foundMigrations
 
+def find_squashed_sql_migration(migrationsFolder: str, fromVersion: int) -> dict:
+
+    # Finds the squashed SQL migration that starts at the given version and reaches the furthest,
+    # or None if there isn't one
+    bestPath = None
+    bestVersion = None
+
+    for fileName in os.listdir(migrationsFolder):
+        fileMatch = re.fullmatch(SQL_SQUASHED_FILE_REGEX, fileName)
+        if fileMatch and int(fileMatch.group(1)) == fromVersion and (bestVersion == None or int(fileMatch.group(2)) > bestVersion):
+            bestPath = os.path.join(migrationsFolder, fileName)
+            bestVersion = int(fileMatch.group(2))
+
+    if bestPath == None:
+        return None
+
+    try:
+        return read_sql_migration_file(bestPath)
+    except (IOError, json.JSONDecodeError) as err:
+        print(pad_err(f"Could not open squashed SQL migration file: '{bestPath}': {err}"))
+        return None
+
+
+def read_baseline_sql_migration(migrationsFolder: str) -> dict:
+
+    baselinePath = os.path.join(migrationsFolder, SQL_BASELINE_FILE)
+    if not os.path.exists(baselinePath):
+        return None
+
+    try:
+        return read_sql_migration_file(baselinePath)
+    except (IOError, json.JSONDecodeError) as err:
+        print(pad_err(f"Could not open baseline SQL migration file: '{baselinePath}': {err}"))
+        return None
+
+
 def write_sql_migrations_combined_file(migrationsFolder: str):
 
     # Opens all SQLMigration files
@@ -108,46 +261,57 @@ def write_sql_migrations_combined_file(migrationsFolder: str):
         print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
         return
     
-    existingSQLMigrations = get_sql_migrations_as_dicts(migrationsFolder)
-
-    # Removes the existing combined file
-    if os.path.exists(os.path.join(migrationsFolder, SQL_MIGRATIONS_COMBINED_FILE)):
-        os.remove(os.path.join(migrationsFolder, SQL_MIGRATIONS_COMBINED_FILE))
+    # Only migrations that aren't in the combined files yet are read and written (in both formats)
+    startTime = time.perf_counter()
+    reusedCount, writtenCount = CombinedMigrations.write_combined_file(migrationsFolder, SQL_MIGRATIONS_COMBINED_FILE,
+                                                                          SQL_MIGRATIONS_INDEXED_FILE, MIGRATIONS_SQL_FILE_REGEX)
+    print_debug(f"Combined files updated in {(time.perf_counter()-startTime)*1000:.1f}ms "
+                f"({reusedCount} migrations kept, {writtenCount} written).")
     
-    # Creates a new one and populates it
-    combinedFile = open(os.path.join(migrationsFolder, SQL_MIGRATIONS_COMBINED_FILE), "w")
-    fileContentsDict = {"sql_migrations":[]}
 
-    for existingMigration in existingSQLMigrations:
-        fileContentsDict["sql_migrations"].append(existingMigration)
 
-    combinedFile.write(json.dumps(fileContentsDict, indent=4))
-    combinedFile.close()
-    
+### COMMANDS ###
+def load_migration_decisions() -> CreateMigration.MigrationDecisions:
+
+    # Decides changes without asking when running non-interactively, or when given hints
+    if HINTS_FILE != None:
+        return CreateMigration.HintedMigrationDecisions.from_file(HINTS_FILE)
+    elif NON_INTERACTIVE:
+        return CreateMigration.HintedMigrationDecisions()
+    else:
+        return CreateMigration.MigrationDecisions()
 
 
-### COMMANDS ###
 def create_new_migration(dbSchemaFilePath: str, migrationsFolder: str):
     
-    # Checks if necessary files exist
+    # Checks if necessary files exist, and gets the new schema
     try:
-        file = open(dbSchemaFilePath)
+        newSchema: DatabaseSchema = load_schema_file(dbSchemaFilePath)
     except IOError as err:
         print(pad_err(f"Failed to open file '{dbSchemaFilePath}': {err}"))
         return
+    except ValueError as e:
+        print(pad_err(f"Error reading JSON file: {str(e)}"))
+        return
 
     if not os.path.exists(migrationsFolder):
         print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
         return
 
-    # Gets the new schema - adds the migrations table to it
-    newSchema: DatabaseSchema = DatabaseSchema.from_json(file.read())
+    try:
+        decisions = load_migration_decisions()
+    except (IOError, json.JSONDecodeError) as err:
+        print(pad_err(f"Failed to read hints file '{HINTS_FILE}': {err}"))
+        return
+
+    # Adds the migrations table to the new schema
     newSchema.add_table(MIGRATIONS_TABLE.copy())
 
     # Validates the new schema
     print_command_step("Validating New Schema")
 
     schemaErrors = newSchema.validate_self()
+    Profiling.count("validation_errors", len(schemaErrors))
     
     if len(schemaErrors) > 0:
         print_errors(schemaErrors, False)
@@ -161,9 +325,12 @@ def create_new_migration(dbSchemaFilePath: str, migrationsFolder: str):
     print_command_step("Assembling and Validating Existing Schema")
 
     existingMigrations = get_all_migrations(migrationsFolder)
-    previousSchema = DatabaseSchema([])
-    for migration in existingMigrations:
-        migrationErrors = migration.migrate_schema(previousSchema)
+    checkpoints = SchemaCheckpoints.CheckpointStore(migrationsFolder, existingMigrations)
+    appliedCount, previousSchema = checkpoints.load_latest(len(existingMigrations))
+    print_checkpoint_loaded(existingMigrations, appliedCount)
+
+    for migration in existingMigrations[appliedCount:]:
+        migrationErrors = SchemaCheckpoints.replay_migration(migration, previousSchema)
     
         if len(migrationErrors) > 0:
             print_errors(migrationErrors, True)
@@ -172,6 +339,9 @@ def create_new_migration(dbSchemaFilePath: str, migrationsFolder: str):
         else:
             print(pad_ok(f"Validated migration #{migration.migrationIndex}"))
 
+        appliedCount += 1
+        checkpoints.save_if_due(appliedCount, previousSchema)
+
     # Prints the previous schema
     print_command_step("Showing Previous Schema:")
     print(str(previousSchema))
@@ -180,7 +350,16 @@ def create_new_migration(dbSchemaFilePath: str, migrationsFolder: str):
     print_command_step("Finding changes and creating the new migration")
 
     newIndex = existingMigrations[-1].migrationIndex+1 if len(existingMigrations) > 0 else 0
-    newMigration = SchemaMigration(newIndex, CreateMigration.create_migrations_for_objects(previousSchema.tables, newSchema.tables, Table))
+    try:
+        newMigration = SchemaMigration(newIndex, CreateMigration.create_migrations_for_objects(previousSchema.tables, newSchema.tables, Table, decisions))
+    except CreateMigration.AmbiguousMigrationError as err:
+        print(pad_err(f"Can't decide on a change: {err}"))
+        return
+
+    unusedHints = decisions.get_unused_hints()
+    if len(unusedHints) > 0:
+        print(pad_err(f"Some hints don't match any change, check them for typos: {', '.join(unusedHints)}"))
+        return
 
     # Prints the finalized migration to the user
     print_command_step("Confirming migration")
@@ -190,11 +369,7 @@ def create_new_migration(dbSchemaFilePath: str, migrationsFolder: str):
     
     else:
         print(newMigration)
-        if ask_yes_no("Save this migration?"):
-            
-            if ask_yes_no("Give this migration a name? Use this if you're using a branched repository."):
-                newMigrationName = ask_for_input("Write a unique name here (alphanumeric chars only, no spaces. Underscore allowed.)")
-                newMigration.migrationName = newMigrationName
+        if decisions.confirm_save(newMigration):
 
             newFile = open(os.path.join(migrationsFolder, create_migration_filename(newMigration)),  "w")
             newFile.write(json.dumps(newMigration.to_dict(), indent=4))
@@ -206,10 +381,8 @@ def create_new_migration(dbSchemaFilePath: str, migrationsFolder: str):
 
 def validate_schema(dbSchemaFilePath: str, showContextString: str):
 
-    try:
-        file = open(dbSchemaFilePath)
-    except IOError as err:
-        print(pad_err(f"Failed to open file '{dbSchemaFilePath}': {err}"))
+    if not os.path.exists(dbSchemaFilePath):
+        print(pad_err(f"Failed to open file '{dbSchemaFilePath}': File does not exist."))
         return
     
     # Gets whether to show context
@@ -218,9 +391,12 @@ def validate_schema(dbSchemaFilePath: str, showContextString: str):
     # Reads in the schema, returns if error
     print_command_step("Getting schema...")
     try:
-        dbSchema: DatabaseSchema = DatabaseSchema.from_json(file.read())
+        dbSchema: DatabaseSchema = load_schema_file(dbSchemaFilePath)
         dbSchema.add_table(MIGRATIONS_TABLE.copy())
-    except json.JSONDecodeError as e:
+    except IOError as err:
+        print(pad_err(f"Failed to open file '{dbSchemaFilePath}': {err}"))
+        return
+    except ValueError as e:
         print(pad_err(f"Error reading JSON file: {str(e)}"))
         return
     
@@ -228,6 +404,7 @@ def validate_schema(dbSchemaFilePath: str, showContextString: str):
     print(pad_ok("JSON file is valid."))
     print_command_step("Validating schema...")
     errors: list[ValidationError] = dbSchema.validate_self()
+    Profiling.count("validation_errors", len(errors))
 
     if len(errors) > 0:
         for err in errors:
@@ -251,12 +428,20 @@ def test_migrations(migrationsFolder: str):
     existingMigrations = get_all_migrations(migrationsFolder)
     print(pad_ok(f"Found migrations! Highest index: {existingMigrations[-1].migrationIndex}"))
 
-    schema = DatabaseSchema([])
-    for migration in existingMigrations:
+    checkpoints = SchemaCheckpoints.CheckpointStore(migrationsFolder, existingMigrations)
+    appliedCount, schema = checkpoints.load_latest(len(existingMigrations))
+    print_checkpoint_loaded(existingMigrations, appliedCount)
+
+    for migration in existingMigrations[appliedCount:]:
         print(pad_ok(f"Running migration #{migration.migrationIndex}!"))
-        errors = migration.migrate_schema(schema)
+        errors = SchemaCheckpoints.replay_migration(migration, schema)
         print_errors(errors, False)
 
+        # Only checkpoints a schema that is known to be valid
+        appliedCount += 1
+        if len(errors) == 0:
+            checkpoints.save_if_due(appliedCount, schema)
+
 
     print_command_step("Finished creating end schema:")
     print(str(schema))
@@ -274,39 +459,450 @@ def create_sql_migrations(migrationsFolder: str):
     # Gets all migrations, then checks which have equivalent SQL migrations
     print_command_step("Finding migrations without equivalent SQL migration")
     foundMigrations = get_all_migrations(migrationsFolder)
-    runningSchema = DatabaseSchema([])
+    hasSqlMigration = [os.path.exists(os.path.join(migrationsFolder, create_sqlmigration_filename(migration))) for migration in foundMigrations]
 
-    for migration in foundMigrations:
-        
-        if not os.path.exists(os.path.join(migrationsFolder, create_sqlmigration_filename(migration))):
+    # Only the schema before the first missing SQL migration is needed, so we can resume from
+    # any checkpoint up to that point.
+    firstMissing = hasSqlMigration.index(False) if False in hasSqlMigration else len(foundMigrations)
+    checkpoints = SchemaCheckpoints.CheckpointStore(migrationsFolder, foundMigrations)
+    appliedCount, runningSchema = checkpoints.load_latest(firstMissing)
+
+    for migration in foundMigrations[:appliedCount]:
+        print(pad_ok(f"SQL Migration exists for Migration #{migration.migrationIndex}"))
+
+    for i in range(appliedCount, len(foundMigrations)):
+        migration = foundMigrations[i]
+
+        if not hasSqlMigration[i]:
             print(pad_ok(f"Writing SQL Migration for Migration #{migration.migrationIndex}."))
-            createdSqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, runningSchema)
+            createdSqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, runningSchema, SQLITE_TARGET_VERSION)
             print(createdSqlMigration)
             write_sqlmigration_file(migrationsFolder, createdSqlMigration)
 
         else:
             print(pad_ok(f"SQL Migration exists for Migration #{migration.migrationIndex}"))
 
-        migration.migrate_schema(runningSchema) #NOTE: We assume no validation errors
+        errors = SchemaCheckpoints.replay_migration(migration, runningSchema) #NOTE: We assume no validation errors
+        if len(errors) == 0:
+            checkpoints.save_if_due(i+1, runningSchema)
 
-    # Writes the combined file - this is REGENERATED each time.
-    print(pad_header("Writing new Combined SQL Migrations file"))
+    # Writes the combined file - new migrations are appended, changed ones regenerate it.
+    print_command_step("Writing new Combined SQL Migrations file")
     write_sql_migrations_combined_file(migrationsFolder)
 
     print(pad_success("Created SQL Migrations!"))
 
 
+def show_schema_at_version(migrationsFolder: str, versionString: str):
+
+    if not os.path.exists(migrationsFolder):
+        print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
+        return
+
+    try:
+        version = int(versionString)
+    except ValueError:
+        print(pad_err(f"Version must be a migration index, got '{versionString}'."))
+        return
+
+    # Assembles the schema from the closest checkpoint
+    print_command_step(f"Assembling schema at migration #{version}")
+    existingMigrations = get_all_migrations(migrationsFolder)
+    checkpoints = SchemaCheckpoints.CheckpointStore(migrationsFolder, existingMigrations)
+    schema, errors = checkpoints.get_schema_at_version(version)
+
+    if len(errors) > 0:
+        print_errors(errors, False)
+        print(pad_err(f"Failed to assemble the schema at migration #{version}."))
+        return
+
+    print_command_step(f"Schema at migration #{version}:")
+    print(str(schema))
+
+
+def create_squashed_sql_migration(migrationsFolder: str, fromVersionString: str):
+
+    if not os.path.exists(migrationsFolder):
+        print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
+        return
+
+    try:
+        fromVersion = int(fromVersionString)
+    except ValueError:
+        print(pad_err(f"Version must be a migration index, got '{fromVersionString}'."))
+        return
+
+    existingMigrations = get_all_migrations(migrationsFolder)
+    squashedMigrations = [migration for migration in existingMigrations if migration.migrationIndex > fromVersion]
+    if len(squashedMigrations) == 0:
+        print(pad_err(f"There are no migrations after migration #{fromVersion} to squash."))
+        return
+
+    # Assembles the schema the database is at before the squashed migrations
+    print_command_step(f"Assembling schema at migration #{fromVersion}")
+    checkpoints = SchemaCheckpoints.CheckpointStore(migrationsFolder, existingMigrations)
+    startSchema, errors = checkpoints.get_schema_at_version(fromVersion)
+
+    if len(errors) > 0:
+        print_errors(errors, False)
+        print(pad_err(f"Failed to assemble the schema at migration #{fromVersion}."))
+        return
+
+    print_command_step(f"Squashing migrations #{squashedMigrations[0].migrationIndex} to #{squashedMigrations[-1].migrationIndex}")
+    try:
+        squashedMigration, _ = MigrationSquash.squash_migrations(squashedMigrations, startSchema)
+    except MigrationSquash.SquashError as err:
+        print(pad_err(str(err)))
+        return
+
+    print(str(squashedMigration))
+    sqlMigration = SQLMigrations.create_sql_for_schema_migration(squashedMigration, startSchema, SQLITE_TARGET_VERSION)
+    print(sqlMigration)
+
+    squashedFileName = create_squashed_sqlmigration_filename(fromVersion, squashedMigration.migrationIndex)
+    with open(os.path.join(migrationsFolder, squashedFileName), "w") as file:
+        file.write(json.dumps(sqlMigration.__dict__, indent=4))
+
+    print(pad_success(f"Squashed {len(squashedMigrations)} migrations into {len(sqlMigration.sqlStatements)} SQL statements in '{squashedFileName}'."))
+
+
+def create_baseline_sql_migration(migrationsFolder: str):
+
+    if not os.path.exists(migrationsFolder):
+        print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
+        return
+
+    existingMigrations = get_all_migrations(migrationsFolder)
+    if len(existingMigrations) == 0:
+        print(pad_err(f"There are no migrations in '{migrationsFolder}' to create a baseline from."))
+        return
+
+    # Assembles the latest schema from the closest checkpoint
+    latestMigration = existingMigrations[-1]
+    print_command_step(f"Assembling schema at migration #{latestMigration.migrationIndex}")
+    checkpoints = SchemaCheckpoints.CheckpointStore(migrationsFolder, existingMigrations)
+    schema, errors = checkpoints.get_schema_at_version(latestMigration.migrationIndex)
+
+    if len(errors) > 0:
+        print_errors(errors, False)
+        print(pad_err(f"Failed to assemble the schema at migration #{latestMigration.migrationIndex}."))
+        return
+
+    print_command_step("Writing baseline SQL")
+    sqlMigration = SQLMigrations.create_sql_for_baseline(schema, latestMigration.migrationIndex, latestMigration.migrationName)
+    if MIGRATIONS_TABLE.name not in [table.name for table in schema.tables]:
+        print(pad_warning(f"The schema has no {MIGRATIONS_TABLE.name} table, so the baseline can't record its version."))
+
+    print(sqlMigration)
+    with open(os.path.join(migrationsFolder, SQL_BASELINE_FILE), "w") as file:
+        file.write(json.dumps(sqlMigration.__dict__, indent=4))
+
+    print(pad_success(f"Created baseline at migration #{latestMigration.migrationIndex} with {len(sqlMigration.sqlStatements)} SQL statements in '{SQL_BASELINE_FILE}'."))
+
+
+def apply_migrations(dbFilePath: str, migrationsFolder: str):
+
+    if not os.path.exists(migrationsFolder):
+        print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
+        return
+
+    print_command_step("Finding SQL migrations")
+    sqlMigrations = get_sql_migrations_as_dicts(migrationsFolder)
+    print(pad_ok(f"Found {len(sqlMigrations)} SQL migrations."))
+
+    # Uses autocommit mode so each migration controls its own transaction
+    try:
+        dbConn = sqlite3.connect(dbFilePath, isolation_level=None)
+    except sqlite3.Error as err:
+        print(pad_err(f"Failed to open database '{dbFilePath}': {err}"))
+        return
+
+    try:
+        appliedVersion = SQLExecution.get_applied_version(dbConn)
+
+        # Skips ahead with a baseline for new databases, or a squashed migration if there is one
+        # for the database's version
+        baselineMigration = read_baseline_sql_migration(migrationsFolder) if SQLExecution.is_database_empty(dbConn) else None
+        squashedMigration = find_squashed_sql_migration(migrationsFolder, appliedVersion)
+        if baselineMigration != None:
+            print(pad_ok(f"Using baseline SQL migration at #{baselineMigration['migrationIndex']} for a new database."))
+            sqlMigrations = [baselineMigration] + [sqlMigration for sqlMigration in sqlMigrations if sqlMigration["migrationIndex"] > baselineMigration["migrationIndex"]]
+        elif squashedMigration != None:
+            print(pad_ok(f"Using squashed SQL migration from #{appliedVersion} to #{squashedMigration['migrationIndex']}."))
+            sqlMigrations = [squashedMigration] + [sqlMigration for sqlMigration in sqlMigrations if sqlMigration["migrationIndex"] > squashedMigration["migrationIndex"]]
+
+        print_command_step(f"Applying pending migrations (database is at migration #{appliedVersion})")
+        SQLExecution.apply_pending_migrations(dbConn, sqlMigrations, COPY_OPTIONS, TUNING_PROFILE)
+    finally:
+        dbConn.close()
+
+
+def verify_sql_migrations(migrationsFolder: str):
+
+    if not os.path.exists(migrationsFolder):
+        print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
+        return
+
+    print_command_step("Finding migrations and SQL migrations")
+    migrations = get_all_migrations(migrationsFolder)
+    sqlMigrations = get_sql_migrations_as_dicts(migrationsFolder)
+    print(pad_ok(f"Found {len(migrations)} migrations and {len(sqlMigrations)} SQL migrations."))
+
+    print_command_step("Applying each SQL migration to an in-memory database and comparing it with the schema")
+    try:
+        verifiedMigrations = SchemaVerification.verify_sql_migrations(migrations, sqlMigrations)
+        failure = None
+    except SchemaVerification.VerificationError as err:
+        verifiedMigrations = err.verifiedMigrations
+        failure = err
+
+    for verifiedMigration in verifiedMigrations:
+        print(pad_ok(f"Verified migration #{verifiedMigration.migrationIndex}: applied in {verifiedMigration.applyDuration*1000:.1f}ms, "
+                     f"compared in {verifiedMigration.compareDuration*1000:.1f}ms"))
+
+    if failure != None:
+        print(pad_err(f"Migration #{failure.migrationIndex} failed verification: {failure}"))
+        return
+
+    # Points out the slowest migration, eg. one rebuilding a large table
+    totalDuration = sum([verifiedMigration.applyDuration for verifiedMigration in verifiedMigrations])
+    if len(verifiedMigrations) > 0:
+        slowestMigration = max(verifiedMigrations, key=lambda verifiedMigration: verifiedMigration.applyDuration)
+        print(pad_ok(f"Slowest migration: #{slowestMigration.migrationIndex} ({slowestMigration.applyDuration*1000:.1f}ms)"))
+
+    print(pad_success(f"Verified {len(verifiedMigrations)} SQL migration(s), applied in {totalDuration*1000:.1f}ms."))
+
+
+def open_database_read_only(dbFilePath: str) -> sqlite3.Connection:
+
+    # Unlike sqlite3.connect(dbFilePath), never creates the file or changes the database
+    return sqlite3.connect(pathlib.Path(dbFilePath).resolve().as_uri() + "?mode=ro", uri=True, isolation_level=None)
+
+
+def introspect_database(dbFilePath: str):
+
+    if not os.path.exists(dbFilePath):
+        print(pad_err(f"Database '{dbFilePath}' does not exist!"))
+        return
+
+    print_command_step("Reading the database's tables, columns, foreign keys and indexes")
+    try:
+        dbConn = open_database_read_only(dbFilePath)
+        try:
+            schema, notes = SchemaIntrospection.introspect_database(dbConn)
+        finally:
+            dbConn.close()
+    except sqlite3.Error as err:
+        print(pad_err(f"Failed to read database '{dbFilePath}': {err}"))
+        return
+
+    for note in notes:
+        print(pad_warning(note))
+
+    # The database can use things a schema file can't (eg. datatypes the tool doesn't know)
+    errors = schema.validate_self()
+    Profiling.count("validation_errors", len(errors))
+    if len(errors) > 0:
+        print_errors(errors, False)
+        print(pad_warning(f"The introspected schema has {len(errors)} validation error(s), so it can't be used as a schema file as is."))
+
+    print_command_step(f"Schema of '{dbFilePath}':")
+    print(json.dumps(schema.to_dict(), indent=4))
+
+
+def check_schema_drift(dbFilePath: str, migrationsFolder: str):
+
+    if not os.path.exists(dbFilePath):
+        print(pad_err(f"Database '{dbFilePath}' does not exist!"))
+        return
+
+    if not os.path.exists(migrationsFolder):
+        print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
+        return
+
+    try:
+        dbConn = open_database_read_only(dbFilePath)
+    except sqlite3.Error as err:
+        print(pad_err(f"Failed to open database '{dbFilePath}': {err}"))
+        return
+
+    try:
+        print_command_step("Finding migrations")
+        existingMigrations = get_all_migrations(migrationsFolder)
+        appliedVersion = SQLExecution.get_applied_version(dbConn)
+        pendingCount = len([migration for migration in existingMigrations if migration.migrationIndex > appliedVersion])
+        print(pad_ok(f"Found {len(existingMigrations)} migrations, the database is at migration #{appliedVersion}."))
+        if pendingCount > 0:
+            print(pad_warning(f"{pendingCount} migration(s) haven't been applied yet, comparing with the schema at migration #{appliedVersion}."))
+
+        # Fast path: a database whose sqlite_master matches one already compared without drift
+        checkpoints = SchemaCheckpoints.CheckpointStore(migrationsFolder, existingMigrations)
+        historyKey = checkpoints.chainKeys[len(existingMigrations) - pendingCount]
+        fingerprint = SchemaIntrospection.get_master_fingerprint(dbConn)
+        if SchemaIntrospection.is_known_fingerprint(migrationsFolder, historyKey, fingerprint):
+            print(pad_success("No drift: the database's schema matches a fingerprint stored after an earlier comparison."))
+            return
+
+        print_command_step(f"Assembling schema at migration #{appliedVersion}")
+        expectedSchema, errors = checkpoints.get_schema_at_version(appliedVersion)
+        if len(errors) > 0:
+            print_errors(errors, False)
+            print(pad_err(f"Failed to assemble the schema at migration #{appliedVersion}."))
+            return
+
+        print_command_step("Comparing the database with the schema")
+        actualSchema, notes = SchemaIntrospection.introspect_database(dbConn)
+        for note in notes:
+            print(pad_warning(note))
+
+        differences = SchemaIntrospection.find_schema_drift(expectedSchema, actualSchema)
+
+    except sqlite3.Error as err:
+        print(pad_err(f"Failed to read database '{dbFilePath}': {err}"))
+        return
+    finally:
+        dbConn.close()
+
+    if len(differences) > 0:
+        for difference in differences:
+            print(pad_err(difference))
+        print(pad_err(f"Found {len(differences)} difference(s) between the database and its migrations."))
+        return
+
+    SchemaIntrospection.save_known_fingerprint(migrationsFolder, historyKey, fingerprint)
+    print(pad_success("No drift: the database matches the schema of its migrations."))
+
+
 def run_tests():
 
     print_command_step("Starting tests...")
-    Tests.run_all_tests()
+    Tests.run_all_tests(JOBS)
+
+
+def run_benchmark(tableCountString: str, columnsPerTableString: str, foreignKeysPerTableString: str, migrationCountString: str, reportFilePath: str):
+
+    try:
+        tableCount = int(tableCountString)
+        columnsPerTable = int(columnsPerTableString)
+        foreignKeysPerTable = float(foreignKeysPerTableString)
+        migrationCount = int(migrationCountString)
+    except ValueError as err:
+        print(pad_err(f"Invalid value for a numeric argument: {err}"))
+        return
+
+    if tableCount < 1 or columnsPerTable < 1 or foreignKeysPerTable < 0 or migrationCount < 1:
+        print(pad_err("Tables, columns and migrations must be at least 1, and foreign keys can't be negative."))
+        return
+
+    print_command_step(f"Benchmarking {tableCount} tables, {migrationCount} migrations ({PipelineBenchmark.DEFAULT_REPEATS} runs per stage)")
+    report = PipelineBenchmark.run_pipeline_benchmark(tableCount, columnsPerTable, foreignKeysPerTable, migrationCount)
+
+    for stageName, stageSummary in report["stages"].items():
+        print(pad_ok(f"{stageName}: median {stageSummary['median_ms']:.1f}ms, p95 {stageSummary['p95_ms']:.1f}ms"))
+
+    try:
+        with open(reportFilePath, "w") as reportFile:
+            reportFile.write(json.dumps(report, indent=4))
+    except IOError as err:
+        print(pad_err(f"Failed to write report '{reportFilePath}': {err}"))
+        return
+
+    print(pad_success(f"Wrote benchmark report to '{reportFilePath}'."))
+
+
+def run_tuning_benchmark(migrationsFolder: str, rowCountsString: str, reportFilePath: str):
+
+    if not os.path.exists(migrationsFolder):
+        print(pad_err(f"Migrations folder '{migrationsFolder}' does not exist!"))
+        return
+
+    try:
+        rowCounts = [int(rowCountString) for rowCountString in rowCountsString.split(",")]
+    except ValueError as err:
+        print(pad_err(f"Invalid value for a row count: {err}"))
+        return
+
+    if any([rowCount < 0 for rowCount in rowCounts]):
+        print(pad_err("Row counts can't be negative."))
+        return
+
+    sqlMigrations = get_sql_migrations_as_dicts(migrationsFolder)
+    profileNames = [TuningBenchmark.DEFAULT_PROFILE_NAME] + list(SQLExecution.TUNING_PROFILES.keys())
+    print_command_step(f"Benchmarking {len(sqlMigrations)} SQL migrations with profiles {', '.join(profileNames)} ({TuningBenchmark.DEFAULT_REPEATS} runs each)")
+    report = TuningBenchmark.run_tuning_benchmark(sqlMigrations, rowCounts)
+
+    if len(report["migrations_run_on_empty_tables"]) > 0:
+        print(pad_warning(f"These migrations can't copy existing rows, so they ran on empty tables: {report['migrations_run_on_empty_tables']}"))
+
+    for rowCountString, profileSummaries in report["row_counts"].items():
+        for profileName, profileSummary in profileSummaries.items():
+            print(pad_ok(f"{rowCountString} rows, {profileName}: median {profileSummary['median_ms']:.1f}ms, p95 {profileSummary['p95_ms']:.1f}ms"))
+
+    try:
+        with open(reportFilePath, "w") as reportFile:
+            reportFile.write(json.dumps(report, indent=4))
+    except IOError as err:
+        print(pad_err(f"Failed to write report '{reportFilePath}': {err}"))
+        return
+
+    print(pad_success(f"Wrote benchmark report to '{reportFilePath}'."))
+
+
+def run_profiled_command(commands: list[Commands.Command], commandName: str, commandArgs: list[str]):
+
+    # Runs the command with every step timed, then writes the report even if the command failed
+    profile = Profiling.start_profile(commandName, commandArgs, PROFILE_STATS_FILE != None, PROFILE_MEMORY)
+    try:
+        Commands.try_call_command(commands, commandName, *commandArgs)
+    finally:
+        report = Profiling.finish_profile()
+
+        print(pad_header("Profile:"))
+        for phase in report["phases"]:
+            counterText = ", ".join([f"{name} {value}" for name, value in phase["counters"].items()])
+            print(pad_ok(f"{phase['duration_ms']:.1f}ms  {phase['name']}" + (f"  ({counterText})" if counterText != "" else "")))
+
+        if report["peak_memory_bytes"] != None:
+            print(pad_ok(f"Peak memory: {report['peak_memory_bytes']/1024/1024:.1f}MB"))
+
+        try:
+            Profiling.write_report(report, PROFILE_FILE)
+            if PROFILE_STATS_FILE != None:
+                profile.write_stats(PROFILE_STATS_FILE)
+        except IOError as err:
+            print(pad_err(f"Failed to write profile: {err}"))
+            return
+
+        print(pad_success(f"Wrote profile report to '{PROFILE_FILE}'."))
+
 
 
 ### MAIN ###
+def pop_flag_value(args: list[str], flag: str) -> str:
+
+    # Removes "flag value" from the args and returns the value, or None if the flag isn't given
+    if flag not in args:
+        return None
+
+    flagIndex = args.index(flag)
+    value = args[flagIndex+1] if flagIndex+1 < len(args) else ""
+    del args[flagIndex:flagIndex+2]
+    return value
+
+
 def main(args: list[str]):
 
     # Using global variables (eg. debug)
     global DEBUG_ON
+    global JOBS
+    global COPY_OPTIONS
+    global TUNING_PROFILE
+    global SQLITE_TARGET_VERSION
+    global NON_INTERACTIVE
+    global HINTS_FILE
+    global PROFILE_FILE
+    global PROFILE_STATS_FILE
+    global PROFILE_MEMORY
 
     # Enables colour
     os.system("color")
@@ -318,6 +914,51 @@ def main(args: list[str]):
     else:
         DEBUG_ON = False
 
+    if "--non-interactive" in args:
+        NON_INTERACTIVE = True
+        args.remove("--non-interactive")
+    else:
+        NON_INTERACTIVE = False
+
+    isOnline = "--online" in args
+    if isOnline:
+        args.remove("--online")
+
+    if "--profile-memory" in args:
+        PROFILE_MEMORY = True
+        args.remove("--profile-memory")
+    else:
+        PROFILE_MEMORY = False
+
+    HINTS_FILE = pop_flag_value(args, "--hints")
+    PROFILE_FILE = pop_flag_value(args, "--profile")
+    PROFILE_STATS_FILE = pop_flag_value(args, "--profile-stats")
+    jobsString = pop_flag_value(args, "--jobs")
+    batchSizeString = pop_flag_value(args, "--batch-size")
+    batchSleepString = pop_flag_value(args, "--batch-sleep")
+    batchThrottleString = pop_flag_value(args, "--batch-throttle")
+    sqliteVersionString = pop_flag_value(args, "--sqlite-version")
+    tuningProfileName = pop_flag_value(args, "--tuning")
+    try:
+        JOBS = max(1, int(jobsString)) if jobsString != None else 1
+        COPY_OPTIONS = SQLExecution.CopyOptions(int(batchSizeString) if batchSizeString != None else 0,
+                                                float(batchSleepString) if batchSleepString != None else 0,
+                                                float(batchThrottleString) if batchThrottleString != None else 0,
+                                                isOnline)
+        SQLITE_TARGET_VERSION = SQLMigrations.parse_sqlite_version(sqliteVersionString) if sqliteVersionString != None else SQLMigrations.DEFAULT_SQLITE_VERSION
+    except ValueError as err:
+        print(pad_err(f"Invalid value for a numeric option: {err}"))
+        return
+
+    if PROFILE_FILE == None and (PROFILE_STATS_FILE != None or PROFILE_MEMORY):
+        print(pad_err("--profile-stats and --profile-memory need a report file, given with --profile FILE."))
+        return
+
+    if tuningProfileName != None and tuningProfileName.lower() not in SQLExecution.TUNING_PROFILES:
+        print(pad_err(f"Unknown tuning profile '{tuningProfileName}', expected one of: {', '.join(SQLExecution.TUNING_PROFILES.keys())}"))
+        return
+    TUNING_PROFILE = SQLExecution.TUNING_PROFILES[tuningProfileName.lower()] if tuningProfileName != None else None
+
     # Creates commands
     commands = [
         Commands.Command("createmigration", 
@@ -340,23 +981,104 @@ def main(args: list[str]):
                 [
                     "folder_with_migrations: The migration folder to use.",
                 ]),
+        Commands.Command("showschema", 
+                "Shows the schema as it was after a given migration, using saved schema checkpoints where possible.",
+                show_schema_at_version,
+                [
+                    "folder_with_migrations: The migration folder to use.",
+                    "version: The index of the migration to show the schema after.",
+                ]),
+        Commands.Command("baseline", 
+                "Creates SQL that sets up a new database directly at the latest migration, creating each table once. 'apply' uses it for empty databases.",
+                create_baseline_sql_migration,
+                [
+                    "folder_with_migrations: The migration folder to use.",
+                ]),
+        Commands.Command("squash", 
+                "Combines every migration after a given version into one SQL migration, so databases at that version rebuild each table at most once. 'apply' uses it automatically.",
+                create_squashed_sql_migration,
+                [
+                    "folder_with_migrations: The migration folder to use.",
+                    "from_version: The migration index the databases are at.",
+                ]),
+        Commands.Command("apply", 
+                "Applies all SQL migrations that haven't been applied yet to an SQLite database, and records them in the migrations table.",
+                apply_migrations,
+                [
+                    "database_file: The SQLite database to migrate. It is created if it doesn't exist.",
+                    "folder_with_migrations: The migration folder to use.",
+                ]),
+        Commands.Command("verify", 
+                "Applies every SQL migration in order to an in-memory database, and checks the tables, columns, foreign keys and indexes match the schema after each one. Stops at the first mismatch.",
+                verify_sql_migrations,
+                [
+                    "folder_with_migrations: The migration folder to use.",
+                ]),
+        Commands.Command("introspect", 
+                "Reads the tables, columns, foreign keys and indexes of an SQLite database and prints them as a schema file.",
+                introspect_database,
+                [
+                    "database_file: The SQLite database to read. It isn't changed.",
+                ]),
+        Commands.Command("drift", 
+                "Compares an SQLite database with the schema replayed from the migrations it has applied, and lists every difference. Databases matching a schema that was already compared are recognised by a hash of sqlite_master and skip the comparison.",
+                check_schema_drift,
+                [
+                    "database_file: The SQLite database to check. It isn't changed.",
+                    "folder_with_migrations: The migration folder to use.",
+                ]),
+        Commands.Command("benchmark", 
+                "Times each stage of the tool on a synthetic schema and migration history, and writes the median and p95 timings as JSON.",
+                run_benchmark,
+                [
+                    "tables: How many tables the synthetic schema has.",
+                    "columns_per_table: How many columns each table starts with.",
+                    "foreign_keys_per_table: Average foreign keys per table (eg. 1.5). Each table references the one before it, extra keys reference random earlier tables.",
+                    "migrations: How many migrations the synthetic history has.",
+                    "report_file: Where to write the JSON report.",
+                ]),
+        Commands.Command("tuningbenchmark", 
+                "Times applying every SQL migration to a new database file with each tuning profile (and without one), filling each rebuilt table with a given number of rows first, and writes the median and p95 timings as JSON.",
+                run_tuning_benchmark,
+                [
+                    "folder_with_migrations: The migration folder to use.",
+                    "row_counts: Comma-separated row counts to benchmark (eg. 1000,10000,100000).",
+                    "report_file: Where to write the JSON report.",
+                ]),
         Commands.Command("runtests", 
-                "Runs a suite of test cases on the migrations.",
+                "Runs a suite of test cases on the migrations. With --jobs N, runs N tests at a time in separate processes.",
                 run_tests,
                 []),
     ]
 
     # Errors out if invalid args
     if len(args) == 0:
-        print("""Expected format: <command> [...args] [-v]""")
+        print("""Expected format: <command> [...args] [-v] [--jobs N] [--batch-size N] [--batch-sleep S] [--batch-throttle R] [--online] [--tuning PROFILE] [--sqlite-version X.Y.Z] [--non-interactive] [--hints FILE] [--profile FILE] [--profile-stats FILE] [--profile-memory]""")
         print(pad_warning(Commands.get_command_list_text(commands)))
         print(pad_warning("-v: Print debug text (ie. be more verbose)"))
+        print(pad_warning("--jobs N: Read and parse migration files using N parallel jobs, or run N tests at a time with 'runtests' (default 1)"))
+        print(pad_warning("--batch-size N: When applying, copy rebuilt tables N rows at a time, committing each batch"))
+        print(pad_warning("--batch-sleep S: When copying in batches, wait S seconds between batches"))
+        print(pad_warning("--batch-throttle R: When copying in batches, also wait R times as long as each batch took"))
+        print(pad_warning(f"--online: When applying, fill rebuilt tables in batches ({SQLExecution.DEFAULT_ONLINE_BATCH_SIZE} rows unless --batch-size is given) while triggers copy concurrent changes, so writers are only blocked while the tables are swapped"))
+        print(pad_warning(f"--tuning PROFILE: When applying, use one of the tuning profiles ({', '.join(SQLExecution.TUNING_PROFILES.keys())}) for the connection's pragmas, turn off foreign key enforcement and check foreign keys with PRAGMA foreign_key_check instead"))
+        for tuningProfile in SQLExecution.TUNING_PROFILES.values():
+            print(pad_warning(f"    {tuningProfile.name}: {tuningProfile.description}"))
+        print(pad_warning("--sqlite-version X.Y.Z: Oldest SQLite version the generated SQL must run on, decides which ALTER TABLE features can replace table rebuilds (default 3.35.0)"))
+        print(pad_warning("--non-interactive: Make 'createmigration' decide on renames and alterations without asking, failing on anything ambiguous"))
+        print(pad_warning("--hints FILE: Declare renames and new objects for 'createmigration' in a JSON file (implies --non-interactive)"))
+        print(pad_warning("--profile FILE: Time each step of the command, count the work done in it (files read, migrations replayed, ...) and write a JSON report to FILE"))
+        print(pad_warning("--profile-stats FILE: With --profile, also run the command under cProfile and write the stats to FILE (readable with pstats)"))
+        print(pad_warning("--profile-memory: With --profile, also record peak memory use. Makes the command slower, so timings aren't comparable to runs without it"))
         return
     
     # Chooses command to run
     commandName = args[0].lower()
     commandArgs = args[1:]
-    Commands.try_call_command(commands, commandName, *commandArgs)
+    if PROFILE_FILE == None:
+        Commands.try_call_command(commands, commandName, *commandArgs)
+    else:
+        run_profiled_command(commands, commandName, commandArgs)
         
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+import os
+import time
+import marshal
+import hashlib
+
+
+### CONSTANTS ###
+PARSE_CACHE_FOLDER = ".parse_cache"
+
+# Bump this whenever the layout of cached objects changes (eg. new keys in the dictionaries of
+# schema or migration classes), so old cache entries are treated as misses.
+PARSE_CACHE_FORMAT_VERSION = 7
+
+# A file changed less than this long before its entry was written may be changed again without
+# its mtime moving (timestamps are only as fine as the filesystem keeps them, 2s on FAT), so its
+# entry is only trusted after comparing hashes.
+RACY_ENTRY_WINDOW_NS = 2_000_000_000
+
+
+
+### UTILITY FUNCTIONS ###
+def get_cache_path(filePath: str) -> str:
+    return os.path.join(os.path.dirname(filePath), PARSE_CACHE_FOLDER, os.path.basename(filePath) + ".marshal")
+
+
+def create_cache_header(fileStat: os.stat_result, fileHash: str) -> dict:
+    return {
+        "version": PARSE_CACHE_FORMAT_VERSION,
+        "size": fileStat.st_size,
+        "mtime": fileStat.st_mtime_ns,
+        "hash": fileHash,
+        "written": time.time_ns()
+    }
+
+
+def read_cache_entry(cachePath: str, fileStat: os.stat_result) -> tuple:
+
+    # Returns the (header, cached dictionary) of an entry made for a file of the same size, or None
+    # if there is no usable entry. The entry is read in one go, unmarshalling it from the open
+    # file would read it a few bytes at a time.
+    # NOTE: Entries are marshalled plain data (never pickles), as the cache sits next to the
+    # migrations and may be shared or committed: loading a tampered entry must not run any code.
+    try:
+        with open(cachePath, "rb") as cacheFile:
+            cacheEntry = marshal.loads(cacheFile.read())
+
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+
+    if (type(cacheEntry) is not tuple or len(cacheEntry) != 2
+        or type(cacheEntry[0]) is not dict or type(cacheEntry[1]) is not dict
+        or cacheEntry[0].get("version") != PARSE_CACHE_FORMAT_VERSION
+        or cacheEntry[0].get("size") != fileStat.st_size):
+        return None
+
+    return cacheEntry
+
+
+def is_entry_current(header: dict, fileStat: os.stat_result) -> bool:
+
+    # Whether the entry can be used without reading the file: its mtime is unchanged, and was
+    # far enough in the past when the entry was written that a later edit would have moved it
+    return (header.get("mtime") == fileStat.st_mtime_ns
+            and type(header.get("written")) is int
+            and fileStat.st_mtime_ns < header["written"] - RACY_ENTRY_WINDOW_NS)
+
+
+def write_cache_entry(cachePath: str, fileStat: os.stat_result, fileHash: str, parsedDict: dict):
+
+    # A failed write only means the next run has to parse the file again
+    try:
+        os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+        with open(cachePath + ".tmp", "wb") as cacheFile:
+            cacheFile.write(marshal.dumps((create_cache_header(fileStat, fileHash), parsedDict)))
+
+        os.replace(cachePath + ".tmp", cachePath)
+
+    except (IOError, ValueError):
+        if os.path.exists(cachePath + ".tmp"):
+            os.remove(cachePath + ".tmp")
+
+
+
+### FUNCTIONS ###
+def load_file_cached(filePath: str, parseFunc, fromDictFunc) -> tuple:
+
+    # Loads a file using parseFunc(fileText), or rebuilds it with fromDictFunc() from the
+    # to_dict() of the parsed object cached for it, if the file hasn't changed.
+    # A hit only needs the file's size and mtime. The file is read and hashed when they don't
+    # prove it unchanged (eg. a checkout rewrote it with the same contents, or the entry is racy),
+    # and a matching hash refreshes the entry so the next run doesn't have to.
+    # Returns a tuple of (parsed object, whether the cache was used).
+    # NOTE: IOErrors from reading the file itself are raised to the caller, as with a plain open().
+    # So are ValueErrors from files that aren't UTF-8 text (UnicodeDecodeError) or that parseFunc
+    # can't parse (eg. JSONDecodeError).
+    cachePath = get_cache_path(filePath)
+    fileStat = os.stat(filePath)
+    cacheEntry = read_cache_entry(cachePath, fileStat)
+    if cacheEntry != None and is_entry_current(cacheEntry[0], fileStat):
+        return (fromDictFunc(cacheEntry[1]), True)
+
+    with open(filePath, "rb") as file:
+        fileStat = os.fstat(file.fileno())
+        contents = file.read()
+
+    fileHash = hashlib.sha256(contents).hexdigest()
+    if cacheEntry != None and cacheEntry[0].get("hash") == fileHash:
+        write_cache_entry(cachePath, fileStat, fileHash, cacheEntry[1])
+        return (fromDictFunc(cacheEntry[1]), True)
+
+    parsedObject = parseFunc(contents.decode("utf-8"))
+    write_cache_entry(cachePath, fileStat, fileHash, parsedObject.to_dict())
+    return (parsedObject, False)
@@ -0,0 +1,154 @@
+import time
+import json
+import sqlite3
+import cProfile
+import platform
+import tracemalloc
+
+
+### CONSTANTS ###
+# Bump this whenever the layout of the report changes, so reports from different releases
+# are only compared when they mean the same thing.
+PROFILE_REPORT_VERSION = 1
+
+# Name of the phase that runs before the command prints its first step
+SETUP_PHASE_NAME = "(setup)"
+
+
+
+### CLASSES ###
+class CommandProfile:
+    commandName: str
+    commandArgs: list[str]
+    phases: list[dict]
+    counters: dict[str, int]
+    profiler: cProfile.Profile
+    tracksMemory: bool
+    startTime: float
+    phaseStartTime: float
+
+    ## Initialization
+    def __init__(self, commandName: str, commandArgs: list[str], usesCProfile: bool = False, tracksMemory: bool = False):
+        self.commandName = commandName
+        self.commandArgs = commandArgs
+        self.phases = []
+        self.counters = {}
+        self.profiler = cProfile.Profile() if usesCProfile else None
+        self.tracksMemory = tracksMemory
+        self.startTime = None
+        self.phaseStartTime = None
+
+
+    ## Usage
+    def start(self):
+        if self.tracksMemory:
+            tracemalloc.start()
+
+        if self.profiler != None:
+            self.profiler.enable()
+
+        self.startTime = time.perf_counter()
+        self.start_phase(SETUP_PHASE_NAME)
+
+
+    def start_phase(self, phaseName: str):
+
+        # Phases follow each other, so starting one ends the previous one
+        self.end_phase()
+        self.phases.append({"name": phaseName, "duration_ms": None, "counters": {}})
+        self.phaseStartTime = time.perf_counter()
+
+
+    def end_phase(self):
+        if self.phaseStartTime == None:
+            return
+
+        self.phases[-1]["duration_ms"] = round((time.perf_counter() - self.phaseStartTime) * 1000, 3)
+        self.phaseStartTime = None
+
+
+    def count(self, counterName: str, amount: int):
+        self.counters[counterName] = self.counters.get(counterName, 0) + amount
+
+        phaseCounters = self.phases[-1]["counters"]
+        phaseCounters[counterName] = phaseCounters.get(counterName, 0) + amount
+
+
+    def finish(self) -> dict:
+
+        # Stops every measurement and returns the report
+        self.end_phase()
+        totalDuration = time.perf_counter() - self.startTime
+
+        if self.profiler != None:
+            self.profiler.disable()
+
+        peakMemory = None
+        if self.tracksMemory:
+            peakMemory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        return {
+            "version": PROFILE_REPORT_VERSION,
+            "command": self.commandName,
+            "args": self.commandArgs,
+            "environment": {
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform()
+            },
+            "total_ms": round(totalDuration * 1000, 3),
+            "phases": self.phases,
+            "counters": dict(sorted(self.counters.items())),
+            "cprofile": self.profiler != None,
+            "memory_traced": self.tracksMemory,
+            "peak_memory_bytes": peakMemory
+        }
+
+
+    def write_stats(self, statsFilePath: str):
+
+        # Written in the pstats format, eg. "python -m pstats FILE" to browse it
+        self.profiler.dump_stats(statsFilePath)
+
+
+
+### FUNCTIONS ###
+# The profile of the running command, or None if it isn't profiled. Only one command runs per
+# process, so a module variable saves passing the profile through every function.
+ACTIVE_PROFILE: CommandProfile = None
+
+
+def start_profile(commandName: str, commandArgs: list[str], usesCProfile: bool = False, tracksMemory: bool = False) -> CommandProfile:
+    global ACTIVE_PROFILE
+
+    ACTIVE_PROFILE = CommandProfile(commandName, commandArgs, usesCProfile, tracksMemory)
+    ACTIVE_PROFILE.start()
+    return ACTIVE_PROFILE
+
+
+def finish_profile() -> dict:
+    global ACTIVE_PROFILE
+
+    report = ACTIVE_PROFILE.finish()
+    ACTIVE_PROFILE = None
+    return report
+
+
+def start_phase(phaseName: str):
+    if ACTIVE_PROFILE != None:
+        ACTIVE_PROFILE.start_phase(phaseName)
+
+
+def count(counterName: str, amount: int = 1):
+
+    # Called by the commands around the work they do (eg. every replayed migration), so does
+    # nothing else when the command isn't profiled.
+    # NOTE: Only call this from the main thread, counters aren't locked.
+    if ACTIVE_PROFILE != None:
+        ACTIVE_PROFILE.count(counterName, amount)
+
+
+def write_report(report: dict, reportFilePath: str):
+    with open(reportFilePath, "w") as reportFile:
+        reportFile.write(json.dumps(report, indent=4))
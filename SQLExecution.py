@@ -0,0 +1,632 @@
+import re
+import time
+import sqlite3
+import collections
+from Migrations import *
+from ColouredText import *
+import SQLMigrations
+import Profiling
+
+
+### CONSTANTS ###
+TRACKING_TABLE_NAME = MIGRATIONS_TABLE.name
+
+# Batch size for online rebuilds when no --batch-size is given
+DEFAULT_ONLINE_BATCH_SIZE = 1000
+
+# Max number of foreign key violations listed in an error
+FOREIGN_KEY_VIOLATIONS_SHOWN = 5
+
+# How SQLite names the index or trigger that makes an ALTER TABLE DROP COLUMN fail
+DROP_COLUMN_ERROR_REGEX = r'error in (index|trigger) (.+) after drop column: '
+
+
+
+### CLASSES ###
+class MigrationApplyError(Exception):
+    migrationIndex: int
+    statement: str
+
+    def __init__(self, migrationIndex: int, statement: str, message: str):
+        super().__init__(message)
+        self.migrationIndex = migrationIndex
+        self.statement = statement
+
+
+
+class CopyOptions:
+    batchSize: int
+    sleepSeconds: float
+    throttleRatio: float
+    online: bool
+
+    ## Initialization
+    def __init__(self, batchSize: int = 0, sleepSeconds: float = 0, throttleRatio: float = 0, online: bool = False):
+        self.batchSize = batchSize
+        self.sleepSeconds = sleepSeconds
+        self.throttleRatio = throttleRatio
+        self.online = online
+
+
+    ## Usage
+    def is_batched(self) -> bool:
+        return self.batchSize > 0 or self.online
+
+
+    def get_batch_size(self) -> int:
+        return self.batchSize if self.batchSize > 0 else DEFAULT_ONLINE_BATCH_SIZE
+
+
+    def get_throttle_delay(self, batchDuration: float) -> float:
+
+        # Waits a fixed time, plus a share of how long the batch took. Slow batches usually mean
+        # other connections are waiting on the database, so we back off more for them.
+        return self.sleepSeconds + batchDuration * self.throttleRatio
+
+
+
+class TuningProfile:
+    name: str
+    description: str
+    pragmas: dict[str, str]
+    checksEachMigration: bool
+
+    # Connection settings for applying migrations. Every profile turns off foreign key enforcement,
+    # as dropping the old table of a rebuild would otherwise delete (or cascade to) the rows
+    # referencing it. Foreign keys are checked with PRAGMA foreign_key_check instead: after each
+    # migration (inside its savepoint, so a violating migration is rolled back) if
+    # checksEachMigration is set, otherwise once after all migrations.
+    def __init__(self, name: str, description: str, pragmas: dict[str, str], checksEachMigration: bool):
+        self.name = name
+        self.description = description
+        self.pragmas = pragmas
+        self.checksEachMigration = checksEachMigration
+
+
+
+### TUNING PROFILES ###
+# NOTE: journal_mode=WAL is stored in the database file, every other setting only lasts for the
+# connection. apply_pending_migrations() restores all of them (foreign_keys too) once it is done.
+TUNING_PROFILES = {
+    "safe": TuningProfile("safe",
+                          "Keeps the journal mode, syncs fully and checks foreign keys after every migration",
+                          {"synchronous": "FULL", "cache_size": "-65536", "temp_store": "DEFAULT", "mmap_size": "0"},
+                          True),
+    "bulk": TuningProfile("bulk",
+                          "Switches to WAL, syncs less often, keeps temporary data and a large cache in memory, and checks foreign keys once at the end",
+                          {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": "-262144", "temp_store": "MEMORY", "mmap_size": "268435456"},
+                          False),
+    "offline": TuningProfile("offline",
+                             "Keeps the journal in memory and never syncs. Only for databases nothing else uses, with a backup: a crash while migrating can corrupt the database",
+                             {"journal_mode": "MEMORY", "synchronous": "OFF", "cache_size": "-1048576", "temp_store": "MEMORY", "mmap_size": "1073741824"},
+                             False),
+}
+
+
+
+### UTILITY FUNCTIONS ###
+def get_tracking_columns(dbConn: sqlite3.Connection) -> list[str]:
+    return [item[0] for item in dbConn.execute(f"SELECT name FROM PRAGMA_TABLE_INFO('{TRACKING_TABLE_NAME}');").fetchall()]
+
+
+def get_applied_version(dbConn: sqlite3.Connection) -> int:
+
+    # Returns the highest migration index recorded in the tracking table, or -1 if the
+    # database has no migrations applied (or no tracking table yet).
+    if len(get_tracking_columns(dbConn)) == 0:
+        return -1
+
+    highestVersion = dbConn.execute(f"SELECT MAX(CAST(Version AS INTEGER)) FROM {TRACKING_TABLE_NAME};").fetchone()[0]
+    return highestVersion if highestVersion != None else -1
+
+
+def record_applied_migration(dbConn: sqlite3.Connection, migrationIndex: int, migrationName: str):
+
+    # Older schemas have a tracking table without a Name column, so only writes the name if it exists
+    trackingColumns = get_tracking_columns(dbConn)
+
+    if len(trackingColumns) == 0:
+        raise MigrationApplyError(migrationIndex, None, f"The table {TRACKING_TABLE_NAME} does not exist after applying migration #{migrationIndex}!")
+
+    # Baseline migrations record themselves, so they aren't recorded twice
+    if dbConn.execute(f"SELECT 1 FROM {TRACKING_TABLE_NAME} WHERE Version = ?;", (str(migrationIndex),)).fetchone() != None:
+        return
+
+    if "Name" in trackingColumns:
+        dbConn.execute(f"INSERT INTO {TRACKING_TABLE_NAME} (Version, Name) VALUES (?, ?);", (str(migrationIndex), migrationName))
+    else:
+        dbConn.execute(f"INSERT INTO {TRACKING_TABLE_NAME} (Version) VALUES (?);", (str(migrationIndex),))
+
+
+
+def apply_tuning_profile(dbConn: sqlite3.Connection, tuningProfile: TuningProfile) -> dict:
+
+    # Must run outside of a transaction, SQLite ignores changes to foreign_keys inside one.
+    # Returns the settings it replaced, for restore_connection_settings().
+    previousSettings = {pragma: dbConn.execute(f"PRAGMA {pragma};").fetchone()[0] for pragma in ["foreign_keys"] + list(tuningProfile.pragmas.keys())}
+
+    dbConn.execute("PRAGMA foreign_keys = OFF;")
+    for pragma, value in tuningProfile.pragmas.items():
+        dbConn.execute(f"PRAGMA {pragma} = {value};").fetchall()
+
+    return previousSettings
+
+
+def restore_connection_settings(dbConn: sqlite3.Connection, previousSettings: dict):
+
+    # Puts back the settings replaced by apply_tuning_profile(). SQLite only leaves WAL mode when
+    # no other connection uses the database, so a journal mode it keeps is warned about.
+    for pragma, value in previousSettings.items():
+        newValue = dbConn.execute(f"PRAGMA {pragma} = {value};").fetchall()
+        if pragma == "journal_mode" and len(newValue) > 0 and str(newValue[0][0]).lower() != str(value).lower():
+            print(pad_warning(f"Could not restore the journal mode to '{value}', it is still '{newValue[0][0]}'."))
+
+
+def get_foreign_key_violations(dbConn: sqlite3.Connection) -> list[tuple]:
+
+    # Returns a (table, rowid, referenced table, foreign key index) tuple for each row whose
+    # foreign key references a row that doesn't exist
+    return dbConn.execute("PRAGMA foreign_key_check;").fetchall()
+
+
+def count_foreign_key_violations(dbConn: sqlite3.Connection) -> collections.Counter:
+
+    # Counts the rows referencing missing rows, per (table, referenced table)
+    return collections.Counter([(table, referencedTable) for table, rowId, referencedTable, keyIndex in get_foreign_key_violations(dbConn)])
+
+
+def rename_violation_counts(violationCounts: collections.Counter, tableRenames: dict) -> collections.Counter:
+
+    # Moves counts taken before a migration to the names its tables have after it, as returned by
+    # SQLMigrations.get_table_renames()
+    renamedCounts = collections.Counter()
+    for (table, referencedTable), count in violationCounts.items():
+        renamedCounts[(tableRenames.get(table, table), tableRenames.get(referencedTable, referencedTable))] += count
+    return renamedCounts
+
+
+def get_new_foreign_key_violations(dbConn: sqlite3.Connection, previousCounts: collections.Counter) -> list[tuple]:
+
+    # Returns the violations of every (table, referenced table) that has more of them than in
+    # previousCounts, so rows that already referenced missing rows before the migrations don't
+    # fail them
+    violations = get_foreign_key_violations(dbConn)
+    violationCounts = collections.Counter([(table, referencedTable) for table, rowId, referencedTable, keyIndex in violations])
+    return [violation for violation in violations if violationCounts[(violation[0], violation[2])] > previousCounts[(violation[0], violation[2])]]
+
+
+def write_foreign_key_violations(violations: list[tuple]) -> str:
+    violationTexts = [f"{table} rowid {rowId} -> {referencedTable}" for table, rowId, referencedTable, keyIndex in violations[:FOREIGN_KEY_VIOLATIONS_SHOWN]]
+    moreText = f" (and {len(violations) - FOREIGN_KEY_VIOLATIONS_SHOWN} more)" if len(violations) > FOREIGN_KEY_VIOLATIONS_SHOWN else ""
+    return f"{len(violations)} row(s) reference missing rows: {', '.join(violationTexts)}{moreText}"
+
+
+def get_online_copy_statement(dbConn: sqlite3.Connection, copyStatement: tuple) -> tuple:
+
+    # Online rebuilds need to find the new row of each old row, to mirror updates and deletes.
+    # If the new table's rowid is a copied INTEGER PRIMARY KEY, rows are matched by it. Otherwise
+    # the old rowids are copied along with the rows and used to match them.
+    # Returns (copy statement, key column in the new table, key column in the old table).
+    newName, insertColumns, selectColumns, oldName = copyStatement
+    insertNames = insertColumns.split(",")
+    selectNames = selectColumns.split(",")
+    primaryKeys = dbConn.execute(f"SELECT name, type FROM PRAGMA_TABLE_INFO('{newName}') WHERE pk > 0;").fetchall()
+
+    if len(primaryKeys) == 1 and primaryKeys[0][1].upper() == "INTEGER" and primaryKeys[0][0] in insertNames:
+        keyIndex = insertNames.index(primaryKeys[0][0])
+        return (copyStatement, insertNames[keyIndex], selectNames[keyIndex])
+
+    return ((newName, "rowid," + insertColumns, "rowid," + selectColumns, oldName), "rowid", "rowid")
+
+
+def find_online_copies(sqlStatements: list[str]) -> dict:
+
+    # Finds the table rebuilds that can be prepared online: copy statements that directly follow
+    # the creation of their new table. Returns {index of the copy statement: copy statement}.
+    onlineCopies = {}
+    for i, statement in enumerate(sqlStatements):
+        copyStatement = SQLMigrations.parse_sql_copy_table(statement)
+        if copyStatement != None and i > 0 and sqlStatements[i-1].startswith(f"CREATE TABLE {copyStatement[0]} ("):
+            onlineCopies[i] = copyStatement
+
+    return onlineCopies
+
+
+def remove_online_copies(dbConn: sqlite3.Connection, onlineCopies: dict):
+
+    # Drops the triggers and new tables of online copies, leaving the old tables as they were
+    for newName, insertColumns, selectColumns, oldName in onlineCopies.values():
+        for dropStatement in SQLMigrations.write_sql_drop_online_rebuild_triggers(newName):
+            dbConn.execute(dropStatement)
+        dbConn.execute(f"DROP TABLE IF EXISTS {newName};")
+
+
+
+def restore_moved_indexes(dbConn: sqlite3.Connection, movedIndexes: list[tuple]):
+
+    # Makes the indexes move_indexes_to_online_copy() dropped again on their old tables, once a
+    # failed online rebuild has removed the new tables. Takes a list of (old table name, list of
+    # (name, sql)).
+    for oldName, droppedIndexes in movedIndexes:
+        restore_table_objects(dbConn, [("index", name, sql) for name, sql in droppedIndexes], oldName, oldName)
+
+
+def capture_table_objects(dbConn: sqlite3.Connection, tableName: str, skippedNames: set[str]) -> list[tuple]:
+
+    # Reads the indexes and triggers of a table that is about to be dropped by a rebuild, so they
+    # can be made again on the new table. Skips the indexes SQLite makes for constraints (they
+    # have no SQL), the triggers of online rebuilds, and anything in skippedNames.
+    # Returns a list of (type, name, sql).
+    tableObjects = dbConn.execute("""SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? COLLATE NOCASE AND sql IS NOT NULL ORDER BY type, name;""",
+                                  (tableName,)).fetchall()
+
+    return [tableObject for tableObject in tableObjects
+            if tableObject[1] not in skippedNames and not tableObject[1].startswith(SQLMigrations.ONLINE_TRIGGER_PREFIX)]
+
+
+def retarget_table_object_sql(sql: str, oldName: str, newName: str) -> str:
+
+    # Points an index or trigger at a renamed table, by replacing the table name after the first
+    # ON (the one naming the table the object belongs to). Names may be quoted.
+    onTableRegex = r'\bON\s+["`\[]?' + re.escape(oldName) + r'["`\]]?(?=[\s(]|$)'
+    return re.sub(onTableRegex, f"ON {newName}", sql, count=1, flags=re.IGNORECASE)
+
+
+def restore_table_objects(dbConn: sqlite3.Connection, tableObjects: list[tuple], oldName: str, newName: str) -> list[str]:
+
+    # Makes captured indexes and triggers again on a rebuilt table, once its data is copied, so
+    # each index is built in one go instead of being updated for every copied row. Objects that
+    # no longer fit the table (eg. indexing a removed column) are skipped with a warning.
+    # Returns the names of the skipped objects.
+    skippedNames = []
+    for objectType, objectName, sql in tableObjects:
+        dbConn.execute("SAVEPOINT restore_table_object;")
+        try:
+            dbConn.execute(retarget_table_object_sql(sql, oldName, newName) if oldName != newName else sql)
+        except sqlite3.OperationalError as err:
+            dbConn.execute("ROLLBACK TO restore_table_object;")
+            print(pad_warning(f"Could not keep {objectType} {objectName} after rebuilding table {newName}, it was dropped: {err}"))
+            skippedNames.append(objectName)
+
+        dbConn.execute("RELEASE restore_table_object;")
+
+    return skippedNames
+
+
+def drop_column_skipping_objects(dbConn: sqlite3.Connection, statement: str, tableName: str, columnName: str) -> list[str]:
+
+    # Runs an ALTER TABLE DROP COLUMN statement. Indexes and triggers created outside of the schema
+    # that use the column make it fail, so each one SQLite reports is dropped with a warning and
+    # the statement is run again. Returns the names of the dropped objects.
+    droppedNames = []
+    while True:
+        try:
+            dbConn.execute(statement)
+            return droppedNames
+        except sqlite3.OperationalError as err:
+            errorMatch = re.match(DROP_COLUMN_ERROR_REGEX, str(err))
+            if errorMatch == None or errorMatch.group(2) in droppedNames:
+                raise err
+
+            objectType, objectName = errorMatch.groups()
+            quotedName = '"' + objectName.replace('"', '""') + '"'
+            dbConn.execute(f"DROP {objectType.upper()} {quotedName};")
+            print(pad_warning(f"Could not keep {objectType} {objectName} after dropping column {tableName}.{columnName}, it was dropped: {err}"))
+            droppedNames.append(objectName)
+
+
+
+### FUNCTIONS ###
+def copy_table_in_batches(dbConn: sqlite3.Connection, copyStatement: tuple, copyOptions: CopyOptions, onlineKeys: tuple = None) -> int:
+
+    # Copies the rows of a table rebuild in rowid order, [batchSize] rows at a time. Each batch is
+    # its own short transaction, so other connections can write to other tables in between and the
+    # WAL file can be checkpointed instead of growing for the whole copy.
+    # NOTE: Nothing stops writes to the old table between batches. Unless the copy is online, they
+    # are lost when the old table is dropped, so the table must be idle until the migration is done.
+    # Takes a copy statement as returned by SQLMigrations.parse_sql_copy_table(). For online
+    # copies, onlineKeys is (key column in the new table, key column in the old table), and rows
+    # the triggers already copied are skipped. Returns the number of batches copied.
+    newName, insertColumns, selectColumns, oldName = copyStatement
+    skipCondition = f" AND NOT EXISTS (SELECT 1 FROM {newName} WHERE {newName}.{onlineKeys[0]} = {oldName}.{onlineKeys[1]})" if onlineKeys != None else ""
+    lastRowId = None
+    batchCount = 0
+
+    while True:
+        batchStart = time.perf_counter()
+        dbConn.execute("BEGIN IMMEDIATE;")
+
+        try:
+            # Finds the rowid the batch ends at, so the insert only touches a rowid range
+            if lastRowId == None:
+                upperRowId = dbConn.execute(f"SELECT MAX(rowid) FROM (SELECT rowid FROM {oldName} ORDER BY rowid LIMIT ?);",
+                                            (copyOptions.get_batch_size(),)).fetchone()[0]
+            else:
+                upperRowId = dbConn.execute(f"SELECT MAX(rowid) FROM (SELECT rowid FROM {oldName} WHERE rowid > ? ORDER BY rowid LIMIT ?);",
+                                            (lastRowId, copyOptions.get_batch_size())).fetchone()[0]
+
+            if upperRowId == None:
+                dbConn.execute("COMMIT;")
+                return batchCount
+
+            if lastRowId == None:
+                copyCursor = dbConn.execute(f"INSERT INTO {newName} ({insertColumns}) SELECT {selectColumns} FROM {oldName} WHERE rowid <= ?{skipCondition} ORDER BY rowid;",
+                                            (upperRowId,))
+            else:
+                copyCursor = dbConn.execute(f"INSERT INTO {newName} ({insertColumns}) SELECT {selectColumns} FROM {oldName} WHERE rowid > ? AND rowid <= ?{skipCondition} ORDER BY rowid;",
+                                            (lastRowId, upperRowId))
+
+            dbConn.execute("COMMIT;")
+            Profiling.count("objects_copied", copyCursor.rowcount)
+
+        except sqlite3.Error as err:
+            dbConn.execute("ROLLBACK;")
+            raise err
+
+        lastRowId = upperRowId
+        batchCount += 1
+
+        throttleDelay = copyOptions.get_throttle_delay(time.perf_counter() - batchStart)
+        if throttleDelay > 0:
+            time.sleep(throttleDelay)
+
+
+def prepare_online_copy(dbConn: sqlite3.Connection, createStatement: str, copyStatement: tuple, copyOptions: CopyOptions):
+
+    # Creates the new table of a rebuild along with triggers that mirror every change to the old
+    # table into it, then copies the old rows over in batches. Other connections can keep using
+    # the old table the whole time, only the final swap has to lock them out.
+    dbConn.execute("BEGIN IMMEDIATE;")
+    try:
+        dbConn.execute(createStatement)
+        onlineCopyStatement, newKey, oldKey = get_online_copy_statement(dbConn, copyStatement)
+        for triggerStatement in SQLMigrations.write_sql_online_rebuild_triggers(onlineCopyStatement, newKey, oldKey):
+            dbConn.execute(triggerStatement)
+
+        dbConn.execute("COMMIT;")
+
+    except sqlite3.Error as err:
+        dbConn.execute("ROLLBACK;")
+        raise err
+
+    copy_table_in_batches(dbConn, onlineCopyStatement, copyOptions, (newKey, oldKey))
+
+
+def move_indexes_to_online_copy(dbConn: sqlite3.Connection, copyStatement: tuple, finalName: str, sqlStatements: list[str],
+                                createdIndexNames: set[str]) -> tuple:
+
+    # Builds the indexes of an online rebuild's new table before the swap, so the swap doesn't hold
+    # the write lock for index builds. SQLite can't rename indexes, so each index of the old table
+    # is dropped and made again on the new table under its name (both in one transaction, so other
+    # connections always see one of them). The indexes the migration creates on the rebuilt table
+    # are made here too, instead of after the rename.
+    # Returns (indexes of the statements the swap skips, (name, sql) of the dropped old indexes).
+    newName, insertColumns, selectColumns, oldName = copyStatement
+    oldIndexes = dbConn.execute("""SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? COLLATE NOCASE AND sql IS NOT NULL ORDER BY name;""",
+                                (oldName,)).fetchall()
+    droppedNames = set([name for name, sql in oldIndexes])
+
+    # The migration's own drops of the old indexes are done here, its creations are moved here
+    skippedStatements = set()
+    createStatements = []
+    for i, statement in enumerate(sqlStatements):
+        createMatch = re.match(SQLMigrations.SQL_CREATE_INDEX_REGEX + r'(\w+) ', statement)
+        dropMatch = re.fullmatch(SQLMigrations.SQL_DROP_INDEX_REGEX, statement)
+        if createMatch != None and createMatch.group(2) == finalName:
+            createStatements.append(retarget_table_object_sql(statement, finalName, newName))
+            skippedStatements.add(i)
+        elif dropMatch != None and dropMatch.group(1) in droppedNames:
+            skippedStatements.add(i)
+
+    dbConn.execute("BEGIN IMMEDIATE;")
+    try:
+        for name, sql in oldIndexes:
+            quotedName = '"' + name.replace('"', '""') + '"'
+            dbConn.execute(f"DROP INDEX {quotedName};")
+
+        restore_table_objects(dbConn, [("index", name, sql) for name, sql in oldIndexes if name not in createdIndexNames], oldName, newName)
+        for statement in createStatements:
+            dbConn.execute(statement)
+
+        dbConn.execute("COMMIT;")
+
+    except sqlite3.Error as err:
+        dbConn.execute("ROLLBACK;")
+        raise err
+
+    return (skippedStatements, oldIndexes)
+
+
+def apply_sql_migration(dbConn: sqlite3.Connection, sqlMigration: dict, copyOptions: CopyOptions = None, checksForeignKeys: bool = False) -> float:
+
+    # Runs every statement of an SQL migration and records it in the tracking table, all inside
+    # one savepoint so a failing migration leaves the database untouched.
+    # If copyOptions are batched, table rebuilds copy their data in separately committed batches.
+    # Everything before the copy is committed first. A failure after that point drops the new
+    # table of the copy again, so running the migration again doesn't trip over it, but leaves any
+    # other committed statements in place.
+    # If copyOptions are online, the new tables of every rebuild are created, filled and indexed
+    # first, while triggers keep them up to date. The rest of the migration (eg. dropping the old
+    # tables and renaming the new ones) then runs in one savepoint, so writers are only locked out
+    # for that. A failure removes the new tables again and makes the old tables' indexes again,
+    # leaving the database as it was.
+    # Indexes and triggers created outside of the schema on a rebuilt table are kept: they are read
+    # before the old table is dropped, and made again on the new table after it is renamed. Those
+    # that use a column dropped with ALTER TABLE are dropped with a warning instead.
+    # If checksForeignKeys is set, a migration leaving more rows that reference missing rows than
+    # there were before it fails.
+    # NOTE: The connection must be in autocommit mode (isolation_level=None), otherwise the
+    # sqlite3 module opens and commits transactions on its own.
+    migrationIndex = sqlMigration["migrationIndex"]
+    savepointName = f"apply_migration_{migrationIndex}"
+    startTime = time.perf_counter()
+    committedStatements = 0
+    batchedCopies = []
+    sqlStatements = sqlMigration["sqlStatements"]
+    isOnline = copyOptions != None and copyOptions.online
+    onlineCopies = find_online_copies(sqlStatements) if isOnline else {}
+
+    # Indexes the migration creates itself aren't kept, they would exist twice
+    tableRebuilds = SQLMigrations.parse_sql_table_rebuilds(sqlStatements)
+    createdIndexNames = SQLMigrations.get_created_index_names(sqlStatements) if len(tableRebuilds) > 0 else set()
+    capturedObjects = {}
+    previousViolationCounts = count_foreign_key_violations(dbConn) if checksForeignKeys else None
+
+    # Statements done before the swap of an online rebuild, and the old indexes they dropped
+    rebuiltNames = {oldName: finalName for oldName, renameIndex, finalName in tableRebuilds.values()}
+    skippedStatements = set([i for i in onlineCopies.keys()] + [i-1 for i in onlineCopies.keys()])
+    movedIndexes = []
+
+    statement = None
+    try:
+        for i, copyStatement in onlineCopies.items():
+            statement = sqlStatements[i]
+            prepare_online_copy(dbConn, sqlStatements[i-1], copyStatement, copyOptions)
+
+        for i, copyStatement in onlineCopies.items():
+            if copyStatement[3] in rebuiltNames:
+                statement = None
+                movedStatements, droppedIndexes = move_indexes_to_online_copy(dbConn, copyStatement, rebuiltNames[copyStatement[3]], sqlStatements, createdIndexNames)
+                skippedStatements.update(movedStatements)
+                movedIndexes.append((copyStatement[3], droppedIndexes))
+
+    except sqlite3.Error as err:
+        remove_online_copies(dbConn, onlineCopies)
+        restore_moved_indexes(dbConn, movedIndexes)
+        raise MigrationApplyError(migrationIndex, statement, str(err))
+
+    dbConn.execute(f"SAVEPOINT {savepointName};")
+    try:
+        for i, statement in enumerate(sqlStatements):
+            if i in skippedStatements:
+                continue
+
+            if i in tableRebuilds:
+                oldName, renameIndex, finalName = tableRebuilds[i]
+                capturedObjects[renameIndex] = (capture_table_objects(dbConn, oldName, createdIndexNames), oldName, finalName)
+
+            copyStatement = SQLMigrations.parse_sql_copy_table(statement)
+            dropColumnMatch = re.fullmatch(SQLMigrations.SQL_DROP_COLUMN_REGEX, statement)
+
+            if copyStatement != None and copyOptions != None and copyOptions.is_batched() and not isOnline:
+                dbConn.execute(f"RELEASE {savepointName};")
+                committedStatements = i
+                batchedCopies.append((i, copyStatement[0]))
+                copy_table_in_batches(dbConn, copyStatement, copyOptions)
+                committedStatements = i+1
+                dbConn.execute(f"SAVEPOINT {savepointName};")
+            elif dropColumnMatch != None:
+                drop_column_skipping_objects(dbConn, statement, *dropColumnMatch.groups())
+            elif copyStatement != None:
+                Profiling.count("objects_copied", dbConn.execute(statement).rowcount)
+            else:
+                dbConn.execute(statement)
+
+            if i in capturedObjects:
+                restore_table_objects(dbConn, *capturedObjects.pop(i))
+
+        if checksForeignKeys:
+            statement = None
+            violations = get_new_foreign_key_violations(dbConn, rename_violation_counts(previousViolationCounts, SQLMigrations.get_table_renames(sqlStatements)))
+            if len(violations) > 0:
+                raise MigrationApplyError(migrationIndex, None, f"Foreign key check failed: {write_foreign_key_violations(violations)}")
+
+        record_applied_migration(dbConn, migrationIndex, sqlMigration.get("migrationName", None))
+
+    except (sqlite3.Error, MigrationApplyError) as err:
+        if dbConn.in_transaction:
+            dbConn.execute(f"ROLLBACK TO {savepointName};")
+            dbConn.execute(f"RELEASE {savepointName};")
+
+        remove_online_copies(dbConn, onlineCopies)
+        restore_moved_indexes(dbConn, movedIndexes)
+
+        # The new tables of batched copies were committed, and are still there unless their rebuild
+        # was committed too (renaming them). Dropping one undoes its creation and copy.
+        keptStatements = set(range(committedStatements))
+        for copyIndex, newName in batchedCopies:
+            if dbConn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name=?;", (newName,)).fetchone()[0] > 0:
+                dbConn.execute(f"DROP TABLE {newName};")
+                keptStatements -= set([j for j in range(copyIndex+1) if j == copyIndex or sqlStatements[j].startswith(f"CREATE TABLE {newName} (")])
+
+        message = str(err)
+        if len(keptStatements) > 0:
+            message += f" (WARNING: {len(keptStatements)} statement(s) of this migration were already committed before a batched copy)"
+
+        raise MigrationApplyError(migrationIndex, statement if type(err) is not MigrationApplyError else err.statement, message)
+
+    dbConn.execute(f"RELEASE {savepointName};")
+    return time.perf_counter() - startTime
+
+
+def is_database_empty(dbConn: sqlite3.Connection) -> bool:
+    return dbConn.execute("SELECT COUNT(*) FROM sqlite_master;").fetchone()[0] == 0
+
+
+def get_pending_migrations(dbConn: sqlite3.Connection, sqlMigrations: list[dict]) -> list[dict]:
+    appliedVersion = get_applied_version(dbConn)
+    return [sqlMigration for sqlMigration in sqlMigrations if sqlMigration["migrationIndex"] > appliedVersion]
+
+
+def apply_pending_migrations(dbConn: sqlite3.Connection, sqlMigrations: list[dict], copyOptions: CopyOptions = None,
+                             tuningProfile: TuningProfile = None) -> bool:
+
+    # Applies every migration newer than the database's version, in order. Stops at the first
+    # failing migration. Returns whether all pending migrations were applied.
+    # Without a tuning profile, the connection's own settings are used and foreign keys aren't checked.
+    pendingMigrations = get_pending_migrations(dbConn, sqlMigrations)
+    if len(pendingMigrations) == 0:
+        print(pad_ok(f"Database is up to date at migration #{get_applied_version(dbConn)}."))
+        return True
+
+    if tuningProfile == None:
+        return run_pending_migrations(dbConn, pendingMigrations, copyOptions, False, False)
+
+    previousSettings = apply_tuning_profile(dbConn, tuningProfile)
+    print(pad_ok(f"Using the '{tuningProfile.name}' tuning profile."))
+    try:
+        return run_pending_migrations(dbConn, pendingMigrations, copyOptions, tuningProfile.checksEachMigration, not tuningProfile.checksEachMigration)
+    finally:
+        restore_connection_settings(dbConn, previousSettings)
+
+
+def run_pending_migrations(dbConn: sqlite3.Connection, pendingMigrations: list[dict], copyOptions: CopyOptions,
+                           checksEachMigration: bool, checksAtEnd: bool) -> bool:
+
+    # Applies the migrations for apply_pending_migrations(), with foreign keys checked after each
+    # migration, or once after all of them (only reporting violations, as the migrations are
+    # already committed then). Either way only rows that didn't violate their foreign keys before
+    # count.
+    totalTime = 0
+    previousViolationCounts = None
+    if checksAtEnd:
+        startTime = time.perf_counter()
+        previousViolationCounts = count_foreign_key_violations(dbConn)
+        totalTime += time.perf_counter() - startTime
+
+    for sqlMigration in pendingMigrations:
+        try:
+            duration = apply_sql_migration(dbConn, sqlMigration, copyOptions, checksEachMigration)
+        except MigrationApplyError as err:
+            print(pad_err(f"Failed to apply migration #{err.migrationIndex}: {str(err)}"))
+            if err.statement != None:
+                print(pad_err(f"Failing statement: {err.statement}"))
+            return False
+
+        totalTime += duration
+        print(pad_ok(f"Applied migration #{sqlMigration['migrationIndex']} in {duration*1000:.1f}ms"))
+
+        if previousViolationCounts != None:
+            previousViolationCounts = rename_violation_counts(previousViolationCounts, SQLMigrations.get_table_renames(sqlMigration["sqlStatements"]))
+
+    if checksAtEnd:
+        startTime = time.perf_counter()
+        violations = get_new_foreign_key_violations(dbConn, previousViolationCounts)
+        totalTime += time.perf_counter() - startTime
+
+        if len(violations) > 0:
+            print(pad_err(f"Foreign key check failed after applying the migrations: {write_foreign_key_violations(violations)}"))
+            return False
+
+    print(pad_success(f"Applied {len(pendingMigrations)} migration(s) in {totalTime*1000:.1f}ms."))
+    return True
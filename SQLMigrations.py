@@ -1,3 +1,4 @@
+import re
 from Migrations import *
 from Schema import *
 
@@ -5,6 +6,20 @@ from Schema import *
 ### CONSTANTS ###
 OLD_TABLE_PREFIX = "PRE_MIGRATION_TABLE_"
 NEW_TABLE_PREFIX = "NEW_CREATED_TABLE_"
+ONLINE_TRIGGER_PREFIX = "ONLINE_REBUILD_"
+# SQLite versions that added the ALTER TABLE features used instead of rebuilds
+SQLITE_RENAME_COLUMN_VERSION = (3, 25, 0)
+SQLITE_DROP_COLUMN_VERSION = (3, 35, 0)
+DEFAULT_SQLITE_VERSION = (3, 35, 0)
+
+SQL_COPY_TABLE_REGEX = r'INSERT INTO (' + NEW_TABLE_PREFIX + r'\w+) \(([\w,]+)\) SELECT ([\w,]+) FROM (\w+);'
+SQL_CREATE_NEW_TABLE_REGEX = r'CREATE TABLE (' + NEW_TABLE_PREFIX + r'\w+) \('
+SQL_DROP_TABLE_REGEX = r'DROP TABLE (\w+);'
+SQL_DROP_COLUMN_REGEX = r'ALTER TABLE (\w+) DROP COLUMN (\w+);'
+SQL_RENAME_NEW_TABLE_REGEX = r'ALTER TABLE (' + NEW_TABLE_PREFIX + r'\w+) RENAME TO (\w+);'
+SQL_RENAME_TABLE_REGEX = r'ALTER TABLE (\w+) RENAME TO (\w+);'
+SQL_CREATE_INDEX_REGEX = r'CREATE (?:UNIQUE )?INDEX (\w+) ON '
+SQL_DROP_INDEX_REGEX = r'DROP INDEX (\w+);'
 
 
 
@@ -53,19 +68,23 @@ def assemble_table_from_migration(oldTable: Table, migration: TableMigration) ->
     return newTable
 
 
+def write_sql_column_definition(column: Column) -> str:
+    colText = f"{column.name} {column.datatype}"
+
+    if column.constraints != None:
+        for constraint in column.constraints:
+            colText += f" {constraint}"
+
+    return colText
+
+
 def write_sql_create_table(table: Table) -> str:
     contentsText = ""
 
     # Inserts the columns - they start without a comma, and end without one
     for i in range(len(table.columns)):
         
-        colData = table.columns[i]
-
-        colText = f"\n\t{colData.name} {colData.datatype}"
-
-        if colData.constraints != None:
-            for constraint in colData.constraints:
-                colText += f" {constraint}"
+        colText = f"\n\t{write_sql_column_definition(table.columns[i])}"
         
         # Adds a comma at the start if it's not the first element
         if i != 0:
@@ -91,6 +110,20 @@ def write_sql_create_table(table: Table) -> str:
     return f"CREATE TABLE {table.name} ({contentsText});"
 
 
+def write_sql_create_index(tableName: str, index: Index) -> str:
+    uniqueText = "UNIQUE " if index.unique else ""
+    whereText = f" WHERE {index.where}" if index.where != None else ""
+    return f"CREATE {uniqueText}INDEX {index.name} ON {tableName} ({', '.join(index.columns)}){whereText};"
+
+
+def write_sql_create_indexes(table: Table) -> list[str]:
+    return [write_sql_create_index(table.name, index) for index in table.indexes]
+
+
+def write_sql_drop_index(indexName: str) -> str:
+    return f"DROP INDEX {indexName};"
+
+
 def write_sql_remove_table(oldName: str) -> str:
     return f"DROP TABLE {oldName};"
 
@@ -98,6 +131,117 @@ def write_sql_remove_table(oldName: str) -> str:
 def write_sql_rename_table(oldName: str, newName: str) -> str:
     return f"ALTER TABLE {oldName} RENAME TO {newName};"
 
+def write_sql_copy_table(newName: str, oldName: str, transferrableColumns: list[tuple]) -> str:
+    insertColumns = ",".join([columnNames[1] for columnNames in transferrableColumns])
+    selectColumns = ",".join([columnNames[0] for columnNames in transferrableColumns])
+    return f"INSERT INTO {newName} ({insertColumns}) SELECT {selectColumns} FROM {oldName};"
+
+
+def parse_sql_copy_table(statement: str) -> tuple:
+
+    # Recognizes the data copy of a table rebuild, as written by write_sql_copy_table(), so it
+    # can be run differently at apply time (eg. in batches).
+    # Returns (new table name, insert columns, select columns, old table name), or None.
+    copyMatch = re.fullmatch(SQL_COPY_TABLE_REGEX, statement)
+    if copyMatch == None:
+        return None
+
+    return (copyMatch.group(1), copyMatch.group(2), copyMatch.group(3), copyMatch.group(4))
+
+
+def parse_sql_table_rebuilds(sqlStatements: list[str]) -> dict:
+
+    # Recognizes the table rebuilds of a migration, as written by create_sql_for_table_rebuild():
+    # the new table is created, the old table dropped and the new table renamed.
+    # Returns {index of the drop statement: (old table name, index of the rename statement, name
+    # of the table after the rename)}.
+    createdTables = {}
+    renamedTables = {}
+    for i, statement in enumerate(sqlStatements):
+        createMatch = re.match(SQL_CREATE_NEW_TABLE_REGEX, statement)
+        if createMatch != None:
+            createdTables[createMatch.group(1)] = i
+
+        renameMatch = re.fullmatch(SQL_RENAME_NEW_TABLE_REGEX, statement)
+        if renameMatch != None:
+            renamedTables[renameMatch.group(1)] = (i, renameMatch.group(2))
+
+    # The old table is the first one dropped after the new table is created
+    tableRebuilds = {}
+    for newName, (renameIndex, finalName) in renamedTables.items():
+        for i in range(createdTables.get(newName, renameIndex) + 1, renameIndex):
+            dropMatch = re.fullmatch(SQL_DROP_TABLE_REGEX, sqlStatements[i])
+            if dropMatch != None:
+                tableRebuilds[i] = (dropMatch.group(1), renameIndex, finalName)
+                break
+
+    return tableRebuilds
+
+
+def get_table_renames(sqlStatements: list[str]) -> dict:
+
+    # Follows the tables of a migration through its renames, including the rename a table rebuild
+    # ends with (which gives the old table's rows a new name).
+    # Returns {name before the migration: name after it} for every renamed table.
+    rebuiltNames = {renameIndex: oldName for oldName, renameIndex, finalName in parse_sql_table_rebuilds(sqlStatements).values()}
+    currentNames = {}
+    for i, statement in enumerate(sqlStatements):
+        renameMatch = re.fullmatch(SQL_RENAME_TABLE_REGEX, statement)
+        if renameMatch == None:
+            continue
+
+        oldName = rebuiltNames.get(i, renameMatch.group(1))
+        originalName = next((original for original, current in currentNames.items() if current == oldName), oldName)
+        currentNames[originalName] = renameMatch.group(2)
+
+    return {originalName: finalName for originalName, finalName in currentNames.items() if originalName != finalName}
+
+
+def get_created_index_names(sqlStatements: list[str]) -> set[str]:
+    return set([indexMatch.group(1) for indexMatch in [re.match(SQL_CREATE_INDEX_REGEX, statement) for statement in sqlStatements] if indexMatch != None])
+
+
+def write_sql_online_rebuild_triggers(copyStatement: tuple, newKey: str, oldKey: str) -> list[str]:
+
+    # Triggers mirroring every change to the old table into the new table while it is copied in
+    # the background. [newKey] in the new table identifies the row with [oldKey] in the old table.
+    # Rows are always copied from the old table after the change, so the column mapping of the
+    # copy statement is reused as is.
+    newName, insertColumns, selectColumns, oldName = copyStatement
+    copyRowText = f"INSERT INTO {newName} ({insertColumns}) SELECT {selectColumns} FROM {oldName} WHERE rowid = NEW.rowid;"
+    deleteRowText = f"DELETE FROM {newName} WHERE {newKey} = OLD.{oldKey};"
+
+    return [
+        f"CREATE TRIGGER {ONLINE_TRIGGER_PREFIX}{newName}_INSERT AFTER INSERT ON {oldName} BEGIN\n\t{copyRowText}\nEND;",
+        f"CREATE TRIGGER {ONLINE_TRIGGER_PREFIX}{newName}_UPDATE AFTER UPDATE ON {oldName} BEGIN\n\t{deleteRowText}\n\t{copyRowText}\nEND;",
+        f"CREATE TRIGGER {ONLINE_TRIGGER_PREFIX}{newName}_DELETE AFTER DELETE ON {oldName} BEGIN\n\t{deleteRowText}\nEND;"
+    ]
+
+
+def write_sql_drop_online_rebuild_triggers(newName: str) -> list[str]:
+    return [f"DROP TRIGGER IF EXISTS {ONLINE_TRIGGER_PREFIX}{newName}_{action};" for action in ["INSERT", "UPDATE", "DELETE"]]
+
+
+def write_sql_record_migration(migrationIndex: int, migrationName: str, includeName: bool) -> str:
+    if not includeName:
+        return f"INSERT INTO {MIGRATIONS_TABLE.name} (Version) VALUES ('{migrationIndex}');"
+
+    nameText = "NULL" if migrationName == None else "'" + migrationName.replace("'", "''") + "'"
+    return f"INSERT INTO {MIGRATIONS_TABLE.name} (Version, Name) VALUES ('{migrationIndex}', {nameText});"
+
+
+def write_sql_add_column(tableName: str, column: Column) -> str:
+    return f"ALTER TABLE {tableName} ADD COLUMN {write_sql_column_definition(column)};"
+
+
+def write_sql_drop_column(tableName: str, columnName: str) -> str:
+    return f"ALTER TABLE {tableName} DROP COLUMN {columnName};"
+
+
+def write_sql_rename_column(tableName: str, oldName: str, newName: str) -> str:
+    return f"ALTER TABLE {tableName} RENAME COLUMN {oldName} TO {newName};"
+
+
 def get_transferrable_columns_for_complex_migration(oldTable: Table, colMigrations: list[ColumnMigration]) -> list[tuple]:
 
     # Transferrable columns are any EDITED or UNCHANGED columns. 
@@ -132,7 +276,7 @@ def get_transferrable_columns_for_complex_migration(oldTable: Table, colMigratio
     return transferrableColumns
 
 
-def create_sql_for_complex_migration(oldTable: Table, tableMigration: TableMigration) -> list[str]:
+def create_sql_for_table_rebuild(oldTable: Table, tableMigration: TableMigration) -> tuple:
     # NOTE: The order of operations is important here. Do not move things around without reason.
     # This is because renaming the old table will break foreign key references to it.
     # (by renaming it, all foreign keys are also renamed - when we then delete it, there are no longer
@@ -142,6 +286,13 @@ def create_sql_for_complex_migration(oldTable: Table, tableMigration: TableMigra
     # 2. Copy all maintained columns from the old table
     # 3. Drop the old table
     # 4. Rename the new table 
+    # 5. Create the indexes of the new table
+
+    # Returns a tuple of (statements for steps 1-3, statement for step 4, statements for step 5),
+    # so callers rebuilding several tables can do every rename last. A rebuilt table may take a
+    # name that another rebuilt table only gives up when that one is dropped.
+    # The copy goes into a table without indexes, so they are built once from the finished data
+    # instead of being updated for every copied row. Dropping the old table drops its indexes.
 
     # Creates the new table with a prefix
     sqlCommands = []
@@ -155,33 +306,144 @@ def create_sql_for_complex_migration(oldTable: Table, tableMigration: TableMigra
     
     # Skips the insert statement if there are no transferrable columns
     if len(transferrableColumns) > 0:
+        sqlCommands.append(write_sql_copy_table(newTable.name, oldTable.name, transferrableColumns))
 
-        insertColumns = ""
-        selectColumns = ""
+    # Drops the old table
+    sqlCommands.append(write_sql_remove_table(oldTable.name))
 
-        for i in range(len(transferrableColumns)):
-            
-            oldName = transferrableColumns[i][0]
-            newName = transferrableColumns[i][1]
-            if i != 0:
-                oldName = "," + oldName
-                newName = "," + newName
+    # Renames the new, prefixed table to its name after the migration. If the migration also
+    # renames the table, this is the new name - the old name is gone along with the old table.
+    renameStatement = write_sql_rename_table(newTable.name, tableMigration.newName)
+    newTable.name = tableMigration.newName
+    return (sqlCommands, renameStatement, write_sql_create_indexes(newTable))
 
-            insertColumns += newName
-            selectColumns += oldName
 
-        insertStatement = f"INSERT INTO {newTable.name} ({insertColumns}) SELECT {selectColumns} FROM {oldTable.name};"
-        sqlCommands.append(insertStatement)
+def create_sql_for_complex_migration(oldTable: Table, tableMigration: TableMigration) -> list[str]:
+    rebuildStatements, renameStatement, indexStatements = create_sql_for_table_rebuild(oldTable, tableMigration)
+    return rebuildStatements + [renameStatement] + indexStatements
 
-    # Drops the old table
-    sqlCommands.append(write_sql_remove_table(oldTable.name))
 
-    # Renames the new table
-    # NOTE: This seems like its using the wrong order but it's right - we're 
-    # renaming the new, prefixed table, to the old, properly named table
-    sqlCommands.append(write_sql_rename_table(newTable.name, oldTable.name)) 
+def parse_sqlite_version(versionString: str) -> tuple:
+
+    # Turns "3.35" or "3.35.5" into a tuple that can be compared with the version constants
+    versionParts = [int(part) for part in versionString.strip().split(".")]
+    while len(versionParts) < 3:
+        versionParts.append(0)
+
+    return tuple(versionParts[:3])
+
+
+def get_normalized_constraints(column: Column) -> list[str]:
+    return [" ".join(constraint.upper().split()) for constraint in column.constraints] if column.constraints != None else []
+
+
+def can_add_column_with_alter(column: Column) -> bool:
+
+    # SQLite can't add a column with ALTER TABLE if it is a PRIMARY KEY, UNIQUE or STORED column,
+    # has a non-constant default, or is NOT NULL without a non-NULL default.
+    # See https://www.sqlite.org/lang_altertable.html#altertabaddcol
+    constraints = get_normalized_constraints(column)
+    defaultValue = None
+
+    for constraint in constraints:
+        if constraint.startswith("PRIMARY KEY") or constraint.startswith("UNIQUE") or constraint.startswith("GENERATED"):
+            return False
+
+        if constraint.startswith("DEFAULT"):
+            defaultValue = constraint[len("DEFAULT"):].strip()
+            if defaultValue.startswith("(") or defaultValue in ["CURRENT_TIME", "CURRENT_DATE", "CURRENT_TIMESTAMP"]:
+                return False
+
+    if "NOT NULL" in constraints and (defaultValue == None or defaultValue == "NULL"):
+        return False
+
+    return True
+
+
+def can_drop_column_with_alter(oldTable: Table, column: Column, oldSchema: DatabaseSchema, droppedIndexNames: set[str] = None) -> bool:
+
+    # SQLite can't drop a column that is a PRIMARY KEY or UNIQUE, is used by a foreign key, is
+    # used by another column's CHECK or GENERATED expression, or is used by an index (in its terms
+    # or WHERE clause). Indexes in droppedIndexNames are dropped before the column, so they don't count.
+    # See https://www.sqlite.org/lang_altertable.html#altertabdropcol
+    for constraint in get_normalized_constraints(column):
+        if constraint.startswith("PRIMARY KEY") or constraint.startswith("UNIQUE"):
+            return False
+
+    for fKey in oldTable.foreignKeys:
+        if fKey.localName == column.name:
+            return False
+
+    for table in oldSchema.tables:
+        for fKey in table.foreignKeys:
+            if fKey.tableName == oldTable.name and fKey.externalName == column.name:
+                return False
+
+    columnNameRegex = r'\b' + re.escape(column.name.upper()) + r'\b'
+    for otherColumn in oldTable.columns:
+        for constraint in get_normalized_constraints(otherColumn):
+            if (constraint.startswith("CHECK") or constraint.startswith("GENERATED")) and re.search(columnNameRegex, constraint):
+                return False
+
+    for index in oldTable.indexes:
+        if droppedIndexNames != None and index.name in droppedIndexNames:
+            continue
+
+        for term in list(index.columns) + ([index.where] if index.where != None else []):
+            if re.search(columnNameRegex, term.upper()):
+                return False
+
+    return True
+
 
-    return sqlCommands
+def create_sql_for_alter_migration(oldTable: Table, tableMigration: TableMigration, oldSchema: DatabaseSchema, targetVersion: tuple) -> list[str]:
+
+    # Tries to perform a table migration with ALTER TABLE statements only, which only change
+    # the table's metadata instead of copying every row like a rebuild does.
+    # Returns None if any part of the migration needs a rebuild.
+    if tableMigration.oldKey != tableMigration.newName or len(tableMigration.fKeyMigrations) != 0:
+        return None
+
+    oldColsDict = IMigratable.create_object_dict(oldTable.columns)
+    droppedIndexNames = set([indexMigration.oldKey for indexMigration in tableMigration.indexMigrations if not indexMigration.is_add()])
+    dropStatements = []
+    renameStatements = []
+    addStatements = []
+    renamedNames = []
+
+    for colMigration in tableMigration.colMigrations:
+        if colMigration.is_add():
+            if not can_add_column_with_alter(colMigration.newColumnData):
+                return None
+            addStatements.append(write_sql_add_column(oldTable.name, colMigration.newColumnData))
+
+        elif colMigration.is_remove():
+            oldColumn = oldColsDict.get(colMigration.oldKey, None)
+            if targetVersion < SQLITE_DROP_COLUMN_VERSION or oldColumn == None or not can_drop_column_with_alter(oldTable, oldColumn, oldSchema, droppedIndexNames):
+                return None
+            dropStatements.append(write_sql_drop_column(oldTable.name, colMigration.oldKey))
+
+        else:
+            # Only pure renames can be done in place, any change to the type or constraints needs a rebuild
+            oldColumn = oldColsDict.get(colMigration.oldKey, None)
+            if oldColumn == None or not oldColumn.compare_contents(colMigration.newColumnData):
+                return None
+
+            if colMigration.newColumnData.name != colMigration.oldKey:
+                if targetVersion < SQLITE_RENAME_COLUMN_VERSION:
+                    return None
+                renameStatements.append(write_sql_rename_column(oldTable.name, colMigration.oldKey, colMigration.newColumnData.name))
+                renamedNames.append(colMigration.newColumnData.name)
+
+    # Renaming onto a name that is still in use (eg. swapping two columns) can't be done one
+    # column at a time, so it is left to a rebuild
+    droppedNames = [colMigration.oldKey for colMigration in tableMigration.colMigrations if colMigration.is_remove()]
+    for renamedName in renamedNames:
+        if renamedName in oldColsDict and renamedName not in droppedNames:
+            return None
+
+    # Drops first so renames can reuse dropped names, and adds last so they can reuse renamed names
+    return dropStatements + renameStatements + addStatements
 
 
 def group_table_migrations(migration: SchemaMigration) -> tuple:
@@ -197,8 +459,11 @@ def group_table_migrations(migration: SchemaMigration) -> tuple:
         elif tableMigration.is_remove():
             removeMigrations.append(tableMigration)
         elif tableMigration.is_edit():
-            if len(tableMigration.colMigrations) == 0:
-                pureRenameMigrations.append(tableMigration)
+            if len(tableMigration.colMigrations) == 0 and len(tableMigration.fKeyMigrations) == 0:
+
+                # Migrations that only change indexes leave the table itself as it is
+                if tableMigration.oldKey != tableMigration.newName:
+                    pureRenameMigrations.append(tableMigration)
             else:
                 complexMigrations.append(tableMigration)
 
@@ -206,7 +471,7 @@ def group_table_migrations(migration: SchemaMigration) -> tuple:
     return (addMigrations, removeMigrations, pureRenameMigrations, complexMigrations)
 
 
-def create_sql_for_schema_migration(migration: SchemaMigration, oldSchema: DatabaseSchema) -> SQLMigration:
+def create_sql_for_schema_migration(migration: SchemaMigration, oldSchema: DatabaseSchema, targetVersion: tuple = DEFAULT_SQLITE_VERSION) -> SQLMigration:
 
     # Splits migrations into groups
     groupedMigrations: tuple = group_table_migrations(migration)
@@ -223,36 +488,110 @@ def create_sql_for_schema_migration(migration: SchemaMigration, oldSchema: Datab
     # NOTE: DO NOT change the order of the following operations. They must happen in this order
     # to avoid name conflicts at any stage of the migration.
 
-    # 1. Goes through PURE RENAME migrations, creates SQL to add prefixes to their old names
+    # 1. Goes through EDIT migrations, drops the indexes they remove or change. This frees their
+    # names for the indexes created at the end, and lets ALTER TABLE drop the columns they use.
+    # Indexes of removed tables are dropped along with the tables.
+    for tableMigration in migration.tableMigrations:
+        if tableMigration.is_edit():
+            for indexMigration in tableMigration.indexMigrations:
+                if not indexMigration.is_add():
+                    sqlMigrations.append(write_sql_drop_index(indexMigration.oldKey))
+
+    # 2. Goes through PURE RENAME migrations, creates SQL to add prefixes to their old names
     # This is to prevent name conflicts if a renamed or new table references a name previous used by 
     # a table that gets renamed later.
     for tableMigration in pureRenameMigrations:
         sqlMigrations.append(write_sql_rename_table(tableMigration.oldKey, OLD_TABLE_PREFIX+tableMigration.oldKey))
 
-    # 2. Goes through REMOVE migrations, adds SQL to remove them
+    # 3. Goes through REMOVE migrations, adds SQL to remove them
     for tableMigration in removeMigrations:
         sqlMigrations.append(write_sql_remove_table(tableMigration.oldKey))
 
-    # 3. Goes through PURE RENAME migrations, adds SQL to rename them
+    # 4. Goes through PURE RENAME migrations, adds SQL to rename them
     for tableMigration in pureRenameMigrations:
         sqlMigrations.append(write_sql_rename_table(OLD_TABLE_PREFIX+tableMigration.oldKey, tableMigration.newName))
 
-    # 4. Goes through COMPLEX migrations, extends migrations with extra migrations for them
+    # 5. Goes through COMPLEX migrations, extends migrations with extra migrations for them. Uses
+    # ALTER TABLE statements if the target SQLite version supports every change, and otherwise
+    # rebuilds the table. Rebuilt tables only get their final names once every old table is
+    # dropped, in case one takes over the name of another.
+    rebuildRenames: list[str] = []
+    indexStatements: list[str] = []
+    rebuiltKeys: set[str] = set()
     for tableMigration in complexMigrations:
-        sqlMigrations.extend(create_sql_for_complex_migration(oldTablesDict[tableMigration.oldKey], tableMigration))
+        oldTable = oldTablesDict[tableMigration.oldKey]
+        alterStatements = create_sql_for_alter_migration(oldTable, tableMigration, oldSchema, targetVersion)
+
+        if alterStatements != None:
+            sqlMigrations.extend(alterStatements)
+        else:
+            rebuildStatements, renameStatement, rebuildIndexStatements = create_sql_for_table_rebuild(oldTable, tableMigration)
+            sqlMigrations.extend(rebuildStatements)
+            rebuildRenames.append(renameStatement)
+            indexStatements.extend(rebuildIndexStatements)
+            rebuiltKeys.add(tableMigration.oldKey)
+
+    sqlMigrations.extend(rebuildRenames)
     
-    # 5. Goes through ADD migrations, adds SQL to create them - this must happen at the end so all
+    # 6. Goes through ADD migrations, adds SQL to create them - this must happen at the end so all
     # renames and complex migrations can happen first
     for tableMigration in addMigrations:
-        sqlMigrations.append(write_sql_create_table(assemble_table_from_migration(None, tableMigration)))
+        newTable = assemble_table_from_migration(None, tableMigration)
+        sqlMigrations.append(write_sql_create_table(newTable))
+        indexStatements.extend(write_sql_create_indexes(newTable))
+
+    # 7. Creates the indexes last, once every table has its final name and all of its data. Tables
+    # that weren't rebuilt only need the indexes their migrations add or change.
+    for tableMigration in migration.tableMigrations:
+        if tableMigration.is_edit() and tableMigration.oldKey not in rebuiltKeys:
+            for indexMigration in tableMigration.indexMigrations:
+                if not indexMigration.is_remove():
+                    indexStatements.append(write_sql_create_index(tableMigration.newName, indexMigration.newIndex))
+
+    sqlMigrations.extend(indexStatements)
 
     return SQLMigration(migration.migrationIndex, sqlMigrations, migration.migrationName)
-            
 
 
-        
-    
+def get_tables_in_dependency_order(schema: DatabaseSchema) -> list[Table]:
+
+    # Orders tables so every table comes after the tables its foreign keys reference. Otherwise
+    # keeps the order of the schema. References to the table itself or to missing tables are
+    # ignored, and tables in a reference cycle are added in schema order once nothing else can be.
+    tableNames = set([table.name for table in schema.tables])
+    remainingTables = schema.tables.copy()
+    createdNames = set()
+    orderedTables = []
+
+    while len(remainingTables) > 0:
+        readyTables = [table for table in remainingTables
+                       if all(fKey.tableName in createdNames or fKey.tableName == table.name or fKey.tableName not in tableNames
+                              for fKey in table.foreignKeys)]
+
+        if len(readyTables) == 0:
+            readyTables = [remainingTables[0]]
+
+        for table in readyTables:
+            orderedTables.append(table)
+            createdNames.add(table.name)
+            remainingTables.remove(table)
+
+    return orderedTables
+
 
+def create_sql_for_baseline(schema: DatabaseSchema, migrationIndex: int, migrationName: str = None) -> SQLMigration:
 
+    # Creates the SQL for setting up a new database directly at the given schema, instead of running
+    # every migration. Also records the migration in the tracking table, so the statements can be
+    # run on their own and later migrations still apply on top.
+    orderedTables = get_tables_in_dependency_order(schema)
+    sqlStatements = [write_sql_create_table(table) for table in orderedTables]
+    for table in orderedTables:
+        sqlStatements.extend(write_sql_create_indexes(table))
 
+    trackingTable = next((table for table in schema.tables if table.name == MIGRATIONS_TABLE.name), None)
+    if trackingTable != None:
+        includeName = "Name" in [col.name for col in trackingTable.columns]
+        sqlStatements.append(write_sql_record_migration(migrationIndex, migrationName, includeName))
 
+    return SQLMigration(migrationIndex, sqlStatements, migrationName)
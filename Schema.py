@@ -1,4 +1,7 @@
+import sys
 import json
+import functools
+import collections
 from enum import Enum
 from ColouredText import colours
 from ValidationErrors import *
@@ -6,7 +9,18 @@ from Interfaces import *
 import DataValidation
 
 
+### UTILITY FUNCTIONS ###
+def intern_string(value: str) -> str:
+
+    # Names, types and constraints repeat across thousands of schema objects, so equal strings
+    # are interned to share one object
+    return sys.intern(value) if type(value) is str else value
+
+
+
+### CLASSES ###
 class ForeignKey(IMigratable):
+    __slots__ = ("localRef", "tableRef", "externalRef", "localName", "externalName", "tableName", "onDelete", "onUpdate", "fingerprint")
     localRef: u'Column'
     tableRef: u'Table'
     externalRef: u'Column'
@@ -15,17 +29,19 @@ class ForeignKey(IMigratable):
     tableName: str
     onDelete: str
     onUpdate: str
+    fingerprint: int
 
     ## Initialization Functions
     def __init__(self, newLocalName: str, newTableName: str, newExternalName: str, newOnDelete: str, newOnUpdate: str):
         self.localRef = None
         self.tableRef = None
         self.externalRef = None
-        self.localName = newLocalName
-        self.externalName = newExternalName
-        self.tableName = newTableName
-        self.onDelete = newOnDelete
-        self.onUpdate = newOnUpdate
+        self.localName = intern_string(newLocalName)
+        self.externalName = intern_string(newExternalName)
+        self.tableName = intern_string(newTableName)
+        self.onDelete = intern_string(newOnDelete)
+        self.onUpdate = intern_string(newOnUpdate)
+        self.fingerprint = None
 
 
     def from_dict(dictionary: dict):
@@ -56,28 +72,15 @@ class ForeignKey(IMigratable):
     def copy(self) -> u'ForeignKey':
         copiedFKey = ForeignKey(self.localName, self.tableName, self.externalName, self.onDelete, self.onUpdate)
         return copiedFKey
-    
 
-    def setup_references(self, ownTable: u'Table', allTables: list[u'Table']):
 
-        # Extracts references to structures by their names
-        for col in ownTable.columns:
-            if col.name == self.localName:
-                self.localRef = col
-                break
-            
-        table = None
-        for currTable in allTables:
-            if currTable.name == self.tableName:
-                table = currTable
-                self.tableRef = currTable
-                break
+    def setup_references(self, ownTable: u'Table', tablesByName: dict):
 
-        if table != None:
-            for external in table.columns:
-                if external.name == self.externalName:
-                    self.externalRef = external
-                    break
+        # Looks up references to structures by their names. References that can't be found are
+        # reset, so a key never keeps pointing at a removed or renamed structure.
+        self.localRef = ownTable.get_column(self.localName)
+        self.tableRef = tablesByName.get(self.tableName, None)
+        self.externalRef = self.tableRef.get_column(self.externalName) if self.tableRef != None else None
 
 
     ## Usage Functions
@@ -85,8 +88,19 @@ class ForeignKey(IMigratable):
         return (f"{self.localName}->{self.tableName}.{self.externalName}")
 
 
+    def get_fingerprint(self) -> int:
+        if self.fingerprint == None:
+            self.fingerprint = hash((self.onDelete, self.onUpdate))
+        return self.fingerprint
+
+
+    def invalidate_fingerprint(self):
+        self.fingerprint = None
+
+
     def compare_contents(self, other: u'ForeignKey') -> bool:
-        return (self.onDelete == other.onDelete
+        return (self.get_fingerprint() == other.get_fingerprint()
+                and self.onDelete == other.onDelete
                 and self.onUpdate == other.onUpdate)
 
 
@@ -97,44 +111,44 @@ class ForeignKey(IMigratable):
         if self.localName == None or len(self.localName) == 0:
             errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE, 
                                           "Foreign Key is missing a local column name!", 
-                                          tableUsed.str_with_line_indicated(foreignKey=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
             
         if self.tableName == None or len(self.tableName) == 0:
             errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE, 
                                           "Foreign Key is missing a foreign table name!", 
-                                          tableUsed.str_with_line_indicated(foreignKey=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
             
         if self.externalName == None or len(self.externalName) == 0:
             errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE, 
                                           "Foreign Key is missing a foreign column name!", 
-                                          tableUsed.str_with_line_indicated(foreignKey=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
         
         # Validates constraint validity
         if self.onUpdate != None and not DataValidation.validate_fkey_constraint(self.onUpdate):
             errors.append(ValidationError(ErrorType.INVALID_VALUE, 
                                                 f"OnUpdate is invalid: '{self.onUpdate}'!", 
-                                                tableUsed.str_with_line_indicated(foreignKey=self)))
+                                                functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
         
         if self.onDelete != None and not DataValidation.validate_fkey_constraint(self.onDelete):
             errors.append(ValidationError(ErrorType.INVALID_VALUE, 
                                                 f"OnDelete is invalid: '{self.onDelete}'!", 
-                                                tableUsed.str_with_line_indicated(foreignKey=self)))
+                                                functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
             
         # Validates that all values reference valid locations
         if self.localRef == None:
             errors.append(ValidationError(ErrorType.UNKNOWN_NAME_REFERENCED, 
                                           "Foreign Key is referencing a nonexistent local column!", 
-                                          tableUsed.str_with_line_indicated(foreignKey=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
             
         if self.tableRef == None:
             errors.append(ValidationError(ErrorType.UNKNOWN_NAME_REFERENCED, 
                                           "Foreign Key is referencing a nonexistent table!", 
-                                          tableUsed.str_with_line_indicated(foreignKey=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
         
         if self.externalRef == None:
             errors.append(ValidationError(ErrorType.UNKNOWN_NAME_REFERENCED, 
                                           "Foreign Key is referencing a nonexistent column in the foreign table!", 
-                                          tableUsed.str_with_line_indicated(foreignKey=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, foreignKey=self)))
         
         return errors
     
@@ -145,9 +159,11 @@ class ForeignKey(IMigratable):
 
 
 class Column(IMigratable):
+    __slots__ = ("name", "datatype", "constraints", "fingerprint")
     name: str
     datatype: str
-    constraints: list[str]
+    constraints: tuple[str, ...]
+    fingerprint: int
 
 
     ## Initialization/Serialization Functions
@@ -157,9 +173,16 @@ class Column(IMigratable):
                  newConstraints: list[str], 
                  ):
         
-        self.name = newName
-        self.datatype = newType
-        self.constraints = newConstraints
+        self.name = intern_string(newName)
+        self.datatype = intern_string(newType)
+
+        # Constraints are stored as an immutable tuple, so copies of a column can share it
+        if newConstraints == None or type(newConstraints) is tuple:
+            self.constraints = newConstraints
+        else:
+            self.constraints = tuple([intern_string(constraint) for constraint in newConstraints])
+
+        self.fingerprint = None
         
 
     def from_dict(dictionary: dict):
@@ -176,12 +199,12 @@ class Column(IMigratable):
         returnDict = {}
         if self.name != None: returnDict["name"] = self.name
         if self.datatype != None: returnDict["type"] = self.datatype
-        if self.constraints != None: returnDict["constraints"] = self.constraints
+        if self.constraints != None: returnDict["constraints"] = list(self.constraints)
         return returnDict
 
 
     def copy(self) -> u'Column':
-        return Column(self.name, self.datatype, self.constraints.copy() if self.constraints != None else None)
+        return Column(self.name, self.datatype, self.constraints)
 
 
     ## Usage Functions
@@ -192,37 +215,49 @@ class Column(IMigratable):
         if self.name == None or len(self.name) == 0:
             errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE, 
                                           "Column is missing a name!", 
-                                          tableUsed.str_with_line_indicated(column=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, column=self)))
         
         if self.datatype == None or len(self.datatype) == 0:
             errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE, 
                                           "Column is missing a datatype!", 
-                                          tableUsed.str_with_line_indicated(column=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, column=self)))
 
         if self.datatype != None and not DataValidation.validate_datatype(self.datatype):
             errors.append(ValidationError(ErrorType.INVALID_VALUE, 
                                           f"Datatype is invalid: '{self.datatype}'!", 
-                                          tableUsed.str_with_line_indicated(column=self)))
+                                          functools.partial(tableUsed.str_with_line_indicated, column=self)))
             
         # Validates constraints - duplication and validity
         if self.constraints != None:
+            constraintCounts = collections.Counter(self.constraints) if len(self.constraints) > 1 else {}
             for constraint in self.constraints:
-                if self.constraints.count(constraint) > 1:
+                if constraintCounts.get(constraint, 1) > 1:
                     errors.append(ValidationError(ErrorType.DUPLICATE,
                                                   f"Duplicate constraint: '{constraint}'",
-                                                  tableUsed.str_with_line_indicated(column=self)))
+                                                  functools.partial(tableUsed.str_with_line_indicated, column=self)))
                     
                 if not DataValidation.validate_constraint(constraint):
                     errors.append(ValidationError(ErrorType.INVALID_VALUE, 
                                                 f"Constraint is invalid: '{constraint}'!", 
-                                                tableUsed.str_with_line_indicated(column=self)))
+                                                functools.partial(tableUsed.str_with_line_indicated, column=self)))
          
         return errors
 
 
+    def get_fingerprint(self) -> int:
+        if self.fingerprint == None:
+            self.fingerprint = hash((self.datatype, self.constraints))
+        return self.fingerprint
+
+
+    def invalidate_fingerprint(self):
+        self.fingerprint = None
+
+
     def compare_contents(self, other: u'Column') -> bool:
 
         # Returns False early if anything fails, otherwise defaults to True
+        if self.get_fingerprint() != other.get_fingerprint(): return False
         if self.datatype != other.datatype: return False
         if self.constraints != other.constraints: return False
 
@@ -235,20 +270,182 @@ class Column(IMigratable):
 
     ## Base Functions
     def __str__(self):
-        return f"{self.name} {self.datatype} {str(self.constraints)}"
+        return f"{self.name} {self.datatype} {str(list(self.constraints) if self.constraints != None else None)}"
+
+
+
+class Index(IMigratable):
+    __slots__ = ("name", "columns", "unique", "where", "fingerprint")
+    name: str
+    columns: tuple[str, ...]
+    unique: bool
+    where: str
+    fingerprint: int
+
+
+    ## Initialization/Serialization Functions
+    def __init__(self, newName: str, newColumns: list[str], newUnique: bool = False, newWhere: str = None):
+
+        # Each indexed column is a column name or an expression, optionally followed by a
+        # collation and a sort order. Stored as a tuple like column constraints.
+        self.name = intern_string(newName)
+        if newColumns == None or type(newColumns) is tuple:
+            self.columns = newColumns
+        else:
+            self.columns = tuple([intern_string(term) for term in newColumns])
+
+        self.unique = newUnique
+        self.where = newWhere
+        self.fingerprint = None
+
+
+    def from_dict(dictionary: dict):
+        if dictionary == None:
+            return None
+
+        return Index(dictionary.get("name", None),
+                     dictionary.get("columns", []),
+                     dictionary.get("unique", False),
+                     dictionary.get("where", None))
+
+
+    def to_dict(self):
+        returnDict = {}
+        if self.name != None: returnDict["name"] = self.name
+        if self.columns != None: returnDict["columns"] = list(self.columns)
+        returnDict["unique"] = self.unique
+        if self.where != None: returnDict["where"] = self.where
+
+        return returnDict
+
+
+    def copy(self) -> u'Index':
+        return Index(self.name, self.columns, self.unique, self.where)
+
+
+    ## Usage Functions
+    def get_column_names(self) -> set[str]:
+
+        # Names of the columns indexed directly. Columns only used in expressions aren't included.
+        columnNames = set()
+        for term in self.columns if self.columns != None else ():
+            columnName = DataValidation.get_indexed_column_name(term)
+            if columnName != None:
+                columnNames.add(columnName)
+
+        return columnNames
+
+
+    def validate_self(self, tableUsed: u'Table') -> list[ValidationError]:
+        errors = []
+
+        # Validates that all values are present
+        if self.name == None or len(self.name) == 0:
+            errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE,
+                                          "Index is missing a name!",
+                                          functools.partial(tableUsed.str_with_line_indicated, index=self)))
+
+        elif self.name.lower().startswith("sqlite_"):
+            errors.append(ValidationError(ErrorType.INVALID_VALUE,
+                                          f"Index name '{self.name}' is reserved by SQLite!",
+                                          functools.partial(tableUsed.str_with_line_indicated, index=self)))
+
+        if self.columns == None or len(self.columns) == 0:
+            errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE,
+                                          "Index has no columns!",
+                                          functools.partial(tableUsed.str_with_line_indicated, index=self)))
+
+        if type(self.unique) is not bool:
+            errors.append(ValidationError(ErrorType.INVALID_VALUE,
+                                          f"Unique must be true or false: '{self.unique}'!",
+                                          functools.partial(tableUsed.str_with_line_indicated, index=self)))
+
+        # Validates the indexed columns - duplication and references to the table's columns
+        if self.columns != None:
+            termCounts = collections.Counter(self.columns) if len(self.columns) > 1 else {}
+            for term in self.columns:
+                if termCounts.get(term, 1) > 1:
+                    errors.append(ValidationError(ErrorType.DUPLICATE,
+                                                  f"Duplicate indexed column: '{term}'",
+                                                  functools.partial(tableUsed.str_with_line_indicated, index=self)))
+
+                columnName = DataValidation.get_indexed_column_name(term)
+                if columnName != None and tableUsed.get_column(columnName) == None:
+                    errors.append(ValidationError(ErrorType.UNKNOWN_NAME_REFERENCED,
+                                                  f"Index is referencing a nonexistent column: '{columnName}'!",
+                                                  functools.partial(tableUsed.str_with_line_indicated, index=self)))
+
+        # Validates the columns used by expression terms and the WHERE clause. SQLite names are
+        # case insensitive, and a missing one would only fail when the SQL runs.
+        expressions = [term for term in self.columns if DataValidation.get_indexed_column_name(term) == None] if self.columns != None else []
+        if type(self.where) is str:
+            expressions.append(self.where)
+
+        if len(expressions) > 0:
+            tableColumnNames = set([column.name.upper() for column in tableUsed.columns if column.name != None])
+            for expression in expressions:
+                for columnName in sorted(DataValidation.get_expression_column_names(expression)):
+                    if columnName.upper() not in tableColumnNames:
+                        errors.append(ValidationError(ErrorType.UNKNOWN_NAME_REFERENCED,
+                                                      f"Index is referencing a nonexistent column: '{columnName}'!",
+                                                      functools.partial(tableUsed.str_with_line_indicated, index=self)))
+
+        return errors
+
+
+    def get_fingerprint(self) -> int:
+        if self.fingerprint == None:
+            self.fingerprint = hash((self.columns, self.unique, self.where))
+        return self.fingerprint
+
+
+    def invalidate_fingerprint(self):
+        self.fingerprint = None
+
+
+    def compare_contents(self, other: u'Index') -> bool:
+        return (self.get_fingerprint() == other.get_fingerprint()
+                and self.columns == other.columns
+                and self.unique == other.unique
+                and self.where == other.where)
+
+
+    def get_key(self) -> str:
+        return self.name
+
+
+    ## Base Functions
+    def __str__(self):
+        uniqueText = "UNIQUE " if self.unique == True else ""
+        whereText = f" WHERE {self.where}" if self.where != None else ""
+        columnsText = ", ".join(self.columns) if self.columns != None else ""
+        return f"{uniqueText}INDEX {self.name} ({columnsText}){whereText}"
 
 
 
 class Table(IMigratable):
+    __slots__ = ("name", "columns", "foreignKeys", "indexes", "columnsByName", "fingerprint")
     name: str
     columns: list[Column]
     foreignKeys: list[ForeignKey]
+    indexes: list[Index]
+    columnsByName: dict[str, Column]
+    fingerprint: int
 
     ## Initialization Functions
-    def __init__(self, newName: str, newColumns: list[Column], newForeignKeys: list[ForeignKey]):
-        self.name = newName
+    def __init__(self, newName: str, newColumns: list[Column], newForeignKeys: list[ForeignKey], newIndexes: list[Index] = None):
+        self.name = intern_string(newName)
         self.columns = newColumns
         self.foreignKeys = newForeignKeys
+        self.indexes = newIndexes if newIndexes != None else []
+
+        # NOTE: If names are duplicated, the index points to the first column with the name (like
+        # a search through the list would). Duplicate names are a validation error anyway.
+        self.columnsByName = {}
+        for col in newColumns:
+            self.columnsByName.setdefault(col.name, col)
+
+        self.fingerprint = None
 
 
     def from_dict(dictionary: dict):
@@ -257,7 +454,8 @@ class Table(IMigratable):
         
         return Table(dictionary.get("name", None), 
                      [Column.from_dict(item) for item in dictionary.get("columns", [])],
-                     [ForeignKey.from_dict(item) for item in dictionary.get("foreign_keys", [])])
+                     [ForeignKey.from_dict(item) for item in dictionary.get("foreign_keys", [])],
+                     [Index.from_dict(item) for item in dictionary.get("indexes", [])])
     
     def to_dict(self):
         returnDict = {}
@@ -265,15 +463,35 @@ class Table(IMigratable):
         returnDict["name"] = self.name
         returnDict["columns"] = [col.to_dict() for col in self.columns]
         returnDict["foreign_keys"] = [fKey.to_dict() for fKey in self.foreignKeys]
+        returnDict["indexes"] = [index.to_dict() for index in self.indexes]
 
         return returnDict
 
 
-    def setup_foreign_key_refs(self, allTables: list[u'Table']):
+    def setup_foreign_key_refs(self, tablesByName: dict):
         
         if self.foreignKeys != None:
             for fKey in self.foreignKeys:
-                fKey.setup_references(self, allTables)
+                fKey.setup_references(self, tablesByName)
+
+
+    def get_column(self, name: str) -> Column:
+        return self.columnsByName.get(name, None)
+
+
+    def get_referenced_table_names(self) -> set[str]:
+        return set([fKey.tableName for fKey in self.foreignKeys])
+
+
+    def reindex_column_name(self, name: str):
+
+        # Points the index entry for a name back at the first column using it, after that column
+        # was removed or renamed
+        self.columnsByName.pop(name, None)
+        for col in self.columns:
+            if col.name == name:
+                self.columnsByName[name] = col
+                break
 
 
     ## Usage Functions
@@ -284,32 +502,38 @@ class Table(IMigratable):
         if self.name == None:
             errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE, 
                                           f"Table is missing a name!", 
-                                          self.str_with_line_indicated(indicateSelf=True)))
+                                          functools.partial(self.str_with_line_indicated, indicateSelf=True)))
         
         if len(self.columns) == 0:
             errors.append(ValidationError(ErrorType.MISSING_REQUIRED_VALUE, 
                                           f"Table has no columns!", 
-                                          self.str_with_line_indicated(indicateSelf=True)))
+                                          functools.partial(self.str_with_line_indicated, indicateSelf=True)))
         
         # Validates each column and checks for name duplication
+        columnNameCounts = collections.Counter([col.name for col in self.columns])
         for col in self.columns:
-            if [otherCol.name for otherCol in self.columns].count(col.name) > 1:
+            if columnNameCounts[col.name] > 1:
                 errors.append(ValidationError(ErrorType.DUPLICATE, 
                                             f"Column name '{col.name}' is used by another column!", 
-                                            self.str_with_line_indicated(column=col)))
+                                            functools.partial(self.str_with_line_indicated, column=col)))
         
             errors.extend(col.validate_self(self))
 
         # Validates each foreign key and checks for identical ones
+        fKeyCounts = collections.Counter([fKey.get_key() for fKey in self.foreignKeys])
         for fKey in self.foreignKeys:
-            for otherFKey in self.foreignKeys:
-                if otherFKey != fKey and fKey.get_key() == otherFKey.get_key():
-                    errors.append(ValidationError(ErrorType.DUPLICATE,
-                                                "Duplicate Foreign Key!",
-                                                self.str_with_line_indicated(foreignKey=fKey)))
+            if fKeyCounts[fKey.get_key()] > 1:
+                errors.append(ValidationError(ErrorType.DUPLICATE,
+                                              "Duplicate Foreign Key!",
+                                              functools.partial(self.str_with_line_indicated, foreignKey=fKey)))
 
             errors.extend(fKey.validate_self(self))
 
+        # Validates each index. Index names are checked by the schema, as they must be unique
+        # across every table.
+        for index in self.indexes:
+            errors.extend(index.validate_self(self))
+
         return errors
     
 
@@ -318,6 +542,17 @@ class Table(IMigratable):
         # Short-circuit return if lists are differing lengths
         if len(ownMembers) != len(otherMembers): return False
 
+        # Matches members by key when keys are unique on both sides
+        ownDict = IMigratable.create_object_dict(ownMembers)
+        otherDict = IMigratable.create_object_dict(otherMembers)
+        if len(ownDict) == len(ownMembers) and len(otherDict) == len(otherMembers):
+            for key, own in ownDict.items():
+                other = otherDict.get(key, None)
+                if other == None or not own.compare_contents(other): return False
+
+            return True
+
+        # Duplicated keys (an invalid table) fall back to sorted arrays.
         # Creates sorted arrays to search through. We will compare each index against the
         # same index.
         # We use the get_key() function to order them, as it should always place them in the same order.
@@ -334,9 +569,30 @@ class Table(IMigratable):
         return True
 
 
+    def get_fingerprint(self) -> int:
+
+        # Sums the hashes of each member's (key, fingerprint), so the order of members is
+        # ignored like in compare_table_members().
+        # NOTE: Members edited in place (rather than through the methods below) need a call to
+        # invalidate_fingerprint() afterwards.
+        if self.fingerprint == None:
+            columnsHash = sum([hash((col.name, col.get_fingerprint())) for col in self.columns])
+            fKeysHash = sum([hash((fKey.get_key(), fKey.get_fingerprint())) for fKey in self.foreignKeys])
+            indexesHash = sum([hash((index.name, index.get_fingerprint())) for index in self.indexes])
+            self.fingerprint = hash((len(self.columns), columnsHash, len(self.foreignKeys), fKeysHash, len(self.indexes), indexesHash))
+        return self.fingerprint
+
+
+    def invalidate_fingerprint(self):
+        self.fingerprint = None
+
+
     def compare_contents(self, other: u'Table') -> bool:
+        if self.get_fingerprint() != other.get_fingerprint(): return False
+
         return (Table.compare_table_members(self.columns, other.columns) 
-                and Table.compare_table_members(self.foreignKeys, other.foreignKeys))
+                and Table.compare_table_members(self.foreignKeys, other.foreignKeys)
+                and Table.compare_table_members(self.indexes, other.indexes))
     
 
     def get_key(self) -> str:
@@ -345,25 +601,54 @@ class Table(IMigratable):
 
     def add_column(self, newCol: Column):
         self.columns.append(newCol)
+        self.columnsByName.setdefault(newCol.name, newCol)
+        self.fingerprint = None
 
 
     def add_foreign_key(self, newFKey: ForeignKey):
         self.foreignKeys.append(newFKey)
+        self.fingerprint = None
 
 
     def remove_column(self, colToRemove: Column):
         self.columns.remove(colToRemove)
+        self.fingerprint = None
+
+        if self.columnsByName.get(colToRemove.name, None) is colToRemove:
+            self.reindex_column_name(colToRemove.name)
+
+
+    def rename_column(self, column: Column, newName: str):
+        oldName = column.name
+        column.name = newName
+        self.fingerprint = None
+
+        if self.columnsByName.get(oldName, None) is column:
+            self.reindex_column_name(oldName)
+        self.columnsByName.setdefault(newName, column)
 
     
     def remove_foreign_key(self, fKeyToRemove: ForeignKey):
         self.foreignKeys.remove(fKeyToRemove)
+        self.fingerprint = None
+
+
+    def add_index(self, newIndex: Index):
+        self.indexes.append(newIndex)
+        self.fingerprint = None
+
+
+    def remove_index(self, indexToRemove: Index):
+        self.indexes.remove(indexToRemove)
+        self.fingerprint = None
 
     
     def copy(self) -> u'Table':
 
         copiedColumns = [col.copy() for col in self.columns] if self.columns != None else []
         copiedFKeys = [fKey.copy() for fKey in self.foreignKeys] if self.foreignKeys != None else []
-        return Table(self.name, copiedColumns, copiedFKeys)
+        copiedIndexes = [index.copy() for index in self.indexes]
+        return Table(self.name, copiedColumns, copiedFKeys, copiedIndexes)
     
 
     ## Display Functions
@@ -375,10 +660,13 @@ class Table(IMigratable):
         for fKey in self.foreignKeys:
             output += f"\t{str(fKey)}\n"
 
+        for index in self.indexes:
+            output += f"\t{str(index)}\n"
+
         return output
     
 
-    def str_with_line_indicated(self, column: Column = None, foreignKey: ForeignKey = None, indicateSelf: bool = False):
+    def str_with_line_indicated(self, column: Column = None, foreignKey: ForeignKey = None, index: Index = None, indicateSelf: bool = False):
 
         indicatorLine = f"{colours.WARNING}^^^^^^^^^^^\n{colours.ENDC}"
         output = f"TABLE {self.name}\n"
@@ -398,32 +686,55 @@ class Table(IMigratable):
             if fKey == foreignKey:
                 output += f"\t{indicatorLine}"
 
+        for tableIndex in self.indexes:
+            output += f"\t{str(tableIndex)}\n"
+
+            if tableIndex == index:
+                output += f"\t{indicatorLine}"
+
         return output
 
 
 
 class DatabaseSchema:
     tables: list[Table]
+    tablesByName: dict[str, Table]
+    referencedBy: dict[str, set[Table]]
+    referencedNames: dict[Table, set[str]]
 
     ## Initialization and Serialization
     def __init__(self, newTables: list[Table]):
         self.tables = newTables
 
+        # Indexes tables by name, and keeps a reverse index from table names to the tables with
+        # foreign keys referencing them. Every table in the schema has an entry in referencedNames.
+        # NOTE: If names are duplicated, the index points to the first table with the name.
+        self.tablesByName = {}
+        self.referencedBy = {}
+        self.referencedNames = {}
+
+        for table in newTables:
+            self.tablesByName.setdefault(table.name, table)
+            self.update_table_references(table)
+
+        self.relink_foreign_keys(newTables)
+
 
     def from_json(jsonString: str):
 
-        # Loads a given JSON string into a new database schema, by loading each table
+        # Loads a given JSON string into a new database schema
+        return DatabaseSchema.from_dict(json.loads(jsonString))
+
+
+    def from_dict(jsonDict: dict):
+
+        # Loads a given dictionary into a new database schema, by loading each table
         # and assigning each an index according to its position in the JSON.
-        jsonDict: dict = json.loads(jsonString)
         jsonTables = jsonDict.get("tables", [])
 
         tables: list[Table] = [Table.from_dict(jsonTable) for jsonTable in jsonTables]
 
-        # After creating the tables, sets up foreign key refs
-        for table in tables:
-            table.setup_foreign_key_refs(tables)
-        
-        # Creates and returns a schema
+        # Creates and returns a schema - this also sets up foreign key refs
         return DatabaseSchema(tables)
 
     
@@ -431,6 +742,52 @@ class DatabaseSchema:
         return {
             "tables": [table.to_dict() for table in self.tables]
         }
+
+
+    ## Indexes and References
+    def get_table(self, name: str) -> Table:
+        return self.tablesByName.get(name, None)
+
+
+    def has_table(self, table: Table) -> bool:
+        return table in self.referencedNames
+
+
+    def get_referencing_tables(self, name: str) -> set[Table]:
+        return self.referencedBy.get(name, set())
+
+
+    def update_table_references(self, table: Table):
+
+        # Updates the reverse index after a table's foreign keys changed
+        oldNames = self.referencedNames.get(table, set())
+        newNames = table.get_referenced_table_names()
+
+        for name in oldNames - newNames:
+            self.referencedBy[name].discard(table)
+            if len(self.referencedBy[name]) == 0:
+                del self.referencedBy[name]
+
+        for name in newNames - oldNames:
+            self.referencedBy.setdefault(name, set()).add(table)
+
+        self.referencedNames[table] = newNames
+
+
+    def relink_foreign_keys(self, tables):
+        for table in tables:
+            table.setup_foreign_key_refs(self.tablesByName)
+
+
+    def reindex_table_name(self, name: str):
+
+        # Points the index entry for a name back at the first table using it, after that table
+        # was removed or renamed
+        self.tablesByName.pop(name, None)
+        for table in self.tables:
+            if table.name == name:
+                self.tablesByName[name] = table
+                break
     
 
     ## Usage Functions
@@ -444,24 +801,55 @@ class DatabaseSchema:
                                           ""))
 
         # Checks for duplicate table names and validates each table
+        tableNameCounts = collections.Counter([table.name for table in self.tables])
         for table in self.tables:
-            if [otherTable.name for otherTable in self.tables].count(table.name) > 1:
+            if tableNameCounts[table.name] > 1:
                 errors.append(ValidationError(ErrorType.DUPLICATE, 
                                               f"Table name '{table.name}' is used by another table!", 
-                                              table.str_with_line_indicated(indicateSelf=True)))
+                                              functools.partial(table.str_with_line_indicated, indicateSelf=True)))
 
             errors.extend(table.validate_self())
 
+        # Index names share one namespace with table names, across the whole database
+        indexNameCounts = collections.Counter([index.name for table in self.tables for index in table.indexes])
+        for table in self.tables:
+            for index in table.indexes:
+                if indexNameCounts[index.name] > 1 or index.name in self.tablesByName:
+                    errors.append(ValidationError(ErrorType.DUPLICATE,
+                                                  f"Index name '{index.name}' is used by another index or table!",
+                                                  functools.partial(table.str_with_line_indicated, index=index)))
+
         return errors
 
 
+    # NOTE: Adding, removing and renaming tables keeps the indexes correct, but doesn't relink
+    # foreign keys. Call relink_foreign_keys() on the affected tables once all changes are made.
     def add_table(self, newTable: Table):
         self.tables.append(newTable)
+        self.tablesByName.setdefault(newTable.name, newTable)
+        self.update_table_references(newTable)
 
 
     def remove_table(self, table: Table):
         self.tables.remove(table)
 
+        if self.tablesByName.get(table.name, None) is table:
+            self.reindex_table_name(table.name)
+
+        for name in self.referencedNames.pop(table, set()):
+            self.referencedBy[name].discard(table)
+            if len(self.referencedBy[name]) == 0:
+                del self.referencedBy[name]
+
+
+    def rename_table(self, table: Table, newName: str):
+        oldName = table.name
+        table.name = newName
+
+        if self.tablesByName.get(oldName, None) is table:
+            self.reindex_table_name(oldName)
+        self.tablesByName.setdefault(newName, table)
+
 
     def compare_equivalence(self, other: u'DatabaseSchema'):
         if len(self.tables) != len(other.tables):
@@ -0,0 +1,164 @@
+import os
+import re
+import json
+import hashlib
+from Schema import *
+from Migrations import *
+from ColouredText import *
+import Profiling
+
+
+### CONSTANTS ###
+CHECKPOINTS_FOLDER = ".schema_checkpoints"
+CHECKPOINT_FILE_REGEX = r'SchemaCheckpoint_([1-9][0-9]*)_([0-9a-f]+)\.json'
+CHECKPOINT_INTERVAL = 10
+
+# Bump this whenever the way migrations are replayed changes, so old checkpoints
+# are no longer considered valid.
+CHECKPOINT_FORMAT_VERSION = "1"
+
+
+
+### UTILITY FUNCTIONS ###
+def get_migration_chain_keys(migrations: list[SchemaMigration]) -> list[str]:
+
+    # Key N identifies the contents of the first N migrations (key 0 is the empty history).
+    # Each key hashes every migration before it, so editing an old migration invalidates
+    # every checkpoint taken after it.
+    runningHash = hashlib.sha256(CHECKPOINT_FORMAT_VERSION.encode())
+    chainKeys = [runningHash.hexdigest()]
+
+    for migration in migrations:
+        runningHash.update(json.dumps(migration.to_dict(), sort_keys=True).encode())
+        runningHash.update(b"\n")
+        chainKeys.append(runningHash.hexdigest())
+
+    return chainKeys
+
+
+def create_checkpoint_filename(count: int, key: str) -> str:
+    return f"SchemaCheckpoint_{count}_{key}.json"
+
+
+def replay_migration(migration: SchemaMigration, schema: DatabaseSchema) -> list[ValidationError]:
+
+    # Runs a migration on a schema, counting it and the errors it finds for --profile
+    errors = migration.migrate_schema(schema)
+    Profiling.count("migrations_replayed")
+    Profiling.count("validation_errors", len(errors))
+    return errors
+
+
+
+### CLASSES ###
+class CheckpointStore:
+    checkpointsFolder: str
+    migrations: list[SchemaMigration]
+    chainKeys: list[str]
+    interval: int
+
+    ## Initialization
+    def __init__(self, migrationsFolder: str, migrations: list[SchemaMigration], interval: int = CHECKPOINT_INTERVAL):
+        self.checkpointsFolder = os.path.join(migrationsFolder, CHECKPOINTS_FOLDER)
+        self.migrations = migrations
+        self.chainKeys = get_migration_chain_keys(migrations)
+        self.interval = interval
+
+
+    ## Loading
+    def get_saved_checkpoints(self) -> dict:
+
+        # Returns a dictionary of {migration count: [keys]} for every checkpoint file on disk
+        savedCheckpoints = {}
+        if not os.path.exists(self.checkpointsFolder):
+            return savedCheckpoints
+
+        for fileName in os.listdir(self.checkpointsFolder):
+            fileMatch = re.fullmatch(CHECKPOINT_FILE_REGEX, fileName)
+            if fileMatch:
+                savedCheckpoints.setdefault(int(fileMatch.group(1)), []).append(fileMatch.group(2))
+
+        return savedCheckpoints
+
+
+    def load_latest(self, maxCount: int) -> tuple:
+
+        # Finds the newest checkpoint that covers at most maxCount migrations and whose key
+        # still matches the migrations on disk. Returns (migrations covered, schema).
+        savedCheckpoints = self.get_saved_checkpoints()
+
+        for count in sorted(savedCheckpoints.keys(), reverse=True):
+            if count > maxCount or count >= len(self.chainKeys):
+                continue
+
+            if self.chainKeys[count] not in savedCheckpoints[count]:
+                continue
+
+            checkpointPath = os.path.join(self.checkpointsFolder, create_checkpoint_filename(count, self.chainKeys[count]))
+            try:
+                with open(checkpointPath) as file:
+                    checkpointDict = json.loads(file.read())
+            except (IOError, json.JSONDecodeError) as err:
+                print(pad_warning(f"Ignoring unreadable schema checkpoint '{checkpointPath}': {err}"))
+                continue
+
+            Profiling.count("checkpoints_loaded")
+            return (count, DatabaseSchema.from_dict(checkpointDict.get("schema", {})))
+
+        return (0, DatabaseSchema([]))
+
+
+    ## Saving
+    def save(self, count: int, schema: DatabaseSchema):
+
+        os.makedirs(self.checkpointsFolder, exist_ok=True)
+
+        # Removes outdated checkpoints for the same position, they can never be valid again
+        for oldKey in self.get_saved_checkpoints().get(count, []):
+            if oldKey != self.chainKeys[count]:
+                os.remove(os.path.join(self.checkpointsFolder, create_checkpoint_filename(count, oldKey)))
+
+        checkpointDict = {
+            "count": count,
+            "migrationIndex": self.migrations[count-1].migrationIndex,
+            "key": self.chainKeys[count],
+            "schema": schema.to_dict()
+        }
+
+        # Writes to a temporary file first so an interrupted run never leaves a broken checkpoint
+        checkpointPath = os.path.join(self.checkpointsFolder, create_checkpoint_filename(count, self.chainKeys[count]))
+        with open(checkpointPath + ".tmp", "w") as file:
+            file.write(json.dumps(checkpointDict))
+        os.replace(checkpointPath + ".tmp", checkpointPath)
+        Profiling.count("checkpoints_saved")
+
+
+    def save_if_due(self, count: int, schema: DatabaseSchema):
+
+        # Only saves every [interval] migrations, and only if it isn't saved already
+        if self.interval <= 0 or count == 0 or count % self.interval != 0:
+            return
+
+        if self.chainKeys[count] in self.get_saved_checkpoints().get(count, []):
+            return
+
+        self.save(count, schema)
+
+
+    ## Usage
+    def get_schema_at_version(self, version: int) -> tuple:
+
+        # Assembles the schema as it was right after the migration with the given index,
+        # starting from the closest checkpoint. Returns (schema, errors).
+        targetCount = len([migration for migration in self.migrations if migration.migrationIndex <= version])
+        appliedCount, schema = self.load_latest(targetCount)
+
+        for migration in self.migrations[appliedCount:targetCount]:
+            errors = replay_migration(migration, schema)
+            if len(errors) > 0:
+                return (schema, errors)
+
+            appliedCount += 1
+            self.save_if_due(appliedCount, schema)
+
+        return (schema, [])
@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import hashlib
+import sqlite3
+from Schema import *
+from Migrations import *
+
+
+### CONSTANTS ###
+DRIFT_FINGERPRINTS_FILE = ".drift_fingerprints.json"
+
+# Bump this whenever introspection or the drift comparison changes, so fingerprints stored by
+# older releases are no longer trusted.
+DRIFT_FORMAT_VERSION = 1
+
+# Databases reach the same version in different ways (eg. from a baseline, or one migration at a
+# time), each leaving different SQL in sqlite_master, so a few fingerprints are kept per history
+FINGERPRINTS_PER_HISTORY = 8
+
+# Start of a CREATE INDEX statement, up to the opening parenthesis of its indexed terms
+INDEX_SQL_START_REGEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?\S+\s+ON\s+[^(]+\(', re.IGNORECASE)
+
+# Foreign key actions SQLite reports when none is declared
+DEFAULT_FKEY_ACTION = "NO ACTION"
+
+
+
+### UTILITY FUNCTIONS ###
+def normalize_sql(sql: str) -> str:
+
+    # SQLite keeps statements as written, and quotes table names it rewrites on ALTER TABLE RENAME
+    return " ".join(sql.replace('"', "").split())
+
+
+def split_index_terms(termsText: str) -> list[str]:
+
+    # Splits on commas outside of parentheses and string literals (eg. "lower(Name), substr(Code, 1, 2)")
+    terms = []
+    depth = 0
+    inString = False
+    termStart = 0
+    for i, char in enumerate(termsText):
+        if char == "'":
+            inString = not inString
+        elif inString:
+            continue
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            terms.append(termsText[termStart:i].strip())
+            termStart = i+1
+
+    terms.append(termsText[termStart:].strip())
+    return terms
+
+
+def parse_index_sql(sql: str) -> tuple:
+
+    # Returns (indexed terms, WHERE condition or None) of a CREATE INDEX statement, or None if it
+    # can't be parsed
+    sql = sql.strip()
+    startMatch = INDEX_SQL_START_REGEX.match(sql)
+    if startMatch == None:
+        return None
+
+    depth = 1
+    for i in range(startMatch.end(), len(sql)):
+        if sql[i] == "(":
+            depth += 1
+        elif sql[i] == ")":
+            depth -= 1
+            if depth == 0:
+                termsText = sql[startMatch.end():i]
+                remainder = sql[i+1:].strip().rstrip(";").strip()
+                where = re.sub(r'^WHERE\s+', "", remainder, flags=re.IGNORECASE) if len(remainder) > 0 else None
+                return (split_index_terms(termsText), where)
+
+    return None
+
+
+def get_column_traits(column: Column) -> dict:
+
+    # The parts of a column definition that can be read back from a database with PRAGMA
+    # table_info. CHECK, COLLATE and GENERATED constraints can't, so they aren't compared.
+    traits = {"type": column.datatype.upper() if column.datatype != None else None,
+              "PRIMARY KEY": False, "AUTOINCREMENT": False, "NOT NULL": False, "UNIQUE": False, "DEFAULT": None}
+
+    for constraint in column.constraints if column.constraints != None else []:
+        upperConstraint = constraint.upper().strip()
+        if upperConstraint.startswith("PRIMARY KEY"):
+            traits["PRIMARY KEY"] = True
+            traits["AUTOINCREMENT"] = "AUTOINCREMENT" in upperConstraint
+            traits["NOT NULL"] = traits["NOT NULL"] or re.search(r'\bNOT\s+NULL\b', upperConstraint) != None
+        elif re.fullmatch(r'NOT\s*NULL', upperConstraint) != None:
+            traits["NOT NULL"] = True
+        elif upperConstraint == "UNIQUE":
+            traits["UNIQUE"] = True
+        elif upperConstraint.startswith("DEFAULT"):
+            traits["DEFAULT"] = constraint.strip()[len("DEFAULT"):].strip()
+
+    return traits
+
+
+def get_fkey_action(action: str) -> str:
+    action = " ".join(action.upper().split()) if action != None else ""
+    return None if len(action) == 0 or action == DEFAULT_FKEY_ACTION else action
+
+
+def get_fkey_description(fKey: ForeignKey) -> str:
+
+    # Foreign keys have no name, so they are compared by their columns and actions
+    return (f"{fKey.localName}->{fKey.tableName}.{fKey.externalName} (ON DELETE {get_fkey_action(fKey.onDelete) or DEFAULT_FKEY_ACTION}, "
+            f"ON UPDATE {get_fkey_action(fKey.onUpdate) or DEFAULT_FKEY_ACTION})")
+
+
+def get_index_description(index: Index) -> tuple:
+    return (index.unique, tuple([normalize_sql(term).upper() for term in index.columns]), normalize_sql(index.where).upper() if index.where != None else None)
+
+
+
+### INTROSPECTION ###
+def introspect_columns(dbConn: sqlite3.Connection, tableName: str, tableSql: str, notes: list[str]) -> list[Column]:
+    tableInfo = dbConn.execute(f"""SELECT name, type, "notnull", dflt_value, pk FROM PRAGMA_TABLE_INFO('{tableName}');""").fetchall()
+    primaryKeyNames = [item[0] for item in tableInfo if item[4] > 0]
+    if len(primaryKeyNames) > 1:
+        notes.append(f"Table {tableName} has a composite primary key ({', '.join(primaryKeyNames)}), which the schema format can't express.")
+
+    # Single-column UNIQUE constraints make an automatic index with origin 'u'
+    uniqueNames = set()
+    for (indexName,) in dbConn.execute(f"""SELECT name FROM PRAGMA_INDEX_LIST('{tableName}') WHERE origin = 'u';""").fetchall():
+        indexedNames = [item[0] for item in dbConn.execute(f"""SELECT name FROM PRAGMA_INDEX_INFO('{indexName}');""").fetchall()]
+        if len(indexedNames) == 1:
+            uniqueNames.add(indexedNames[0])
+        else:
+            notes.append(f"Table {tableName} has a UNIQUE constraint on several columns ({', '.join(indexedNames)}), which the schema format can't express.")
+
+    hasAutoincrement = re.search(r'\bAUTOINCREMENT\b', tableSql, re.IGNORECASE) != None
+
+    columns = []
+    for name, datatype, notNull, defaultValue, primaryKey in tableInfo:
+        constraints = []
+        if primaryKey > 0 and len(primaryKeyNames) == 1:
+            constraints.append("PRIMARY KEY AUTOINCREMENT" if hasAutoincrement else "PRIMARY KEY")
+        if notNull:
+            constraints.append("NOT NULL")
+        if name in uniqueNames:
+            constraints.append("UNIQUE")
+        if defaultValue != None:
+            constraints.append(f"DEFAULT {defaultValue}")
+
+        columns.append(Column(name, datatype, constraints))
+
+    return columns
+
+
+def introspect_foreign_keys(dbConn: sqlite3.Connection, tableName: str, notes: list[str]) -> list[ForeignKey]:
+
+    # Rows of one foreign key share its id, with one row per column
+    keyRows = {}
+    for keyId, referencedTable, localName, externalName, onUpdate, onDelete in dbConn.execute(
+            f"""SELECT id, "table", "from", "to", on_update, on_delete FROM PRAGMA_FOREIGN_KEY_LIST('{tableName}');""").fetchall():
+        keyRows.setdefault(keyId, []).append((referencedTable, localName, externalName, onUpdate, onDelete))
+
+    foreignKeys = []
+    for rows in keyRows.values():
+        if len(rows) > 1:
+            notes.append(f"Table {tableName} has a foreign key on several columns ({', '.join([row[1] for row in rows])}), which the schema format can't express.")
+            continue
+
+        referencedTable, localName, externalName, onUpdate, onDelete = rows[0]
+
+        # A foreign key without a column list references the primary key
+        if externalName == None:
+            primaryKeyNames = [item[0] for item in dbConn.execute(f"""SELECT name FROM PRAGMA_TABLE_INFO('{referencedTable}') WHERE pk > 0;""").fetchall()]
+            externalName = primaryKeyNames[0] if len(primaryKeyNames) == 1 else None
+
+        foreignKeys.append(ForeignKey(localName, referencedTable, externalName, get_fkey_action(onDelete), get_fkey_action(onUpdate)))
+
+    return foreignKeys
+
+
+def introspect_indexes(dbConn: sqlite3.Connection, tableName: str, notes: list[str]) -> list[Index]:
+
+    # Only indexes made with CREATE INDEX, the ones SQLite makes for PRIMARY KEY and UNIQUE
+    # constraints are part of the columns
+    indexes = []
+    for name, unique, sql in dbConn.execute(f"""SELECT indexList.name, indexList."unique", master.sql FROM PRAGMA_INDEX_LIST('{tableName}') AS indexList
+                                                JOIN sqlite_master AS master ON master.name = indexList.name
+                                                WHERE indexList.origin = 'c' ORDER BY indexList.name;""").fetchall():
+        parsedSql = parse_index_sql(sql)
+        if parsedSql == None:
+            notes.append(f"Could not read the definition of index {name} on {tableName}, it was skipped.")
+            continue
+
+        indexes.append(Index(name, parsedSql[0], unique == 1, parsedSql[1]))
+
+    return indexes
+
+
+def introspect_database(dbConn: sqlite3.Connection) -> tuple:
+
+    # Builds a schema from the tables of a database, in the order they were created. SQLite's own
+    # tables (eg. sqlite_sequence) are left out. Returns (schema, notes), where notes list what the
+    # schema format can't express and was left out of the schema.
+    # NOTE: CHECK, COLLATE and GENERATED constraints can't be read back with PRAGMA table_info,
+    # so columns never have them.
+    notes = []
+    tables = []
+    for tableName, tableSql in dbConn.execute("""SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' ORDER BY rowid;""").fetchall():
+        tables.append(Table(tableName,
+                            introspect_columns(dbConn, tableName, tableSql, notes),
+                            introspect_foreign_keys(dbConn, tableName, notes),
+                            introspect_indexes(dbConn, tableName, notes)))
+
+    return (DatabaseSchema(tables), notes)
+
+
+
+### DRIFT ###
+def get_master_fingerprint(dbConn: sqlite3.Connection) -> str:
+
+    # Hashes every table, index, trigger and view in sqlite_master, with whitespace and quoting
+    # normalized. Much faster than introspecting the database, so it is compared first.
+    masterHash = hashlib.sha256(str(DRIFT_FORMAT_VERSION).encode())
+    for objectType, name, tableName, sql in dbConn.execute("""SELECT type, name, tbl_name, sql FROM sqlite_master
+                                                              WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+                                                              ORDER BY type, name;""").fetchall():
+        masterHash.update(f"{objectType}\t{name}\t{tableName}\t{normalize_sql(sql)}\n".encode())
+
+    return masterHash.hexdigest()
+
+
+def find_table_drift(expectedTable: Table, actualTable: Table) -> list[str]:
+    differences = []
+
+    expectedColumns = {column.name: column for column in expectedTable.columns}
+    actualColumns = {column.name: column for column in actualTable.columns}
+    for name in [column.name for column in expectedTable.columns if column.name not in actualColumns]:
+        differences.append(f"Column {expectedTable.name}.{name} is missing from the database.")
+    for name in [column.name for column in actualTable.columns if column.name not in expectedColumns]:
+        differences.append(f"Column {expectedTable.name}.{name} is in the database, but not in the migrations.")
+
+    for name in [column.name for column in expectedTable.columns if column.name in actualColumns]:
+        expectedTraits = get_column_traits(expectedColumns[name])
+        actualTraits = get_column_traits(actualColumns[name])
+        for traitName in expectedTraits.keys():
+            if expectedTraits[traitName] != actualTraits[traitName]:
+                differences.append(f"Column {expectedTable.name}.{name}: {traitName} is {actualTraits[traitName]} in the database, but {expectedTraits[traitName]} in the migrations.")
+
+    expectedKeys = set([get_fkey_description(fKey) for fKey in expectedTable.foreignKeys])
+    actualKeys = set([get_fkey_description(fKey) for fKey in actualTable.foreignKeys])
+    for keyDescription in sorted(expectedKeys - actualKeys):
+        differences.append(f"Foreign key {expectedTable.name}.{keyDescription} is missing from the database.")
+    for keyDescription in sorted(actualKeys - expectedKeys):
+        differences.append(f"Foreign key {expectedTable.name}.{keyDescription} is in the database, but not in the migrations.")
+
+    expectedIndexes = {index.name: index for index in expectedTable.indexes}
+    actualIndexes = {index.name: index for index in actualTable.indexes}
+    for name in sorted(expectedIndexes.keys() - actualIndexes.keys()):
+        differences.append(f"Index {name} on {expectedTable.name} is missing from the database.")
+    for name in sorted(actualIndexes.keys() - expectedIndexes.keys()):
+        differences.append(f"Index {name} on {expectedTable.name} is in the database, but not in the migrations.")
+    for name in sorted(expectedIndexes.keys() & actualIndexes.keys()):
+        if get_index_description(expectedIndexes[name]) != get_index_description(actualIndexes[name]):
+            differences.append(f"Index {name} on {expectedTable.name} is '{actualIndexes[name]}' in the database, but '{expectedIndexes[name]}' in the migrations.")
+
+    return differences
+
+
+def find_schema_drift(expectedSchema: DatabaseSchema, actualSchema: DatabaseSchema) -> list[str]:
+
+    # Returns a description of every difference between the schema replayed from the migrations
+    # and the one introspected from a database, or an empty list if they match
+    differences = []
+
+    expectedNames = [table.name for table in expectedSchema.tables]
+    actualNames = [table.name for table in actualSchema.tables]
+    for name in expectedNames:
+        if name not in actualSchema.tablesByName:
+            differences.append(f"Table {name} is missing from the database.")
+    for name in actualNames:
+        if name not in expectedSchema.tablesByName:
+            differences.append(f"Table {name} is in the database, but not in the migrations.")
+
+    for table in expectedSchema.tables:
+        actualTable = actualSchema.get_table(table.name)
+        if actualTable != None:
+            differences.extend(find_table_drift(table, actualTable))
+
+    return differences
+
+
+
+### FINGERPRINT STORE ###
+def read_known_fingerprints(migrationsFolder: str) -> dict:
+
+    # Returns {migration history key: [fingerprints of databases without drift]}. A missing or
+    # unreadable file only means every database gets a full comparison.
+    try:
+        with open(os.path.join(migrationsFolder, DRIFT_FINGERPRINTS_FILE)) as fingerprintsFile:
+            fingerprintsDict = json.loads(fingerprintsFile.read())
+    except (IOError, ValueError):
+        return {}
+
+    if type(fingerprintsDict) is not dict or fingerprintsDict.get("version") != DRIFT_FORMAT_VERSION:
+        return {}
+
+    return fingerprintsDict.get("fingerprints", {})
+
+
+def is_known_fingerprint(migrationsFolder: str, historyKey: str, fingerprint: str) -> bool:
+    return fingerprint in read_known_fingerprints(migrationsFolder).get(historyKey, [])
+
+
+def save_known_fingerprint(migrationsFolder: str, historyKey: str, fingerprint: str):
+
+    # Keeps the newest fingerprints of each history. A failed write only means the next run has to
+    # compare the whole schema again.
+    knownFingerprints = read_known_fingerprints(migrationsFolder)
+    historyFingerprints = [item for item in knownFingerprints.get(historyKey, []) if item != fingerprint]
+    knownFingerprints[historyKey] = (historyFingerprints + [fingerprint])[-FINGERPRINTS_PER_HISTORY:]
+
+    fingerprintsPath = os.path.join(migrationsFolder, DRIFT_FINGERPRINTS_FILE)
+    try:
+        with open(fingerprintsPath + ".tmp", "w") as fingerprintsFile:
+            fingerprintsFile.write(json.dumps({"version": DRIFT_FORMAT_VERSION, "fingerprints": knownFingerprints}, indent=4))
+
+        os.replace(fingerprintsPath + ".tmp", fingerprintsPath)
+
+    except IOError:
+        if os.path.exists(fingerprintsPath + ".tmp"):
+            os.remove(fingerprintsPath + ".tmp")
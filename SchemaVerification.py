@@ -0,0 +1,147 @@
+import time
+import sqlite3
+import collections
+from Schema import *
+from Migrations import *
+import SQLExecution
+import SchemaCheckpoints
+
+
+### CLASSES ###
+class SchemaMismatchError(Exception):
+    pass
+
+
+
+class VerifiedMigration:
+    migrationIndex: int
+    applyDuration: float
+    compareDuration: float
+
+    def __init__(self, migrationIndex: int, applyDuration: float, compareDuration: float):
+        self.migrationIndex = migrationIndex
+        self.applyDuration = applyDuration
+        self.compareDuration = compareDuration
+
+
+
+class VerificationError(Exception):
+    migrationIndex: int
+    verifiedMigrations: list[VerifiedMigration]
+
+    def __init__(self, migrationIndex: int, message: str, verifiedMigrations: list[VerifiedMigration]):
+        super().__init__(message)
+        self.migrationIndex = migrationIndex
+        self.verifiedMigrations = verifiedMigrations
+
+
+
+### COMPARISON ###
+def assert_tables(dbConn: sqlite3.Connection, tables: list[Table], internalTables: list[str] = None):
+
+    # Compares the tables in the database with the schema's tables. SQLite's own tables (eg.
+    # sqlite_sequence) are ignored, unless internalTables lists which of them must exist.
+    expectedNames = [table.name for table in tables]
+
+    if internalTables != None:
+        expectedNames.extend(internalTables)
+        actualNames = [item[0] for item in dbConn.execute("""SELECT name FROM sqlite_master WHERE type='table';""").fetchall()]
+    else:
+        actualNames = [item[0] for item in dbConn.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\';""").fetchall()]
+
+    if collections.Counter(actualNames) != collections.Counter(expectedNames):
+        raise SchemaMismatchError(f"Tables are not the same: Actual: {actualNames} VS Expected: {expectedNames}")
+
+
+def assert_columns_in_table(dbConn: sqlite3.Connection, table: Table):
+
+    expectedNames = [col.name for col in table.columns]
+
+    actualNames = [item[0] for item in dbConn.execute(f"""SELECT name FROM PRAGMA_TABLE_INFO('{table.name}');""").fetchall()]
+
+    if collections.Counter(actualNames) != collections.Counter(expectedNames):
+        raise SchemaMismatchError(f"Columns are not the same for table {table.name}: Actual: {actualNames} VS Expected: {expectedNames}")
+
+
+def assert_column_types_in_table(dbConn: sqlite3.Connection, table: Table):
+
+    # SQLite keeps the declared type as written, so it can be compared as text
+    expectedTypes = {col.name: col.datatype.upper() for col in table.columns}
+
+    for name, datatype in dbConn.execute(f"""SELECT name, type FROM PRAGMA_TABLE_INFO('{table.name}');""").fetchall():
+        if expectedTypes.get(name) != datatype.upper():
+            raise SchemaMismatchError(f"Column {table.name}.{name} has the wrong type: Actual: {datatype} VS Expected: {expectedTypes.get(name)}")
+
+
+def assert_foreign_keys_in_table(dbConn: sqlite3.Connection, table: Table):
+    expectedKeys = [fKey.get_key() for fKey in table.foreignKeys]
+
+    actualKeys = [f"{item[3]}->{item[2]}.{item[4]}" for item in dbConn.execute(f"""SELECT * FROM PRAGMA_FOREIGN_KEY_LIST('{table.name}');""").fetchall()]
+
+    if collections.Counter(actualKeys) != collections.Counter(expectedKeys):
+        raise SchemaMismatchError(f"Foreign Keys are not the same for table {table.name}: Actual: {actualKeys} VS Expected: {expectedKeys}")
+
+
+def assert_indexes_in_table(dbConn: sqlite3.Connection, table: Table):
+
+    # Only compares indexes made with CREATE INDEX, not the ones SQLite makes for PRIMARY KEY and
+    # UNIQUE constraints
+    expectedIndexes = [(index.name, 1 if index.unique else 0) for index in table.indexes]
+
+    actualIndexes = [(item[0], item[1]) for item in dbConn.execute(f"""SELECT name, "unique" FROM PRAGMA_INDEX_LIST('{table.name}') WHERE origin = 'c';""").fetchall()]
+
+    if collections.Counter(actualIndexes) != collections.Counter(expectedIndexes):
+        raise SchemaMismatchError(f"Indexes are not the same for table {table.name}: Actual: {actualIndexes} VS Expected: {expectedIndexes}")
+
+
+def assert_database_matches_schema(dbConn: sqlite3.Connection, schema: DatabaseSchema):
+    assert_tables(dbConn, schema.tables)
+
+    for table in schema.tables:
+        assert_columns_in_table(dbConn, table)
+        assert_column_types_in_table(dbConn, table)
+        assert_foreign_keys_in_table(dbConn, table)
+        assert_indexes_in_table(dbConn, table)
+
+
+
+### FUNCTIONS ###
+def verify_sql_migrations(migrations: list[SchemaMigration], sqlMigrations: list[dict]) -> list[VerifiedMigration]:
+
+    # Applies each SQL migration in order to one in-memory database, and after each one checks
+    # that the database matches the schema replayed from the migrations so far.
+    # Both lists must be sorted by migration index. Raises a VerificationError at the first
+    # migration that fails to apply, fails to replay, or leaves the database different from the
+    # schema. Returns the timings of every migration otherwise.
+    sqlMigrationsByIndex = {sqlMigration["migrationIndex"]: sqlMigration for sqlMigration in sqlMigrations}
+    verifiedMigrations: list[VerifiedMigration] = []
+    schema = DatabaseSchema([])
+
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        for migration in migrations:
+            sqlMigration = sqlMigrationsByIndex.get(migration.migrationIndex, None)
+            if sqlMigration == None:
+                raise VerificationError(migration.migrationIndex, "There is no SQL migration for this migration, run 'sqlmigration' first.", verifiedMigrations)
+
+            try:
+                applyDuration = SQLExecution.apply_sql_migration(dbConn, sqlMigration)
+            except SQLExecution.MigrationApplyError as err:
+                raise VerificationError(migration.migrationIndex, f"{err} (statement: {err.statement})", verifiedMigrations)
+
+            schemaErrors = SchemaCheckpoints.replay_migration(migration, schema)
+            if len(schemaErrors) > 0:
+                raise VerificationError(migration.migrationIndex, f"Replaying the migration gives an invalid schema: {schemaErrors[0].errorMessage}", verifiedMigrations)
+
+            startTime = time.perf_counter()
+            try:
+                assert_database_matches_schema(dbConn, schema)
+            except SchemaMismatchError as err:
+                raise VerificationError(migration.migrationIndex, str(err), verifiedMigrations)
+
+            verifiedMigrations.append(VerifiedMigration(migration.migrationIndex, applyDuration, time.perf_counter() - startTime))
+
+    finally:
+        dbConn.close()
+
+    return verifiedMigrations
@@ -13,19 +13,32 @@ class ErrorType(Enum):
 class ValidationError:
     errorType: ErrorType
     errorMessage: str
-    context: str
+    contextSource: object
     contextEnabled: bool = False
 
     ## Initialization
-    def __init__(self, newErrType: ErrorType, newErrMsg: str, newContext: str):
+    def __init__(self, newErrType: ErrorType, newErrMsg: str, newContext):
+
+        # The context can be a string, or a function returning one. Rendering the context (eg. a
+        # whole table) is expensive and most errors are never shown with it, so functions are
+        # only called the first time the context is needed.
+        # NOTE: The context is rendered from the state at that time, not at validation time.
         self.errorType = newErrType
         self.errorMessage = newErrMsg
-        self.context = newContext
+        self.contextSource = newContext
 
     def toggle_context(self):
         self.contextEnabled = not self.contextEnabled
 
 
+    @property
+    def context(self) -> str:
+        if callable(self.contextSource):
+            self.contextSource = self.contextSource()
+
+        return self.contextSource
+
+
     def __str__(self):
         contextString = ""
         if self.contextEnabled:
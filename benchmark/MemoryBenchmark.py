@@ -0,0 +1,71 @@
+import sys
+import gc
+import json
+import time
+import tracemalloc
+from Schema import *
+from Migrations import *
+from .SyntheticHistory import *
+
+
+### CONSTANTS ###
+DEFAULT_TABLE_COUNT = 200
+DEFAULT_MIGRATION_COUNT = 1000
+
+
+
+### FUNCTIONS ###
+def measure_traced_bytes(createFunc) -> tuple:
+
+    # Returns (object created by createFunc(), bytes it keeps allocated)
+    gc.collect()
+    tracemalloc.start()
+    createdObject = createFunc()
+    gc.collect()
+    keptBytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (createdObject, keptBytes)
+
+
+def measure_history_memory(tableCount: int, migrationCount: int) -> dict:
+
+    # Measures the memory kept alive by a migration history parsed from JSON text (like migration
+    # files), and by the schema replayed from it. The same history kept as the parsed JSON dicts is
+    # measured too, as a baseline for how compact the model objects are.
+    # NOTE: Replaying is not traced (tracing makes it very slow), the final schema is measured by
+    # parsing it again from JSON text instead.
+    historyText = json.dumps(create_synthetic_history(tableCount, migrationCount))
+    historyDicts, historyDictsBytes = measure_traced_bytes(lambda: json.loads(historyText))
+    del historyDicts
+    migrations, historyBytes = measure_traced_bytes(lambda: [SchemaMigration.from_dict(migrationDict) for migrationDict in json.loads(historyText)])
+
+    startTime = time.perf_counter()
+    schema = DatabaseSchema([])
+    for migration in migrations:
+        migration.migrate_schema(schema)
+    replayDuration = time.perf_counter() - startTime
+
+    schemaText = json.dumps(schema.to_dict())
+    loadedSchema, schemaBytes = measure_traced_bytes(lambda: DatabaseSchema.from_json(schemaText))
+    tableCopies, copiesBytes = measure_traced_bytes(lambda: [table.copy() for table in loadedSchema.tables])
+
+    return {
+        "tables": len(schema.tables),
+        "columns": sum([len(table.columns) for table in schema.tables]),
+        "migrations": len(migrations),
+        "history_dicts_bytes": historyDictsBytes,
+        "history_bytes": historyBytes,
+        "schema_bytes": schemaBytes,
+        "table_copies_bytes": copiesBytes,
+        "replay_seconds": round(replayDuration, 3)
+    }
+
+
+
+### MAIN ###
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    result = measure_history_memory(int(args[0]) if len(args) > 0 else DEFAULT_TABLE_COUNT,
+                                    int(args[1]) if len(args) > 1 else DEFAULT_MIGRATION_COUNT)
+    print(json.dumps(result, indent=4))
@@ -0,0 +1,232 @@
+import io
+import os
+import sys
+import json
+import math
+import time
+import random
+import sqlite3
+import platform
+import tempfile
+import statistics
+import contextlib
+from Schema import *
+from Migrations import *
+import CreateMigration
+import SQLMigrations
+import ParseCache
+from .SyntheticHistory import *
+
+
+### CONSTANTS ###
+DEFAULT_TABLE_COUNT = 200
+DEFAULT_COLUMNS_PER_TABLE = 8
+DEFAULT_FOREIGN_KEYS_PER_TABLE = 1
+DEFAULT_MIGRATION_COUNT = 200
+DEFAULT_REPEATS = 7
+
+# Share of tables changed between the two schemas that are diffed
+DIFF_CHANGE_RATIO = 0.05
+
+# How long ago the written migration files were changed. The parse cache only trusts the size and
+# mtime of files that weren't changed just before their entry was written, as for real histories.
+HISTORY_FILE_AGE_NS = 60_000_000_000
+
+
+
+### UTILITY FUNCTIONS ###
+def summarize_durations(durations: list[float]) -> dict:
+
+    # p95 uses the nearest-rank method, so it is always one of the measured durations
+    orderedDurations = sorted(durations)
+    p95Index = max(0, math.ceil(0.95 * len(orderedDurations)) - 1)
+    return {
+        "runs": len(orderedDurations),
+        "median_ms": round(statistics.median(orderedDurations) * 1000, 3),
+        "p95_ms": round(orderedDurations[p95Index] * 1000, 3),
+        "min_ms": round(orderedDurations[0] * 1000, 3)
+    }
+
+
+def time_repeatedly(stageFunc, repeats: int, setupFunc = None) -> list[float]:
+
+    # Runs stageFunc(setupFunc()) [repeats] times, only timing stageFunc
+    durations = []
+    for i in range(repeats):
+        stageInput = setupFunc() if setupFunc != None else None
+        startTime = time.perf_counter()
+        stageFunc(stageInput)
+        durations.append(time.perf_counter() - startTime)
+
+    return durations
+
+
+def create_changed_schema_dict(schemaDict: dict, seed: int) -> dict:
+
+    # Copies a schema dictionary with a share of its tables changed: columns added, altered or
+    # renamed (keeping their contents), and a few new tables. Renames and alterations are decided
+    # without asking, so the changes never need a hints file.
+    rng = random.Random(seed)
+    changedDict = json.loads(json.dumps(schemaDict))
+    tables = changedDict["tables"]
+    changeCount = max(1, int(len(tables) * DIFF_CHANGE_RATIO))
+
+    for i, table in enumerate(rng.sample(tables, min(changeCount, len(tables)))):
+        columns = [col for col in table["columns"] if not is_reference_column(col["name"])]
+        change = i % 3
+
+        if change == 0 or len(columns) == 0:
+            table["columns"].append(create_column_dict(f"Changed{i}", rng))
+        elif change == 1:
+            rng.choice(columns)["constraints"] = ["NOT NULL", "DEFAULT 1"]
+        else:
+            rng.choice(columns)["name"] = f"Renamed{i}"
+
+    for i in range(changeCount):
+        tables.append(create_table_dict(f"NewTable{i}", len(tables[0]["columns"]) if len(tables) > 0 else 1, [], rng))
+
+    return changedDict
+
+
+def replay_history(migrations: list[SchemaMigration]) -> DatabaseSchema:
+    schema = DatabaseSchema([])
+    for migration in migrations:
+        migration.migrate_schema(schema)
+
+    return schema
+
+
+def time_sql_generation(migrations: list[SchemaMigration]) -> float:
+
+    # Generating SQL needs the schema before each migration, so the history is replayed along the
+    # way. Only the SQL generation is timed.
+    schema = DatabaseSchema([])
+    totalDuration = 0
+    for migration in migrations:
+        startTime = time.perf_counter()
+        SQLMigrations.create_sql_for_schema_migration(migration, schema)
+        totalDuration += time.perf_counter() - startTime
+        migration.migrate_schema(schema)
+
+    return totalDuration
+
+
+def write_history_files(folder: str, historyDicts: list[dict]) -> list[str]:
+
+    # Writes each migration as the 'create' command does, returns the file paths
+    filePaths = []
+    fileTime = time.time_ns() - HISTORY_FILE_AGE_NS
+    for migrationDict in historyDicts:
+        filePath = os.path.join(folder, f"Migration_{migrationDict['index']}.json")
+        with open(filePath, "w") as migrationFile:
+            migrationFile.write(json.dumps(migrationDict, indent=4))
+
+        os.utime(filePath, ns=(fileTime, fileTime))
+        filePaths.append(filePath)
+
+    return filePaths
+
+
+def parse_migration_text(text: str) -> SchemaMigration:
+    return SchemaMigration.from_dict(json.loads(text))
+
+
+def load_history_uncached(filePaths: list[str]) -> list[SchemaMigration]:
+    migrations = []
+    for filePath in filePaths:
+        with open(filePath) as migrationFile:
+            migrations.append(parse_migration_text(migrationFile.read()))
+
+    return migrations
+
+
+def load_history_cached(filePaths: list[str], buildsTables: bool) -> list[SchemaMigration]:
+
+    # Loads the history as commands do. Table migrations of cache hits are only built when used,
+    # buildsTables builds all of them (as if every migration was replayed).
+    # Raises if any file misses the cache, so the stage only ever times hits.
+    migrations = []
+    for filePath in filePaths:
+        migration, wasCached = ParseCache.load_file_cached(filePath, parse_migration_text, SchemaMigration.from_cached_dict)
+        if not wasCached:
+            raise Exception(f"Parse cache miss for '{filePath}'")
+        if buildsTables:
+            migration.tableMigrations
+        migrations.append(migration)
+
+    return migrations
+
+
+def diff_quietly(oldSchema: DatabaseSchema, newSchema: DatabaseSchema) -> list[Migration]:
+
+    # Decides without asking, and hides the "Assuming ... is NEW" lines
+    with contextlib.redirect_stdout(io.StringIO()):
+        return CreateMigration.create_migrations_for_objects(oldSchema.tables, newSchema.tables, Table,
+                                                             CreateMigration.HintedMigrationDecisions())
+
+
+
+### FUNCTIONS ###
+def run_pipeline_benchmark(tableCount: int, columnsPerTable: int, foreignKeysPerTable: float, migrationCount: int,
+                           repeats: int = DEFAULT_REPEATS, seed: int = 0) -> dict:
+
+    # Times each stage of the pipeline on a synthetic schema and history, and returns a report
+    # with the median and p95 of every stage.
+    schemaDict = create_synthetic_schema(tableCount, columnsPerTable, seed, foreignKeysPerTable)
+    schemaText = json.dumps(schemaDict)
+    schema = DatabaseSchema.from_json(schemaText)
+    changedSchema = DatabaseSchema.from_dict(create_changed_schema_dict(schemaDict, seed))
+
+    historyDicts = create_synthetic_history(tableCount, migrationCount, columnsPerTable, seed, foreignKeysPerTable)
+    migrations = [SchemaMigration.from_dict(migrationDict) for migrationDict in historyDicts]
+
+    stageDurations = {
+        "from_json": time_repeatedly(lambda _: DatabaseSchema.from_json(schemaText), repeats),
+        "validate_self": time_repeatedly(lambda _: schema.validate_self(), repeats),
+        "migrate_schema_replay": time_repeatedly(lambda _: replay_history(migrations), repeats),
+        "create_migrations_for_objects": time_repeatedly(lambda _: diff_quietly(schema, changedSchema), repeats),
+        "create_sql_for_schema_migration": [time_sql_generation(migrations) for i in range(repeats)],
+    }
+
+    # Loading the history from files, with and without parse cache hits (the first load fills the cache)
+    with tempfile.TemporaryDirectory() as historyFolder:
+        filePaths = write_history_files(historyFolder, historyDicts)
+        stageDurations["load_history_uncached"] = time_repeatedly(lambda _: load_history_uncached(filePaths), repeats)
+        [ParseCache.load_file_cached(filePath, parse_migration_text, SchemaMigration.from_cached_dict) for filePath in filePaths]
+        stageDurations["load_history_parse_cache_hits"] = time_repeatedly(lambda _: load_history_cached(filePaths, False), repeats)
+        stageDurations["load_history_parse_cache_hits_built"] = time_repeatedly(lambda _: load_history_cached(filePaths, True), repeats)
+
+    return {
+        "parameters": {
+            "tables": tableCount,
+            "columns_per_table": columnsPerTable,
+            "foreign_keys_per_table": foreignKeysPerTable,
+            "migrations": migrationCount,
+            "repeats": repeats,
+            "seed": seed
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform()
+        },
+        "sizes": {
+            "schema_tables": len(schema.tables),
+            "schema_columns": sum([len(table.columns) for table in schema.tables]),
+            "schema_foreign_keys": sum([len(table.foreignKeys) for table in schema.tables]),
+            "history_migrations": len(migrations)
+        },
+        "stages": {stageName: summarize_durations(durations) for stageName, durations in stageDurations.items()}
+    }
+
+
+
+### MAIN ###
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    report = run_pipeline_benchmark(int(args[0]) if len(args) > 0 else DEFAULT_TABLE_COUNT,
+                                    int(args[1]) if len(args) > 1 else DEFAULT_COLUMNS_PER_TABLE,
+                                    float(args[2]) if len(args) > 2 else DEFAULT_FOREIGN_KEYS_PER_TABLE,
+                                    int(args[3]) if len(args) > 3 else DEFAULT_MIGRATION_COUNT,
+                                    int(args[4]) if len(args) > 4 else DEFAULT_REPEATS)
+    print(json.dumps(report, indent=4))
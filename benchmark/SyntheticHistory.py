@@ -0,0 +1,131 @@
+import random
+
+
+### CONSTANTS ###
+SYNTHETIC_DATATYPES = ["INTEGER", "VARCHAR(255)", "TEXT", "REAL", "BOOLEAN", "DATETIME"]
+SYNTHETIC_CONSTRAINTS = [[], ["NOT NULL"], ["NULL"], ["UNIQUE"], ["NOT NULL", "DEFAULT 0"]]
+
+
+
+### UTILITY FUNCTIONS ###
+def create_column_dict(name: str, rng: random.Random) -> dict:
+    return {
+        "name": name,
+        "type": rng.choice(SYNTHETIC_DATATYPES),
+        "constraints": list(rng.choice(SYNTHETIC_CONSTRAINTS))
+    }
+
+
+def is_reference_column(name: str) -> bool:
+    return name == "ID" or (name.startswith("Parent") and name.endswith("ID"))
+
+
+def create_table_dict(name: str, columnCount: int, referencedTables: list[str], rng: random.Random) -> dict:
+
+    # Every table gets an ID column, and a foreign key to each of the given tables
+    columns = [{"name": "ID", "type": "INTEGER", "constraints": ["PRIMARY KEY AUTOINCREMENT"]}]
+    columns.extend([create_column_dict(f"Col{i}", rng) for i in range(columnCount-1)])
+    foreignKeys = []
+
+    for i, referencedTable in enumerate(referencedTables):
+        localName = "ParentID" if i == 0 else f"Parent{i}ID"
+        columns.append({"name": localName, "type": "INTEGER", "constraints": []})
+        foreignKeys.append({"local_name": localName, "table_name": referencedTable, "foreign_name": "ID"})
+
+    return {"name": name, "columns": columns, "foreign_keys": foreignKeys}
+
+
+def choose_referenced_tables(tableIndex: int, foreignKeysPerTable: float, rng: random.Random) -> list[str]:
+
+    # Picks about [foreignKeysPerTable] earlier tables to reference. The first is always the table
+    # right before, so the tables form one connected chain, the rest are random.
+    if tableIndex == 0:
+        return []
+
+    keyCount = int(foreignKeysPerTable)
+    if foreignKeysPerTable > keyCount and rng.random() < foreignKeysPerTable - keyCount:
+        keyCount += 1
+
+    keyCount = min(keyCount, tableIndex)
+    if keyCount == 0:
+        return []
+
+    otherTables = rng.sample(range(tableIndex-1), keyCount-1) if keyCount > 1 else []
+    return [f"Table{tableIndex-1}"] + [f"Table{i}" for i in sorted(otherTables)]
+
+
+
+### FUNCTIONS ###
+def create_synthetic_schema(tableCount: int, columnsPerTable: int = 8, seed: int = 0, foreignKeysPerTable: float = 1) -> dict:
+
+    # Creates a schema dictionary (as in a schema file), where each table references the one before
+    # it, and (with more than one key per table) a few random earlier tables
+    rng = random.Random(seed)
+    tables = []
+    for i in range(tableCount):
+        referencedTables = choose_referenced_tables(i, foreignKeysPerTable, rng)
+        tables.append(create_table_dict(f"Table{i}", columnsPerTable, referencedTables, rng))
+
+    return {"tables": tables}
+
+
+def create_synthetic_history(tableCount: int, migrationCount: int, columnsPerTable: int = 8, seed: int = 0, foreignKeysPerTable: float = 1) -> list[dict]:
+
+    # Creates a list of migration dictionaries (as in migration files). The first migration creates
+    # [tableCount] tables, every other one adds, renames, edits or removes columns of a few tables,
+    # or adds a new table. The history always produces a valid schema.
+    rng = random.Random(seed)
+    schemaDict = create_synthetic_schema(tableCount, columnsPerTable, seed, foreignKeysPerTable)
+    tableColumns = {table["name"]: [col["name"] for col in table["columns"] if not is_reference_column(col["name"])] for table in schemaDict["tables"]}
+
+    migrations = [{
+        "index": 0,
+        "tables": [{"new_name": table["name"],
+                    "column_migrations": [{"new_data": col} for col in table["columns"]],
+                    "foreign_key_migrations": [{"new_data": fKey} for fKey in table["foreign_keys"]]}
+                   for table in schemaDict["tables"]]
+    }]
+
+    nextColumnId = 0
+    for index in range(1, migrationCount):
+        tableMigrations = []
+        existingTables = sorted(tableColumns.keys())
+
+        # Occasionally adds a new table referencing an existing one
+        if rng.random() < 0.1:
+            newTable = create_table_dict(f"Table{len(tableColumns)}", columnsPerTable, [rng.choice(list(tableColumns.keys()))], rng)
+            tableColumns[newTable["name"]] = [col["name"] for col in newTable["columns"] if not is_reference_column(col["name"])]
+            tableMigrations.append({"new_name": newTable["name"],
+                                    "column_migrations": [{"new_data": col} for col in newTable["columns"]],
+                                    "foreign_key_migrations": [{"new_data": fKey} for fKey in newTable["foreign_keys"]]})
+
+        for tableName in rng.sample(existingTables, min(3, len(existingTables))):
+            columns = tableColumns[tableName]
+            change = rng.random()
+            nextColumnId += 1
+
+            if change < 0.4 or len(columns) < 2:
+                newColumn = create_column_dict(f"Added{nextColumnId}", rng)
+                columnMigrations = [{"new_data": newColumn}]
+                columns.append(newColumn["name"])
+
+            elif change < 0.6:
+                oldName = rng.choice(columns)
+                newColumn = create_column_dict(f"Renamed{nextColumnId}", rng)
+                columnMigrations = [{"old_key": oldName, "new_data": newColumn}]
+                columns[columns.index(oldName)] = newColumn["name"]
+
+            elif change < 0.8:
+                oldName = rng.choice(columns)
+                columnMigrations = [{"old_key": oldName, "new_data": create_column_dict(oldName, rng)}]
+
+            else:
+                oldName = rng.choice(columns)
+                columnMigrations = [{"old_key": oldName}]
+                columns.remove(oldName)
+
+            tableMigrations.append({"old_key": tableName, "new_name": tableName, "column_migrations": columnMigrations, "foreign_key_migrations": []})
+
+        migrations.append({"index": index, "tables": tableMigrations, "name": f"synthetic{index}"})
+
+    return migrations
@@ -0,0 +1,177 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import platform
+import tempfile
+import SQLExecution
+import SQLMigrations
+from .PipelineBenchmark import summarize_durations
+
+
+### CONSTANTS ###
+DEFAULT_ROW_COUNTS = [1000, 10000, 100000]
+DEFAULT_REPEATS = 3
+
+# Name used in the report for runs without a tuning profile (ie. the connection's own settings)
+DEFAULT_PROFILE_NAME = "default"
+
+# Same as the 'apply' command's, so combined, squashed and baseline SQL migrations are skipped
+SQL_MIGRATION_FILE_REGEX = r'SQLMigration_([1-9][0-9]*|0)(_\w+)?\.json'
+
+
+
+### UTILITY FUNCTIONS ###
+def get_seed_value_sql(datatype: str, rowNumberSql: str) -> str:
+
+    # Follows SQLite's type affinity rules, so every seeded value keeps its type
+    datatype = datatype.upper()
+    if "INT" in datatype:
+        return rowNumberSql
+    elif "CHAR" in datatype or "CLOB" in datatype or "TEXT" in datatype:
+        return f"'row ' || {rowNumberSql}"
+    elif "REAL" in datatype or "FLOA" in datatype or "DOUB" in datatype:
+        return f"{rowNumberSql} * 0.5"
+    else:
+        return rowNumberSql
+
+
+def seed_table(dbConn: sqlite3.Connection, tableName: str, rowCount: int):
+
+    # Adds rows to a table until it has [rowCount] rows. Foreign key columns reference an existing
+    # row of their table, which gets one seeded row if it is empty, so the foreign key checks of
+    # the profiles pass.
+    missingRows = rowCount - dbConn.execute(f"SELECT COUNT(*) FROM {tableName};").fetchone()[0]
+    if missingRows <= 0:
+        return
+
+    foreignKeys = {item[3]: (item[2], item[4]) for item in dbConn.execute(f"SELECT * FROM PRAGMA_FOREIGN_KEY_LIST('{tableName}');").fetchall()}
+    rowNumberSql = f"(n + (SELECT COALESCE(MAX(rowid), 0) FROM {tableName}))"
+
+    columnNames = []
+    valueSqls = []
+    for name, datatype in dbConn.execute(f"SELECT name, type FROM PRAGMA_TABLE_INFO('{tableName}');").fetchall():
+        columnNames.append(name)
+
+        if name in foreignKeys and foreignKeys[name][0] != tableName:
+            parentName, parentColumn = foreignKeys[name]
+            seed_table(dbConn, parentName, 1)
+            valueSqls.append(f"(SELECT {parentColumn if parentColumn != None else 'rowid'} FROM {parentName} LIMIT 1)")
+        else:
+            valueSqls.append(get_seed_value_sql(datatype, rowNumberSql))
+
+    dbConn.execute(f"""WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n+1 FROM seq WHERE n < {missingRows})
+                       INSERT INTO {tableName} ({', '.join(columnNames)}) SELECT {', '.join(valueSqls)} FROM seq;""")
+
+
+def get_rebuilt_table_names(sqlMigration: dict) -> list[str]:
+
+    # The tracking table is never seeded, its rows are the database's version
+    tableRebuilds = SQLMigrations.parse_sql_table_rebuilds(sqlMigration["sqlStatements"])
+    return [oldName for oldName, renameIndex, finalName in tableRebuilds.values() if oldName != SQLExecution.TRACKING_TABLE_NAME]
+
+
+def time_history(dbFilePath: str, sqlMigrations: list[dict], rowCount: int, tuningProfile: SQLExecution.TuningProfile) -> tuple:
+
+    # Applies the history to a new database file, filling every table to [rowCount] rows before a
+    # migration rebuilds it. Only applying the migrations (and the final foreign key check of
+    # profiles that don't check each migration) is timed.
+    # Some rebuilds can't copy existing rows (eg. they add a NOT NULL column without a default),
+    # those run on the emptied table instead.
+    # Returns (total duration, indexes of the migrations that ran on empty tables).
+    dbConn = sqlite3.connect(dbFilePath, isolation_level=None)
+    totalDuration = 0
+    emptiedMigrations = []
+
+    try:
+        if tuningProfile != None:
+            SQLExecution.apply_tuning_profile(dbConn, tuningProfile)
+        checksEachMigration = tuningProfile != None and tuningProfile.checksEachMigration
+
+        for sqlMigration in sqlMigrations:
+            rebuiltTableNames = get_rebuilt_table_names(sqlMigration)
+            for tableName in rebuiltTableNames:
+                seed_table(dbConn, tableName, rowCount)
+
+            try:
+                totalDuration += SQLExecution.apply_sql_migration(dbConn, sqlMigration, None, checksEachMigration)
+            except SQLExecution.MigrationApplyError:
+                for tableName in rebuiltTableNames:
+                    dbConn.execute(f"DELETE FROM {tableName};")
+
+                emptiedMigrations.append(sqlMigration["migrationIndex"])
+                totalDuration += SQLExecution.apply_sql_migration(dbConn, sqlMigration, None, checksEachMigration)
+
+        if tuningProfile != None and not checksEachMigration:
+            startTime = time.perf_counter()
+            SQLExecution.get_foreign_key_violations(dbConn)
+            totalDuration += time.perf_counter() - startTime
+
+    finally:
+        dbConn.close()
+
+    return (totalDuration, emptiedMigrations)
+
+
+
+### FUNCTIONS ###
+def run_tuning_benchmark(sqlMigrations: list[dict], rowCounts: list[int], repeats: int = DEFAULT_REPEATS) -> dict:
+
+    # Times applying an SQL migration history (sorted by migration index) to a database file with
+    # each tuning profile, and without one, at every row count. Every run starts from a new file.
+    profiles = {DEFAULT_PROFILE_NAME: None}
+    profiles.update(SQLExecution.TUNING_PROFILES)
+
+    results = {}
+    emptiedMigrations = set()
+    with tempfile.TemporaryDirectory() as tempFolder:
+        for rowCount in rowCounts:
+            results[str(rowCount)] = {}
+
+            for profileName, tuningProfile in profiles.items():
+                durations = []
+                for i in range(repeats):
+                    dbFilePath = os.path.join(tempFolder, f"{profileName}_{rowCount}_{i}.db")
+                    duration, runEmptiedMigrations = time_history(dbFilePath, sqlMigrations, rowCount, tuningProfile)
+                    durations.append(duration)
+                    emptiedMigrations.update(runEmptiedMigrations)
+
+                results[str(rowCount)][profileName] = summarize_durations(durations)
+
+    return {
+        "parameters": {
+            "row_counts": rowCounts,
+            "repeats": repeats,
+            "migrations": len(sqlMigrations)
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform()
+        },
+        "profiles": {profileName: (tuningProfile.description if tuningProfile != None else "Connection defaults, foreign keys not checked")
+                     for profileName, tuningProfile in profiles.items()},
+        "migrations_run_on_empty_tables": sorted(emptiedMigrations),
+        "row_counts": results
+    }
+
+
+
+### MAIN ###
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    migrationsFolder = args[0] if len(args) > 0 else "new_examples"
+
+    sqlMigrations = []
+    for fileName in os.listdir(migrationsFolder):
+        if re.fullmatch(SQL_MIGRATION_FILE_REGEX, fileName) != None:
+            with open(os.path.join(migrationsFolder, fileName)) as file:
+                sqlMigrations.append(json.loads(file.read()))
+    sqlMigrations.sort(key=lambda sqlMigration: sqlMigration["migrationIndex"])
+
+    report = run_tuning_benchmark(sqlMigrations,
+                                  [int(rowCount) for rowCount in args[1].split(",")] if len(args) > 1 else DEFAULT_ROW_COUNTS,
+                                  int(args[2]) if len(args) > 2 else DEFAULT_REPEATS)
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,92 @@
+import sqlite3
+from Schema import *
+from Migrations import *
+from benchmark.SyntheticHistory import *
+import benchmark.MemoryBenchmark as MemoryBenchmark
+import benchmark.PipelineBenchmark as PipelineBenchmark
+import benchmark.TuningBenchmark as TuningBenchmark
+import SQLExecution
+from .TestGroup import *
+from .SQLExecutionTests import load_example_sql_migrations
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Benchmark Tests", True)
+def test_synthetic_foreign_key_density():
+    for foreignKeysPerTable in [0, 1, 2.5]:
+        schema = DatabaseSchema.from_dict(create_synthetic_schema(60, 4, 1, foreignKeysPerTable))
+        if len(schema.validate_self()) > 0:
+            raise Exception(f"Synthetic schema with {foreignKeysPerTable} foreign keys per table is invalid.")
+
+        # The first table can't reference anything, and the second only has one table to reference
+        foreignKeyCounts = [len(table.foreignKeys) for table in schema.tables]
+        if foreignKeysPerTable == 1 and foreignKeyCounts != [0] + [1]*59:
+            raise Exception(f"Expected a chain of foreign keys, got {foreignKeyCounts}")
+        if abs(sum(foreignKeyCounts) / 58 - foreignKeysPerTable) > 0.5:
+            raise Exception(f"Expected about {foreignKeysPerTable} foreign keys per table, got {sum(foreignKeyCounts) / 58}")
+
+        # Histories stay valid, whatever the tables reference
+        historySchema = DatabaseSchema([])
+        for migrationDict in create_synthetic_history(20, 40, 4, 1, foreignKeysPerTable):
+            errors = SchemaMigration.from_dict(migrationDict).migrate_schema(historySchema)
+            if len(errors) > 0:
+                raise Exception(f"Synthetic history with {foreignKeysPerTable} foreign keys per table is invalid: {errors[0]}")
+
+
+@group_test(allTestGroups, "Benchmark Tests", True)
+def test_memory_benchmark_report():
+    report = MemoryBenchmark.measure_history_memory(20, 60)
+
+    if report["migrations"] != 60 or report["tables"] == 0 or any([report[key] <= 0 for key in ["history_bytes", "schema_bytes", "table_copies_bytes"]]):
+        raise Exception(f"Invalid memory report: {report}")
+
+    # Slotted objects with interned strings keep a history in well under half the memory of its
+    # JSON dicts (unslotted objects, each with its own __dict__, took about 75% of it)
+    if report["history_bytes"] * 2 > report["history_dicts_bytes"]:
+        raise Exception(f"The parsed history takes {report['history_bytes']} bytes, its JSON dicts {report['history_dicts_bytes']} bytes.")
+
+    modelObjects = [Column("ID", "INTEGER", []), ForeignKey("A", "B", "C", None, None), Index("I", ["A"]), Table("T", [], []),
+                    ColumnMigration("ID", None), TableMigration("T", None, [], []), SchemaMigration(0, [])]
+    if any([hasattr(modelObject, "__dict__") for modelObject in modelObjects]):
+        raise Exception(f"Model objects have a __dict__: {[type(modelObject).__name__ for modelObject in modelObjects if hasattr(modelObject, '__dict__')]}")
+
+
+@group_test(allTestGroups, "Benchmark Tests", True)
+def test_pipeline_benchmark_report():
+    report = PipelineBenchmark.run_pipeline_benchmark(10, 3, 1.5, 5, repeats=3)
+
+    expectedStages = ["from_json", "validate_self", "migrate_schema_replay", "create_migrations_for_objects", "create_sql_for_schema_migration",
+                      "load_history_uncached", "load_history_parse_cache_hits", "load_history_parse_cache_hits_built"]
+    if list(report["stages"].keys()) != expectedStages:
+        raise Exception(f"Unexpected stages: {list(report['stages'].keys())}")
+
+    for stageName, stageSummary in report["stages"].items():
+        if stageSummary["runs"] != 3 or not (stageSummary["min_ms"] <= stageSummary["median_ms"] <= stageSummary["p95_ms"]):
+            raise Exception(f"Invalid summary for {stageName}: {stageSummary}")
+
+    if PipelineBenchmark.summarize_durations([i/1000 for i in range(1, 101)])["p95_ms"] != 95:
+        raise Exception("p95 of 1..100ms isn't 95ms.")
+
+
+@group_test(allTestGroups, "Benchmark Tests", True)
+def test_tuning_benchmark_report():
+    report = TuningBenchmark.run_tuning_benchmark(load_example_sql_migrations(), [0, 50], repeats=2)
+
+    expectedProfiles = [TuningBenchmark.DEFAULT_PROFILE_NAME] + list(SQLExecution.TUNING_PROFILES.keys())
+    for rowCountString in ["0", "50"]:
+        if list(report["row_counts"][rowCountString].keys()) != expectedProfiles:
+            raise Exception(f"Unexpected profiles for {rowCountString} rows: {list(report['row_counts'][rowCountString].keys())}")
+
+    # Migrations #7 and #8 add NOT NULL columns without a default, so they can't copy the seeded rows
+    if report["migrations_run_on_empty_tables"] != [7, 8]:
+        raise Exception(f"Unexpected migrations run on empty tables: {report['migrations_run_on_empty_tables']}")
+
+    # Seeding must follow the foreign keys, or the profiles checking them would fail
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        SQLExecution.apply_pending_migrations(dbConn, load_example_sql_migrations()[:3])
+        TuningBenchmark.seed_table(dbConn, "Pets", 20)
+        if dbConn.execute("SELECT COUNT(*) FROM Pets;").fetchone()[0] != 20 or len(SQLExecution.get_foreign_key_violations(dbConn)) != 0:
+            raise Exception("Seeding Pets didn't give 20 rows referencing an existing owner.")
+    finally:
+        dbConn.close()
@@ -0,0 +1,118 @@
+import os
+import json
+import shutil
+import tempfile
+import CombinedMigrations
+from .TestGroup import *
+from .SQLExecutionTests import load_example_sql_migrations
+
+
+### CONSTANTS ###
+COMBINED_FILE_NAME = "SQLMigration_Combined.json"
+INDEXED_FILE_NAME = "SQLMigration_Combined.bin"
+SQL_FILE_REGEX = r'SQLMigration_([1-9][0-9]*|0)(_\w+)?\.json'
+
+
+
+### UTILITY ###
+def write_sql_migration_files(folder: str, sqlMigrations: list[dict]):
+    for sqlMigration in sqlMigrations:
+        with open(os.path.join(folder, f"SQLMigration_{sqlMigration['migrationIndex']}.json"), "w") as file:
+            file.write(json.dumps(sqlMigration, indent=4))
+
+
+def assert_combined_file_equal(folder: str, sqlMigrations: list[dict]):
+
+    # The combined file must be byte for byte what writing the whole dictionary at once gives
+    expectedPath = os.path.join(folder, "Expected.txt")
+    with open(expectedPath, "w") as file:
+        file.write(json.dumps({"sql_migrations": sqlMigrations}, indent=4))
+
+    with open(expectedPath, "rb") as expectedFile, open(os.path.join(folder, COMBINED_FILE_NAME), "rb") as combinedFile:
+        if expectedFile.read() != combinedFile.read():
+            raise Exception(f"Combined file with {len(sqlMigrations)} migrations differs from json.dumps().")
+
+    os.remove(expectedPath)
+
+    # The indexed file has the same migrations, and loads only the ones after a version
+    versions = [sqlMigration["migrationIndex"] for sqlMigration in sqlMigrations]
+    for version in range(-1, max(versions, default=0)+2):
+        loadedMigrations = CombinedMigrations.load_sql_migrations_after(os.path.join(folder, INDEXED_FILE_NAME), version)
+        if loadedMigrations != [sqlMigration for sqlMigration in sqlMigrations if sqlMigration["migrationIndex"] > version]:
+            raise Exception(f"Indexed file with {len(sqlMigrations)} migrations loads the wrong migrations after #{version}.")
+
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Combined Migrations File", True)
+def test_combined_file_appends_new_migrations():
+    sqlMigrations = load_example_sql_migrations()
+    folder = tempfile.mkdtemp()
+
+    try:
+        # An empty history still gives a valid file
+        if CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX) != (0, 0):
+            raise Exception("Wrote migrations for an empty folder.")
+        assert_combined_file_equal(folder, [])
+
+        # Each new migration is appended to the existing ones
+        for i in range(len(sqlMigrations)):
+            write_sql_migration_files(folder, sqlMigrations[i:i+1])
+            counts = CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX)
+
+            if counts != ((i, 1) if i > 0 else (0, 1)):
+                raise Exception(f"Expected to keep {i} migrations and write 1, got {counts}.")
+            assert_combined_file_equal(folder, sqlMigrations[:i+1])
+
+        # Nothing changed, so nothing is written
+        if CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX) != (len(sqlMigrations), 0):
+            raise Exception("Rewrote an up to date combined file.")
+    finally:
+        shutil.rmtree(folder)
+
+
+@group_test(allTestGroups, "Combined Migrations File", True)
+def test_combined_file_rewritten_after_changes():
+    sqlMigrations = load_example_sql_migrations()
+    folder = tempfile.mkdtemp()
+
+    try:
+        write_sql_migration_files(folder, sqlMigrations)
+        CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX)
+
+        # Editing an older migration rewrites everything
+        sqlMigrations[1]["sqlStatements"].append("SELECT 1;")
+        write_sql_migration_files(folder, sqlMigrations[1:2])
+        if CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX) != (0, len(sqlMigrations)):
+            raise Exception("Kept migrations after an older migration changed.")
+        assert_combined_file_equal(folder, sqlMigrations)
+
+        # So does editing either combined file, or losing the manifest
+        for fileName in [COMBINED_FILE_NAME, INDEXED_FILE_NAME]:
+            with open(os.path.join(folder, fileName), "a") as file:
+                file.write(" ")
+            if CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX) != (0, len(sqlMigrations)):
+                raise Exception(f"Kept migrations after '{fileName}' changed.")
+
+        os.remove(os.path.join(folder, CombinedMigrations.COMBINED_MANIFEST_FILE))
+        if CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX) != (0, len(sqlMigrations)):
+            raise Exception("Kept migrations without a manifest.")
+        assert_combined_file_equal(folder, sqlMigrations)
+
+        # Removing the newest migration removes it from the file too
+        os.remove(os.path.join(folder, f"SQLMigration_{sqlMigrations[-1]['migrationIndex']}.json"))
+        CombinedMigrations.write_combined_file(folder, COMBINED_FILE_NAME, INDEXED_FILE_NAME, SQL_FILE_REGEX)
+        assert_combined_file_equal(folder, sqlMigrations[:-1])
+
+        # Files that aren't indexed combined files are rejected
+        for invalidContents in [b"", b"{}", COMBINED_FILE_NAME.encode()*4]:
+            with open(os.path.join(folder, "Invalid.bin"), "wb") as file:
+                file.write(invalidContents)
+
+            try:
+                CombinedMigrations.load_sql_migrations_after(os.path.join(folder, "Invalid.bin"), 0)
+            except CombinedMigrations.CombinedIndexError:
+                continue
+            raise Exception(f"Loaded an invalid indexed file: {invalidContents}")
+    finally:
+        shutil.rmtree(folder)
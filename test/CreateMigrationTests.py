@@ -0,0 +1,172 @@
+import builtins
+from Schema import *
+from Migrations import *
+import CreateMigration
+from .TestGroup import *
+
+
+### UTILITY FUNCTIONS ###
+def create_people_table(name: str, extraColumns: list[Column] = []) -> Table:
+    return Table(name, [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column("FullName", "TEXT", ["NOT NULL"])] + extraColumns, [])
+
+
+def fail_on_input(*args):
+    raise Exception("Non-interactive decisions asked for input!")
+
+
+def diff_without_input(oldSchema: DatabaseSchema, newSchema: DatabaseSchema, decisions: CreateMigration.MigrationDecisions) -> SchemaMigration:
+    originalInput = builtins.input
+    builtins.input = fail_on_input
+    try:
+        return SchemaMigration(1, CreateMigration.create_migrations_for_objects(oldSchema.tables, newSchema.tables, Table, decisions))
+    finally:
+        builtins.input = originalInput
+
+
+def expect_ambiguity(oldSchema: DatabaseSchema, newSchema: DatabaseSchema, decisions: CreateMigration.MigrationDecisions, description: str):
+    try:
+        diff_without_input(oldSchema, newSchema, decisions)
+    except CreateMigration.AmbiguousMigrationError:
+        return
+
+    raise Exception(f"Expected an AmbiguousMigrationError for {description}.")
+
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Create Migration Tests", True)
+def test_non_interactive_diff():
+    oldSchema = DatabaseSchema([
+        create_people_table("Users"),
+        create_people_table("Admins", [Column("Level", "INTEGER", [])]),
+        Table("Logs", [Column("Message", "TEXT", [])], []),
+        Table("Sessions", [Column("Token", "TEXT", ["UNIQUE"]), Column("Expiry", "INTEGER", [])], []),
+    ])
+
+    # Users is renamed with the same contents, Admins is altered, Logs is removed, Sessions has a
+    # hinted column rename and Audit is new
+    newSchema = DatabaseSchema([
+        create_people_table("Members"),
+        create_people_table("Admins", [Column("Level", "INTEGER", ["NOT NULL", "DEFAULT 0"])]),
+        Table("Sessions", [Column("Token", "TEXT", ["UNIQUE"]), Column("ExpiresAt", "INTEGER", ["NULL"])], []),
+        Table("Audit", [Column("Message", "TEXT", ["NOT NULL"])], []),
+    ])
+
+    # Audit has the same columns as Logs, so it has to be declared new rather than a changed rename
+    hints = {"migration_name": "Refactor", "columns": {"Sessions": {"renames": {"ExpiresAt": "Expiry"}}}}
+    expect_ambiguity(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions(hints), "a new table similar to a removed one")
+
+    hints["tables"] = {"new": ["Audit"]}
+    decisions = CreateMigration.HintedMigrationDecisions(hints)
+    migration = diff_without_input(oldSchema, newSchema, decisions)
+
+    migrationKeys = sorted([(tableMigration.oldKey or "", tableMigration.newName or "") for tableMigration in migration.tableMigrations])
+    if migrationKeys != [("", "Audit"), ("Admins", "Admins"), ("Logs", ""), ("Sessions", "Sessions"), ("Users", "Members")]:
+        raise Exception(f"Unexpected table migrations: {migrationKeys}")
+
+    if len(decisions.get_unused_hints()) > 0 or not decisions.confirm_save(migration) or migration.migrationName != "Refactor":
+        raise Exception("Hints weren't all used.")
+
+    # Running the migration on the old schema gives the new one
+    errors = migration.migrate_schema(oldSchema)
+    if len(errors) > 0 or not oldSchema.compare_equivalence(newSchema):
+        raise Exception(f"Migrating the old schema doesn't give the new schema: {[str(err) for err in errors]}")
+
+
+@group_test(allTestGroups, "Create Migration Tests", True)
+def test_non_interactive_ambiguity():
+    oldSchema = DatabaseSchema([create_people_table("Users"), create_people_table("Customers")])
+
+    # Two removed tables match the same new one, unless a hint picks one
+    newSchema = DatabaseSchema([create_people_table("Members")])
+    expect_ambiguity(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions(), "two removed candidates")
+
+    migration = diff_without_input(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions({"tables": {"renames": {"Members": "Customers"}}}))
+    if sorted([(tableMigration.oldKey, tableMigration.newName) for tableMigration in migration.tableMigrations], key=str) != [("Customers", "Members"), ("Users", None)]:
+        raise Exception(f"Hinted rename wasn't used: {[str(tableMigration) for tableMigration in migration.tableMigrations]}")
+
+    # Two new tables match the same removed one
+    oldSchema = DatabaseSchema([create_people_table("Users")])
+    newSchema = DatabaseSchema([create_people_table("Members"), create_people_table("Guests")])
+    expect_ambiguity(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions(), "two new tables matching one removed table")
+
+    # Declaring one of them new settles it
+    decisions = CreateMigration.HintedMigrationDecisions({"tables": {"new": ["Guests"]}})
+    migration = diff_without_input(oldSchema, newSchema, decisions)
+    if sorted([(tableMigration.oldKey or "", tableMigration.newName) for tableMigration in migration.tableMigrations]) != [("", "Guests"), ("Users", "Members")]:
+        raise Exception(f"Hinted new table wasn't used: {[str(tableMigration) for tableMigration in migration.tableMigrations]}")
+
+    # Renames from tables that don't exist fail, hints that match nothing are reported
+    expect_ambiguity(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions({"tables": {"renames": {"Members": "Missing"}}}), "a missing renamed table")
+
+    decisions = CreateMigration.HintedMigrationDecisions({"tables": {"new": ["Guests", "Typo"]}, "columns": {"Typo": {"renames": {"A": "B"}}}})
+    diff_without_input(oldSchema, newSchema, decisions)
+    if sorted(decisions.get_unused_hints()) != ["new 'Typo'", "rename of 'A' in table 'Typo'"]:
+        raise Exception(f"Unexpected unused hints: {decisions.get_unused_hints()}")
+
+
+@group_test(allTestGroups, "Create Migration Tests", True)
+def test_non_interactive_changed_renames_need_hints():
+    oldSchema = DatabaseSchema([create_people_table("Users", [Column("Age", "INTEGER", [])]), Table("Logs", [Column("Message", "TEXT", [])], [])])
+
+    # Users is renamed while gaining a column, which must not become a drop and an add
+    newSchema = DatabaseSchema([create_people_table("Members", [Column("Age", "INTEGER", []), Column("Email", "TEXT", [])]), Table("Logs", [Column("Message", "TEXT", [])], [])])
+    expect_ambiguity(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions(), "a table renamed along with a change")
+
+    migration = diff_without_input(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions({"tables": {"renames": {"Members": "Users"}}}))
+    if [(tableMigration.oldKey, tableMigration.newName) for tableMigration in migration.tableMigrations] != [("Users", "Members")]:
+        raise Exception(f"Hinted rename wasn't used: {[str(tableMigration) for tableMigration in migration.tableMigrations]}")
+
+    # The same goes for a column renamed along with a change to its constraints
+    newSchema = DatabaseSchema([create_people_table("Users", [Column("Years", "INTEGER", ["NOT NULL", "DEFAULT 0"])]), Table("Logs", [Column("Message", "TEXT", [])], [])])
+    expect_ambiguity(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions(), "a column renamed along with a change")
+
+    migration = diff_without_input(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions({"columns": {"Users": {"new": ["Years"]}}}))
+    colKeys = sorted([(colMigration.oldKey or "", colMigration.newColumnData.name if colMigration.newColumnData != None else "")
+                      for tableMigration in migration.tableMigrations for colMigration in tableMigration.colMigrations])
+    if colKeys != [("", "Years"), ("Age", "")]:
+        raise Exception(f"Hinted new column wasn't used: {colKeys}")
+
+    # Objects unlike any removed one are still new without a hint
+    newSchema = DatabaseSchema([create_people_table("Users", [Column("Age", "INTEGER", []), Column("Email", "TEXT", [])]),
+                                Table("Logs", [Column("Message", "TEXT", [])], []), Table("Tags", [Column("Label", "TEXT", [])], [])])
+    migration = diff_without_input(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions())
+    if len(migration.tableMigrations) != 2:
+        raise Exception(f"Unexpected table migrations: {[str(tableMigration) for tableMigration in migration.tableMigrations]}")
+
+
+@group_test(allTestGroups, "Create Migration Tests", True)
+def test_index_diff():
+    oldSchema = DatabaseSchema([
+        create_people_table("Users").copy(),
+        create_people_table("Admins"),
+    ])
+    oldSchema.get_table("Users").add_index(Index("IDX_USERS_NAME", ["FullName"]))
+    oldSchema.get_table("Users").add_index(Index("IDX_USERS_OLD", ["ID", "FullName"]))
+    oldSchema.get_table("Admins").add_index(Index("IDX_ADMINS_NAME", ["FullName"]))
+
+    # Users alters one index and renames another, Admins removes its index and adds an expression one
+    newSchema = DatabaseSchema([
+        Table("Users", create_people_table("Users").columns, [], [
+            Index("IDX_USERS_NAME", ["FullName"], True),
+            Index("IDX_USERS_NEW", ["ID", "FullName"])
+        ]),
+        Table("Admins", create_people_table("Admins").columns, [], [
+            Index("IDX_ADMINS_LOWER", ["lower(FullName)"], False, "ID > 0")
+        ]),
+    ])
+
+    migration = diff_without_input(oldSchema, newSchema, CreateMigration.HintedMigrationDecisions())
+    indexKeys = sorted([(indexMigration.oldKey or "", indexMigration.newIndex.name if indexMigration.newIndex != None else "")
+                        for tableMigration in migration.tableMigrations for indexMigration in tableMigration.indexMigrations])
+    if indexKeys != [("", "IDX_ADMINS_LOWER"), ("IDX_ADMINS_NAME", ""), ("IDX_USERS_NAME", "IDX_USERS_NAME"), ("IDX_USERS_OLD", "IDX_USERS_NEW")]:
+        raise Exception(f"Unexpected index migrations: {indexKeys}")
+
+    if any(len(tableMigration.colMigrations) > 0 for tableMigration in migration.tableMigrations):
+        raise Exception("Changing indexes migrated columns.")
+
+    # Index migrations serialize, and running them on the old schema gives the new one
+    migration = SchemaMigration.from_dict(migration.to_dict())
+    errors = migration.migrate_schema(oldSchema)
+    if len(errors) > 0 or not oldSchema.compare_equivalence(newSchema):
+        raise Exception(f"Migrating the old schema doesn't give the new schema: {[str(err) for err in errors]}")
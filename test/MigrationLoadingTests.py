@@ -0,0 +1,75 @@
+import io
+import os
+import shutil
+import tempfile
+import contextlib
+from Schema import *
+from Migrations import *
+from .TestGroup import *
+from .SchemaCheckpointTests import EXAMPLE_MIGRATIONS_FOLDER
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Migration Loading Tests", True)
+def test_concurrent_loading_reports_bad_files():
+
+    # Imported here, as MigrationsAdmin imports the tests itself
+    import MigrationsAdmin
+
+    tempFolder = tempfile.mkdtemp()
+    previousJobs = MigrationsAdmin.JOBS
+
+    try:
+        for fileName in os.listdir(EXAMPLE_MIGRATIONS_FOLDER):
+            if fileName.startswith("Migration_") or (fileName.startswith("SQLMigration_") and fileName[len("SQLMigration_")].isdigit()):
+                shutil.copy(os.path.join(EXAMPLE_MIGRATIONS_FOLDER, fileName), tempFolder)
+
+        # Files that can't be opened (folders) are reported and skipped
+        os.mkdir(os.path.join(tempFolder, "Migration_11.json"))
+        os.mkdir(os.path.join(tempFolder, "SQLMigration_11.json"))
+
+        MigrationsAdmin.JOBS = 4
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            migrations = MigrationsAdmin.get_all_migrations(tempFolder)
+            sqlMigrations = MigrationsAdmin.get_sql_migrations_as_dicts(tempFolder)
+
+        if [migration.migrationIndex for migration in migrations] != list(range(10)):
+            raise Exception(f"Expected migrations #0 to #9 in order, got {[migration.migrationIndex for migration in migrations]}")
+
+        if [sqlMigration["migrationIndex"] for sqlMigration in sqlMigrations] != list(range(10)):
+            raise Exception(f"Expected SQL migrations #0 to #9 in order, got {[sqlMigration['migrationIndex'] for sqlMigration in sqlMigrations]}")
+
+        for expectedMessage in [f"Could not open migration file: '{os.path.join(tempFolder, 'Migration_11.json')}': ",
+                                f"Could not open SQL migration file: '{os.path.join(tempFolder, 'SQLMigration_11.json')}': "]:
+            if expectedMessage not in output.getvalue():
+                raise Exception(f"Missing error: {expectedMessage}")
+
+        # Files that can't be parsed (invalid JSON, text that isn't UTF-8) are all reported, then
+        # stop the command, as a history with a migration missing would give wrong results
+        with open(os.path.join(tempFolder, "Migration_10.json"), "w") as badFile:
+            badFile.write("{ not json")
+        with open(os.path.join(tempFolder, "Migration_12.json"), "wb") as badFile:
+            badFile.write(b"\xff\xfe\xfa")
+        with open(os.path.join(tempFolder, "SQLMigration_10.json"), "w") as badFile:
+            badFile.write("{ not json")
+
+        for loadFunc, badFileNames in [(MigrationsAdmin.get_all_migrations, ["Migration_10.json", "Migration_12.json"]),
+                                       (MigrationsAdmin.get_sql_migrations_as_dicts, ["SQLMigration_10.json"])]:
+            output = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(output):
+                    loadFunc(tempFolder)
+                raise Exception(f"{loadFunc.__name__} didn't stop at a file that can't be parsed.")
+            except ValueError:
+                pass
+
+            for badFileName in badFileNames:
+                fileDescription = "SQL migration file" if badFileName.startswith("SQL") else "migration file"
+                expectedMessage = f"Could not parse {fileDescription}: '{os.path.join(tempFolder, badFileName)}': "
+                if expectedMessage not in output.getvalue():
+                    raise Exception(f"Missing error: {expectedMessage}")
+
+    finally:
+        MigrationsAdmin.JOBS = previousJobs
+        shutil.rmtree(tempFolder)
@@ -0,0 +1,113 @@
+import sqlite3
+from Schema import *
+from Migrations import *
+import SQLMigrations
+import SQLExecution
+import MigrationSquash
+from .TestGroup import *
+from .SQLMigrationTests import assert_tables, assert_columns_in_table, assert_foreign_keys_in_table, assert_db_data_equal
+from .SchemaCheckpointTests import load_example_migrations, replay_migrations
+from .SQLExecutionTests import load_example_sql_migrations
+
+### TEST CASES ###
+@group_test(allTestGroups, "Migration Squash Tests", True)
+def test_squash_example_migrations():
+    migrations = load_example_migrations()
+    finalSchema = replay_migrations(load_example_migrations())
+
+    for fromCount in range(len(migrations)):
+        startSchema = replay_migrations(load_example_migrations()[:fromCount])
+        squashedMigration, squashedSchema = MigrationSquash.squash_migrations(migrations[fromCount:], startSchema)
+
+        if not squashedSchema.compare_equivalence(finalSchema):
+            raise Exception(f"Squashing after {fromCount} migrations gives a different schema than a full replay.")
+
+        # Every table must be migrated at most once
+        tableKeys = [tableMigration.oldKey for tableMigration in squashedMigration.tableMigrations if not tableMigration.is_add()]
+        if len(tableKeys) != len(set(tableKeys)):
+            raise Exception(f"Squashing after {fromCount} migrations migrates a table more than once: {tableKeys}")
+
+        if squashedMigration.migrationIndex != migrations[-1].migrationIndex:
+            raise Exception(f"Squashed migration has index #{squashedMigration.migrationIndex}, expected #{migrations[-1].migrationIndex}.")
+
+    # Applies the first 3 migrations one by one, then the rest as one squashed SQL migration
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        SQLExecution.apply_pending_migrations(dbConn, load_example_sql_migrations()[:3])
+
+        startSchema = replay_migrations(load_example_migrations()[:3])
+        squashedMigration, _ = MigrationSquash.squash_migrations(migrations[3:], startSchema)
+        sqlMigration = SQLMigrations.create_sql_for_schema_migration(squashedMigration, startSchema)
+
+        if not SQLExecution.apply_pending_migrations(dbConn, [sqlMigration.__dict__]):
+            raise Exception("Failed to apply the squashed migration.")
+
+        assert_tables(dbConn, finalSchema.tables)
+        for table in finalSchema.tables:
+            assert_columns_in_table(dbConn, table)
+            assert_foreign_keys_in_table(dbConn, table)
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "Migration Squash Tests", True)
+def test_squash_swapped_tables_with_data():
+    startSchema = DatabaseSchema([
+        Table("First", [Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]), Column("FirstValue", "INTEGER", [])], []),
+        Table("Second", [Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]), Column("SecondValue", "INTEGER", [])], []),
+    ])
+
+    # Swaps the names of the two tables through a temporary name, and adds a column to each
+    migrations = [
+        SchemaMigration(1, [TableMigration("First", "Temporary", [ColumnMigration(None, Column("AddedToFirst", "INTEGER", ["NOT NULL", "DEFAULT 1"]))], [])]),
+        SchemaMigration(2, [TableMigration("Second", "First", [ColumnMigration(None, Column("AddedToSecond", "INTEGER", ["NOT NULL", "DEFAULT 2"]))], [])]),
+        SchemaMigration(3, [TableMigration("Temporary", "Second", [ColumnMigration("FirstValue", Column("RenamedValue", "INTEGER", []))], [])]),
+    ]
+
+    squashedMigration, squashedSchema = MigrationSquash.squash_migrations(migrations, startSchema)
+    if len(squashedMigration.tableMigrations) != 2:
+        raise Exception(f"Expected 2 table migrations, got {len(squashedMigration.tableMigrations)}.")
+
+    dbConn = sqlite3.connect(":memory:")
+    try:
+        dbConn.execute("CREATE TABLE First (ID INTEGER PRIMARY KEY AUTOINCREMENT, FirstValue INTEGER);")
+        dbConn.execute("CREATE TABLE Second (ID INTEGER PRIMARY KEY AUTOINCREMENT, SecondValue INTEGER);")
+        dbConn.execute("INSERT INTO First (ID, FirstValue) VALUES (1, 10), (2, 20);")
+        dbConn.execute("INSERT INTO Second (ID, SecondValue) VALUES (1, 30);")
+
+        # Both tables are rebuilt, and each takes over the name of the other
+        for sql in SQLMigrations.create_sql_for_schema_migration(squashedMigration, startSchema).sqlStatements:
+            dbConn.execute(sql)
+
+        assert_tables(dbConn, squashedSchema.tables)
+        for table in squashedSchema.tables:
+            assert_columns_in_table(dbConn, table)
+
+        assert_db_data_equal([(1, 10, 1), (2, 20, 1)], dbConn.execute("SELECT ID, RenamedValue, AddedToFirst FROM Second;").fetchall())
+        assert_db_data_equal([(1, 30, 2)], dbConn.execute("SELECT ID, SecondValue, AddedToSecond FROM First;").fetchall())
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "Migration Squash Tests", True)
+def test_squash_index_migrations():
+    startSchema = DatabaseSchema([
+        Table("Pets", [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column("Name", "TEXT", [])], [], [Index("IDX_PETS_ID", ["ID"])]),
+    ])
+
+    # An index is added then altered, and another is removed: the net result is one add and one remove
+    migrations = [
+        SchemaMigration(1, [TableMigration("Pets", "Pets", [], [], [IndexMigration(None, Index("IDX_PETS_NAME", ["Name"]))])]),
+        SchemaMigration(2, [TableMigration("Pets", "Pets", [], [], [
+            IndexMigration("IDX_PETS_NAME", Index("IDX_PETS_NAME", ["Name"], True)),
+            IndexMigration("IDX_PETS_ID", None)
+        ])]),
+    ]
+
+    squashedMigration, finalSchema = MigrationSquash.squash_migrations(migrations, startSchema)
+    indexMigrations = squashedMigration.tableMigrations[0].indexMigrations
+    if len(squashedMigration.tableMigrations) != 1 or sorted([(migration.is_add(), migration.is_remove()) for migration in indexMigrations]) != [(False, True), (True, False)]:
+        raise Exception(f"Unexpected squashed index migrations: {[str(migration) for migration in indexMigrations]}")
+
+    if finalSchema.get_table("Pets").indexes[0].unique != True:
+        raise Exception("Squashed schema lost the index change.")
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import tempfile
+from Schema import *
+from Migrations import *
+import ParseCache
+from .TestGroup import *
+from .SchemaCheckpointTests import EXAMPLE_MIGRATIONS_FOLDER
+
+
+### UTILITY ###
+def load_schema_cached(filePath: str) -> tuple:
+    return ParseCache.load_file_cached(filePath, DatabaseSchema.from_json, DatabaseSchema.from_dict)
+
+
+def write_schema_file(filePath: str, columnName: str):
+    schema = DatabaseSchema([Table("Pets", [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column(columnName, "TEXT", [])], [])])
+    with open(filePath, "w") as schemaFile:
+        schemaFile.write(json.dumps(schema.to_dict()))
+
+
+def set_file_age(filePath: str, seconds: int):
+    fileTime = time.time_ns() - seconds * 1_000_000_000
+    os.utime(filePath, ns=(fileTime, fileTime))
+
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Parse Cache Tests", True)
+def test_parse_cache_hits_and_misses():
+    tempFolder = tempfile.mkdtemp()
+
+    try:
+        filePath = os.path.join(tempFolder, "Schema.json")
+        write_schema_file(filePath, "Name")
+        set_file_age(filePath, 60)
+
+        firstSchema, wasCached = load_schema_cached(filePath)
+        if wasCached:
+            raise Exception("The first load was a cache hit.")
+
+        cachedSchema, wasCached = load_schema_cached(filePath)
+        if not wasCached or not cachedSchema.compare_equivalence(firstSchema):
+            raise Exception("The second load wasn't a cache hit giving the same schema.")
+
+        # An entry written well after the file changed is trusted on size and mtime alone, the
+        # file isn't read (so an edit that puts both back goes unnoticed, as with make or git)
+        fileStat = os.stat(filePath)
+        write_schema_file(filePath, "Eman")
+        os.utime(filePath, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns))
+        statSchema, wasCached = load_schema_cached(filePath)
+        if not wasCached or statSchema.get_table("Pets").get_column("Name") == None:
+            raise Exception("An unchanged size and mtime didn't give a cache hit without reading the file.")
+
+        # A new mtime with the same contents (eg. a checkout) is compared by hash, and is still a
+        # hit. The entry is refreshed with the new mtime.
+        write_schema_file(filePath, "Name")
+        set_file_age(filePath, 30)
+        touchedSchema, wasCached = load_schema_cached(filePath)
+        if not wasCached or not touchedSchema.compare_equivalence(firstSchema):
+            raise Exception("A file with the same contents and a new mtime wasn't a cache hit.")
+
+        header = ParseCache.read_cache_entry(ParseCache.get_cache_path(filePath), os.stat(filePath))[0]
+        if not ParseCache.is_entry_current(header, os.stat(filePath)):
+            raise Exception("The entry wasn't refreshed after its hash matched.")
+
+        # Migrations are rebuilt from their dictionaries too, their table migrations only when used
+        migrationPath = os.path.join(tempFolder, "Migration_3.json")
+        shutil.copy(os.path.join(EXAMPLE_MIGRATIONS_FOLDER, "Migration_3.json"), migrationPath)
+        loadedMigrations = [ParseCache.load_file_cached(migrationPath, lambda text: SchemaMigration.from_dict(json.loads(text)), SchemaMigration.from_cached_dict) for i in range(2)]
+        parsedMigration, cachedMigration = [migration for migration, wasCached in loadedMigrations]
+        if [wasCached for migration, wasCached in loadedMigrations] != [False, True] or parsedMigration.to_dict() != cachedMigration.to_dict():
+            raise Exception("The cached migration differs from the parsed one.")
+
+        if cachedMigration.tableDicts == None or [table.to_dict() for table in cachedMigration.tableMigrations] != parsedMigration.to_dict()["tables"]:
+            raise Exception("The cached migration's table migrations weren't built when first used.")
+
+        if cachedMigration.tableDicts != None or cachedMigration.to_dict() != parsedMigration.to_dict():
+            raise Exception("The cached migration doesn't serialize its built table migrations.")
+
+        # A different size is a miss
+        write_schema_file(filePath, "LongerName")
+        editedSchema, wasCached = load_schema_cached(filePath)
+        if wasCached or editedSchema.get_table("Pets").get_column("LongerName") == None:
+            raise Exception("An edited file was loaded from the cache.")
+
+        # The file was just written, so its entry is racy: an edit within the timestamp resolution
+        # keeps the size and mtime, and only the hash tells it apart
+        load_schema_cached(filePath)
+        fileStat = os.stat(filePath)
+        write_schema_file(filePath, "ShorterNam")
+        os.utime(filePath, ns=(fileStat.st_atime_ns, fileStat.st_mtime_ns))
+        if os.stat(filePath).st_size != fileStat.st_size:
+            raise Exception("The edited file doesn't have the same size.")
+
+        sameSizeSchema, wasCached = load_schema_cached(filePath)
+        if wasCached or sameSizeSchema.get_table("Pets").get_column("ShorterNam") == None:
+            raise Exception("An edit keeping the size and modification time of a racy entry was loaded from the cache.")
+
+    finally:
+        shutil.rmtree(tempFolder)
+
+
+@group_test(allTestGroups, "Parse Cache Tests", True)
+def test_parse_cache_rejects_bad_entries():
+    tempFolder = tempfile.mkdtemp()
+
+    try:
+        filePath = os.path.join(tempFolder, "Schema.json")
+        write_schema_file(filePath, "Name")
+        load_schema_cached(filePath)
+        cachePath = ParseCache.get_cache_path(filePath)
+
+        # Corrupt entries and pickles (which could run code when loaded) are misses, and are replaced
+        for badContents in [b"\x00garbage", pickle.dumps({"version": ParseCache.PARSE_CACHE_FORMAT_VERSION}), b""]:
+            with open(cachePath, "wb") as cacheFile:
+                cacheFile.write(badContents)
+
+            schema, wasCached = load_schema_cached(filePath)
+            if wasCached or schema.get_table("Pets") == None:
+                raise Exception(f"A bad cache entry wasn't treated as a miss: {badContents}")
+
+            if not load_schema_cached(filePath)[1]:
+                raise Exception("The bad cache entry wasn't replaced.")
+
+        # Files that aren't UTF-8 text raise a ValueError, like invalid JSON
+        with open(filePath, "wb") as schemaFile:
+            schemaFile.write(b"\xff\xfe\xfa")
+
+        try:
+            load_schema_cached(filePath)
+            raise Exception("Loading a file that isn't UTF-8 text didn't fail.")
+        except UnicodeDecodeError:
+            pass
+
+    finally:
+        shutil.rmtree(tempFolder)
@@ -0,0 +1,77 @@
+import os
+import json
+import pstats
+import tempfile
+from Schema import *
+from Migrations import *
+import Profiling
+import SchemaCheckpoints
+from .TestGroup import *
+from .SchemaCheckpointTests import load_example_migrations
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Profiling Tests", True)
+def test_profile_counts_work_per_phase():
+    migrations = load_example_migrations()
+
+    # Counting does nothing when no command is profiled
+    Profiling.count("migrations_replayed")
+
+    Profiling.start_profile("test", ["a"])
+    try:
+        Profiling.start_phase("Replaying")
+        schema = DatabaseSchema([])
+        for migration in migrations:
+            SchemaCheckpoints.replay_migration(migration, schema)
+
+        # Replaying the first migration again adds tables that already exist
+        Profiling.start_phase("Invalid")
+        errorCount = len(SchemaCheckpoints.replay_migration(migrations[0], schema))
+    finally:
+        report = Profiling.finish_profile()
+
+    if Profiling.ACTIVE_PROFILE != None:
+        raise Exception("Profile is still active after finishing it.")
+
+    if [phase["name"] for phase in report["phases"]] != [Profiling.SETUP_PHASE_NAME, "Replaying", "Invalid"]:
+        raise Exception(f"Unexpected phases: {report['phases']}")
+
+    if errorCount == 0 or report["phases"][2]["counters"] != {"migrations_replayed": 1, "validation_errors": errorCount}:
+        raise Exception(f"Expected 1 replayed migration with {errorCount} errors in the invalid phase, got {report['phases'][2]['counters']}")
+
+    if report["counters"].get("migrations_replayed") != len(migrations)+1 or report["phases"][1]["counters"]["migrations_replayed"] != len(migrations):
+        raise Exception(f"Expected {len(migrations)} replayed migrations, got {report['counters']}")
+
+    if any([phase["duration_ms"] == None or phase["duration_ms"] > report["total_ms"] for phase in report["phases"]]):
+        raise Exception(f"Invalid phase durations: {report['phases']}")
+
+    if report["peak_memory_bytes"] != None or report["cprofile"]:
+        raise Exception("Memory and cProfile were recorded without being asked for.")
+
+
+@group_test(allTestGroups, "Profiling Tests", True)
+def test_profile_writes_stats_and_memory():
+    with tempfile.TemporaryDirectory() as folder:
+        profile = Profiling.start_profile("test", [], True, True)
+        try:
+            schema = DatabaseSchema([Table(f"Table{i}", [Column("ID", "INTEGER", ["PRIMARY KEY"])], []) for i in range(100)])
+            schema.validate_self()
+        finally:
+            report = Profiling.finish_profile()
+
+        if report["peak_memory_bytes"] == None or report["peak_memory_bytes"] <= 0:
+            raise Exception(f"Peak memory wasn't recorded: {report['peak_memory_bytes']}")
+
+        statsPath = os.path.join(folder, "profile.pstats")
+        reportPath = os.path.join(folder, "profile.json")
+        profile.write_stats(statsPath)
+        Profiling.write_report(report, reportPath)
+
+        profiledFunctions = [function[2] for function in pstats.Stats(statsPath).stats.keys()]
+        if "validate_self" not in profiledFunctions:
+            raise Exception("cProfile stats don't include the profiled code.")
+
+        with open(reportPath) as reportFile:
+            if json.loads(reportFile.read()) != report:
+                raise Exception("Written report differs from the profile.")
@@ -0,0 +1,527 @@
+import io
+import os
+import re
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import contextlib
+from Schema import *
+from Migrations import *
+import Profiling
+import SQLExecution
+import SQLMigrations
+from .TestGroup import *
+from .SQLMigrationTests import assert_tables, assert_columns_in_table, assert_foreign_keys_in_table
+from .SchemaCheckpointTests import EXAMPLE_MIGRATIONS_FOLDER, load_example_migrations, replay_migrations
+
+### UTILITY ###
+def load_example_sql_migrations() -> list[dict]:
+
+    # Imported here since MigrationsAdmin imports the tests. Its regex skips the combined,
+    # squashed and baseline files, like the 'apply' command does.
+    import MigrationsAdmin
+
+    sqlMigrations = []
+    for fileName in os.listdir(EXAMPLE_MIGRATIONS_FOLDER):
+        if re.fullmatch(MigrationsAdmin.MIGRATIONS_SQL_FILE_REGEX, fileName) != None:
+            with open(os.path.join(EXAMPLE_MIGRATIONS_FOLDER, fileName)) as file:
+                sqlMigrations.append(json.loads(file.read()))
+
+    sqlMigrations.sort(key=lambda sqlMigration: sqlMigration["migrationIndex"])
+    return sqlMigrations
+
+
+def get_table_names(dbConn: sqlite3.Connection) -> list[str]:
+    return sorted([item[0] for item in dbConn.execute("""SELECT name FROM sqlite_master WHERE type='table';""").fetchall()])
+
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_apply_example_migrations():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        if not SQLExecution.apply_pending_migrations(dbConn, load_example_sql_migrations()):
+            raise Exception("Failed to apply the example migrations.")
+
+        if SQLExecution.get_applied_version(dbConn) != 9:
+            raise Exception(f"Expected the database to be at migration #9, got #{SQLExecution.get_applied_version(dbConn)}.")
+
+        # The database must match the schema assembled from the migrations
+        endSchema = replay_migrations(load_example_migrations())
+        assert_tables(dbConn, endSchema.tables)
+
+        for table in endSchema.tables:
+            assert_columns_in_table(dbConn, table)
+            assert_foreign_keys_in_table(dbConn, table)
+
+        # Applying again must not do anything
+        if len(SQLExecution.get_pending_migrations(dbConn, load_example_sql_migrations())) != 0:
+            raise Exception("Migrations are still pending after applying them.")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_apply_failing_migration_rolls_back():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        sqlMigrations = load_example_sql_migrations()[:2]
+        sqlMigrations.append({
+            "migrationIndex": 2,
+            "sqlStatements": [
+                "CREATE TABLE ValidTable (ID INTEGER);",
+                "INSERT INTO NonexistentTable VALUES (1);"
+            ],
+            "migrationName": None
+        })
+
+        if SQLExecution.apply_pending_migrations(dbConn, sqlMigrations):
+            raise Exception("Applying an invalid migration did not fail.")
+
+        if SQLExecution.get_applied_version(dbConn) != 1:
+            raise Exception(f"Expected the database to stay at migration #1, got #{SQLExecution.get_applied_version(dbConn)}.")
+
+        if "ValidTable" in get_table_names(dbConn):
+            raise Exception("The failing migration was not rolled back.")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_apply_rebuild_with_batched_copy():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        sqlMigrations = load_example_sql_migrations()
+        SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:3])
+
+        # Inserts rows with gaps in their IDs, so batches can't assume contiguous rowids
+        dbConn.execute("INSERT INTO Owners (ID, OwnerName) VALUES (1, 'Owner');")
+        for i in range(250):
+            dbConn.execute("INSERT INTO Pets (ID, PetName, OwnerID) VALUES (?, ?, 1);", (i*7 + 3, f"Pet {i}"))
+        initialData = dbConn.execute("SELECT ID, PetName, OwnerID FROM Pets;").fetchall()
+
+        # Migration #3 rebuilds the Pets table
+        if not SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[3:4], SQLExecution.CopyOptions(batchSize=40)):
+            raise Exception("Failed to apply the rebuild with a batched copy.")
+
+        newData = dbConn.execute("SELECT ID, PetName, OwnerID FROM Pets;").fetchall()
+        if newData != initialData:
+            raise Exception(f"Data has changed after a batched copy: Expected {len(initialData)} rows VS Actual {len(newData)} rows")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_failed_batched_copy_drops_its_new_table():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        # A note without a body fails the copy in a later batch, after the new table was committed
+        dbConn.execute("CREATE TABLE Notes (Body VARCHAR(255), Author VARCHAR(255));")
+        dbConn.executemany("INSERT INTO Notes (Body, Author) VALUES (?, ?);", [(f"Note {i}" if i != 200 else None, "Someone") for i in range(300)])
+        initialData = dbConn.execute("SELECT rowid, Body FROM Notes ORDER BY rowid;").fetchall()
+
+        rebuildStatements = [
+            f"CREATE TABLE {SQLMigrations.NEW_TABLE_PREFIX}Notes (\n\tBody VARCHAR(255) NOT NULL,\n\tPinned INTEGER DEFAULT 0);",
+            f"INSERT INTO {SQLMigrations.NEW_TABLE_PREFIX}Notes (Body) SELECT Body FROM Notes;",
+            "DROP TABLE Notes;",
+            f"ALTER TABLE {SQLMigrations.NEW_TABLE_PREFIX}Notes RENAME TO Notes;",
+            SQLMigrations.write_sql_create_table(MIGRATIONS_TABLE)
+        ]
+
+        # Only statements other than the new table's creation are reported as left committed
+        for extraStatements, expectedWarning in [([], None), (["CREATE TABLE Extra (ID INTEGER);"], "WARNING: 1 statement(s)")]:
+            try:
+                SQLExecution.apply_sql_migration(dbConn, {"migrationIndex": 0, "sqlStatements": extraStatements + rebuildStatements}, SQLExecution.CopyOptions(batchSize=64))
+                raise Exception("A batched copy of a NULL into a NOT NULL column didn't fail.")
+            except SQLExecution.MigrationApplyError as err:
+                if (expectedWarning == None and "WARNING" in str(err)) or (expectedWarning != None and expectedWarning not in str(err)):
+                    raise Exception(f"Expected the warning {expectedWarning}, got: {err}")
+
+            if f"{SQLMigrations.NEW_TABLE_PREFIX}Notes" in get_table_names(dbConn):
+                raise Exception("The new table of a failed batched copy was left behind.")
+
+            if dbConn.execute("SELECT rowid, Body FROM Notes ORDER BY rowid;").fetchall() != initialData:
+                raise Exception("A failed batched copy changed the old table.")
+
+        # Once the data is fixed, the migration runs again
+        dbConn.execute("UPDATE Notes SET Body = 'Fixed' WHERE Body IS NULL;")
+        SQLExecution.apply_sql_migration(dbConn, {"migrationIndex": 0, "sqlStatements": rebuildStatements}, SQLExecution.CopyOptions(batchSize=64))
+        if dbConn.execute("SELECT COUNT(*) FROM Notes;").fetchone()[0] != len(initialData):
+            raise Exception("Running the migration again didn't copy every row.")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_rebuilds_count_copied_rows():
+    sqlMigrations = load_example_sql_migrations()
+
+    # Every way of copying a rebuilt table counts each copied row once
+    for copyOptions in [None, SQLExecution.CopyOptions(batchSize=40), SQLExecution.CopyOptions(batchSize=40, online=True)]:
+        dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+        try:
+            SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:3])
+            dbConn.execute("INSERT INTO Owners (ID, OwnerName) VALUES (1, 'Owner');")
+            dbConn.executemany("INSERT INTO Pets (ID, PetName, OwnerID) VALUES (?, ?, 1);", [(i*7 + 3, f"Pet {i}") for i in range(250)])
+
+            # Migration #3 rebuilds the Pets table
+            Profiling.start_profile("test", [])
+            try:
+                if not SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[3:4], copyOptions):
+                    raise Exception("Failed to apply the rebuild.")
+            finally:
+                report = Profiling.finish_profile()
+
+            if report["counters"].get("objects_copied") != 250:
+                raise Exception(f"Expected 250 copied rows with {copyOptions}, got {report['counters'].get('objects_copied')}")
+
+        finally:
+            dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_apply_baseline():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        # Pets references Owners, so Owners must be created first even though it's listed last
+        endSchema = replay_migrations(load_example_migrations())
+        endSchema.tables.sort(key=lambda table: table.name != "Pets")
+        orderedNames = [table.name for table in SQLMigrations.get_tables_in_dependency_order(endSchema)]
+        if orderedNames.index("Owners") > orderedNames.index("Pets"):
+            raise Exception(f"Tables are not in dependency order: {orderedNames}")
+
+        baseline = SQLMigrations.create_sql_for_baseline(endSchema, 9, "baseline")
+        if not SQLExecution.apply_pending_migrations(dbConn, [baseline.__dict__]):
+            raise Exception("Failed to apply the baseline.")
+
+        assert_tables(dbConn, endSchema.tables)
+        for table in endSchema.tables:
+            assert_columns_in_table(dbConn, table)
+            assert_foreign_keys_in_table(dbConn, table)
+
+        # The baseline records itself, applying it must not record it again
+        trackedVersions = dbConn.execute(f"SELECT Version, Name FROM {SQLExecution.TRACKING_TABLE_NAME};").fetchall()
+        if trackedVersions != [("9", "baseline")]:
+            raise Exception(f"Expected the baseline to be recorded once, got: {trackedVersions}")
+
+        if len(SQLExecution.get_pending_migrations(dbConn, load_example_sql_migrations())) != 0:
+            raise Exception("Migrations are still pending after applying the baseline.")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_apply_online_rebuild_mirrors_concurrent_writes():
+    folder = tempfile.mkdtemp()
+    dbPath = os.path.join(folder, "online.db")
+    dbConn = sqlite3.connect(dbPath, isolation_level=None, timeout=10)
+
+    try:
+        dbConn.execute("PRAGMA journal_mode=WAL;")
+        sqlMigrations = load_example_sql_migrations()
+        SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:3])
+
+        dbConn.execute("INSERT INTO Owners (ID, OwnerName) VALUES (1, 'Owner');")
+        expectedPets = {i*3 + 1: f"Pet {i}" for i in range(3000)}
+        dbConn.executemany("INSERT INTO Pets (ID, PetName, OwnerID) VALUES (?, ?, 1);", list(expectedPets.items()))
+
+        # Another connection keeps inserting, updating and deleting pets while Pets is rebuilt
+        rebuildDone = threading.Event()
+        def write_pets():
+            writerConn = sqlite3.connect(dbPath, isolation_level=None, timeout=10)
+            rng = random.Random(0)
+            try:
+                while not rebuildDone.is_set():
+                    petId = rng.randrange(1, 10000)
+                    action = rng.randrange(3)
+                    if action == 0 and petId not in expectedPets:
+                        writerConn.execute("INSERT INTO Pets (ID, PetName, OwnerID) VALUES (?, ?, 1);", (petId, f"New {petId}"))
+                        expectedPets[petId] = f"New {petId}"
+                    elif action == 1 and petId in expectedPets:
+                        writerConn.execute("UPDATE Pets SET PetName = ? WHERE ID = ?;", (f"Changed {petId}", petId))
+                        expectedPets[petId] = f"Changed {petId}"
+                    elif action == 2 and petId in expectedPets:
+                        writerConn.execute("DELETE FROM Pets WHERE ID = ?;", (petId,))
+                        del expectedPets[petId]
+
+                    # Leaves the database to the rebuild now and then, like a real writer would
+                    time.sleep(0.0002)
+            finally:
+                writerConn.close()
+
+        writerThread = threading.Thread(target=write_pets)
+        writerThread.start()
+        try:
+            # Migration #3 rebuilds the Pets table
+            applied = SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[3:4], SQLExecution.CopyOptions(batchSize=100, sleepSeconds=0.001, online=True))
+        finally:
+            rebuildDone.set()
+            writerThread.join()
+
+        if not applied:
+            raise Exception("Failed to apply the rebuild online.")
+
+        newPets = dict(dbConn.execute("SELECT ID, PetName FROM Pets;").fetchall())
+        if newPets != expectedPets:
+            missingCount = len([petId for petId in expectedPets if newPets.get(petId) != expectedPets[petId]])
+            raise Exception(f"Changes made during the online rebuild were lost: {missingCount} rows differ, {len(newPets)} rows VS {len(expectedPets)} expected")
+
+        leftovers = dbConn.execute(f"SELECT name FROM sqlite_master WHERE name LIKE '{SQLMigrations.NEW_TABLE_PREFIX}%' OR type = 'trigger';").fetchall()
+        if len(leftovers) > 0:
+            raise Exception(f"The online rebuild left objects behind: {leftovers}")
+
+    finally:
+        dbConn.close()
+        shutil.rmtree(folder)
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_apply_online_rebuild_by_rowid():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        # Notes has no INTEGER PRIMARY KEY, so rows are matched by their copied rowids
+        dbConn.execute("CREATE TABLE Notes (Body VARCHAR(255), Author VARCHAR(255));")
+        dbConn.executemany("INSERT INTO Notes (rowid, Body, Author) VALUES (?, ?, ?);", [(i*5, f"Note {i}", "Someone") for i in range(1, 300)])
+        initialData = dbConn.execute("SELECT rowid, Body FROM Notes ORDER BY rowid;").fetchall()
+
+        rebuildMigration = {"migrationIndex": 0, "sqlStatements": [
+            f"CREATE TABLE {SQLMigrations.NEW_TABLE_PREFIX}Notes (\n\tBody VARCHAR(255) NOT NULL,\n\tPinned INTEGER DEFAULT 0);",
+            f"INSERT INTO {SQLMigrations.NEW_TABLE_PREFIX}Notes (Body) SELECT Body FROM Notes;",
+            "DROP TABLE Notes;",
+            f"ALTER TABLE {SQLMigrations.NEW_TABLE_PREFIX}Notes RENAME TO Notes;",
+            SQLMigrations.write_sql_create_table(MIGRATIONS_TABLE)
+        ]}
+        SQLExecution.apply_sql_migration(dbConn, rebuildMigration, SQLExecution.CopyOptions(batchSize=64, online=True))
+
+        newData = dbConn.execute("SELECT rowid, Body FROM Notes ORDER BY rowid;").fetchall()
+        if newData != initialData:
+            raise Exception(f"Rows or their rowids changed in an online rebuild: {newData[:3]} VS {initialData[:3]}")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_failed_online_rebuild_leaves_database_untouched():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        sqlMigrations = load_example_sql_migrations()
+        SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:3])
+        dbConn.execute("INSERT INTO Owners (ID, OwnerName) VALUES (1, 'Owner');")
+        dbConn.execute("INSERT INTO Pets (ID, PetName, OwnerID) VALUES (1, 'Unnamed', 1);")
+
+        # The new table gets a CHECK constraint the existing pet breaks during the copy
+        failingStatements = list(sqlMigrations[3]["sqlStatements"])
+        failingStatements[0] = failingStatements[0].replace("PetName VARCHAR(255)", "PetName VARCHAR(255) CHECK (PetName != 'Unnamed')")
+        if SQLExecution.apply_pending_migrations(dbConn, [dict(sqlMigrations[3], sqlStatements=failingStatements)], SQLExecution.CopyOptions(online=True)):
+            raise Exception("An online rebuild breaking a CHECK constraint was applied.")
+
+        leftovers = dbConn.execute(f"SELECT name FROM sqlite_master WHERE name LIKE '{SQLMigrations.NEW_TABLE_PREFIX}%' OR type = 'trigger';").fetchall()
+        if len(leftovers) > 0 or SQLExecution.get_applied_version(dbConn) != 2:
+            raise Exception(f"A failed online rebuild changed the database: {leftovers}, version {SQLExecution.get_applied_version(dbConn)}")
+
+        # The old table still works, without triggers copying into a table that no longer exists
+        dbConn.execute("UPDATE Pets SET PetName = 'Named' WHERE ID = 1;")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_online_rebuild_builds_indexes_before_swap():
+    sqlMigrations = load_example_sql_migrations()
+
+    # Migration #3 made unique IDX_PETS_NAME, which it drops and creates again, and IDX_PETS_OWNER
+    # is created outside of the schema
+    indexedMigration = dict(sqlMigrations[3], sqlStatements=["DROP INDEX IDX_PETS_NAME;"] + sqlMigrations[3]["sqlStatements"] + ["CREATE UNIQUE INDEX IDX_PETS_NAME ON Pets (PetName);"])
+    originalIndexes = [("IDX_PETS_NAME", 0), ("IDX_PETS_OWNER", 0)]
+
+    for failsInSwap in [False, True]:
+        dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+        try:
+            SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:3])
+            dbConn.execute("INSERT INTO Owners (ID, OwnerName) VALUES (1, 'Owner');")
+            dbConn.executemany("INSERT INTO Pets (ID, PetName, OwnerID) VALUES (?, ?, 1);", [(i, f"Pet {i}") for i in range(1, 200)])
+            dbConn.execute("CREATE INDEX IDX_PETS_NAME ON Pets (PetName);")
+            dbConn.execute("CREATE INDEX IDX_PETS_OWNER ON Pets (OwnerID);")
+
+            migration = indexedMigration if not failsInSwap else dict(indexedMigration, sqlStatements=indexedMigration["sqlStatements"] + ["INSERT INTO Nonexistent VALUES (1);"])
+            executedStatements = []
+            dbConn.set_trace_callback(executedStatements.append)
+            applied = SQLExecution.apply_pending_migrations(dbConn, [migration], SQLExecution.CopyOptions(batchSize=64, online=True))
+            dbConn.set_trace_callback(None)
+
+            # Only the drops and renames are left for the swap
+            swapStatements = executedStatements[executedStatements.index("SAVEPOINT apply_migration_3;"):executedStatements.index("RELEASE apply_migration_3;")]
+            if any([re.match(r'CREATE (UNIQUE )?INDEX', statement) != None for statement in swapStatements]):
+                raise Exception(f"Indexes were built inside the swap: {swapStatements}")
+
+            indexes = sorted([(name, unique) for seq, name, unique, origin, partial in dbConn.execute("PRAGMA index_list('Pets');").fetchall() if origin == "c"])
+            if applied == failsInSwap or indexes != (originalIndexes if failsInSwap else [("IDX_PETS_NAME", 1), ("IDX_PETS_OWNER", 0)]):
+                raise Exception(f"Unexpected indexes on Pets after {'a failed' if failsInSwap else 'an'} online rebuild: {indexes}")
+
+            leftovers = dbConn.execute(f"SELECT name FROM sqlite_master WHERE name LIKE '{SQLMigrations.NEW_TABLE_PREFIX}%';").fetchall()
+            if len(leftovers) > 0:
+                raise Exception(f"The online rebuild left tables behind: {leftovers}")
+
+        finally:
+            dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_rebuild_keeps_unmodelled_indexes_and_triggers():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        pets = Table("Pets", [
+                Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]),
+                Column("Name", "VARCHAR(255)", []),
+                Column("Age", "INTEGER", [])
+            ], [], [Index("IDX_PETS_ID", ["ID DESC"])])
+        initialSchema = DatabaseSchema([MIGRATIONS_TABLE.copy(), pets, Table("Log", [Column("Message", "TEXT", [])], [])])
+        for sql in SQLMigrations.create_sql_for_baseline(initialSchema, 0).sqlStatements:
+            dbConn.execute(sql)
+
+        # Objects made by hand, which the schema doesn't know about
+        dbConn.execute("""CREATE INDEX IDX_HAND_NAME ON "Pets" (Name COLLATE NOCASE);""")
+        dbConn.execute("CREATE INDEX IDX_HAND_AGE ON Pets (Age);")
+        dbConn.execute("CREATE TRIGGER TRG_HAND_LOG AFTER INSERT ON Pets BEGIN INSERT INTO Log (Message) VALUES (NEW.Name); END;")
+        dbConn.execute("INSERT INTO Pets (Name, Age) VALUES ('Rex', 3);")
+
+        # Rebuilds Pets as Animals without the Age column
+        migration = SchemaMigration(1, [TableMigration("Pets", "Animals", [
+            ColumnMigration("Name", Column("Name", "VARCHAR(255)", ["NOT NULL", "DEFAULT ''"])),
+            ColumnMigration("Age", None)
+        ], [])])
+        sqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, initialSchema, (3, 25, 0))
+        SQLExecution.apply_sql_migration(dbConn, sqlMigration.__dict__)
+
+        tableObjects = dbConn.execute("SELECT type, name, tbl_name FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL ORDER BY name;").fetchall()
+        expectedObjects = [("index", "IDX_HAND_NAME", "Animals"), ("index", "IDX_PETS_ID", "Animals"), ("trigger", "TRG_HAND_LOG", "Animals")]
+        if tableObjects != expectedObjects:
+            raise Exception(f"Unexpected indexes and triggers after the rebuild: {tableObjects}")
+
+        dbConn.execute("INSERT INTO Animals (Name) VALUES ('Tom');")
+        if dbConn.execute("SELECT Message FROM Log;").fetchall() != [("Rex",), ("Tom",)]:
+            raise Exception("The kept trigger doesn't fire on the rebuilt table.")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_drop_column_skips_unmodelled_indexes_and_triggers():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        initialSchema = DatabaseSchema([MIGRATIONS_TABLE.copy(), Table("T", [
+                Column("ID", "INTEGER", ["PRIMARY KEY"]),
+                Column("A", "INTEGER", []),
+                Column("B", "INTEGER", [])
+            ], []), Table("Log", [Column("Message", "TEXT", [])], [])])
+        for sql in SQLMigrations.create_sql_for_baseline(initialSchema, 0).sqlStatements:
+            dbConn.execute(sql)
+
+        # Objects made by hand, which the schema doesn't know about. Only those using A block the drop.
+        dbConn.execute("CREATE INDEX hand_a ON T (A);")
+        dbConn.execute("CREATE INDEX hand_b ON T (B) WHERE A IS NOT NULL;")
+        dbConn.execute("CREATE INDEX hand_b_only ON T (B);")
+        dbConn.execute("CREATE TRIGGER hand_log AFTER INSERT ON T BEGIN INSERT INTO Log (Message) VALUES (NEW.A); END;")
+        dbConn.execute("INSERT INTO T (ID, A, B) VALUES (1, 2, 3);")
+
+        migration = SchemaMigration(1, [TableMigration("T", "T", [ColumnMigration("A", None)], [])])
+        sqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, initialSchema, (3, 35, 0))
+        if sqlMigration.sqlStatements[0] != "ALTER TABLE T DROP COLUMN A;":
+            raise Exception(f"Expected the column to be dropped with ALTER TABLE, got: {sqlMigration.sqlStatements[0]}")
+
+        SQLExecution.apply_sql_migration(dbConn, sqlMigration.__dict__)
+
+        tableObjects = dbConn.execute("SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = 'T' ORDER BY name;").fetchall()
+        if tableObjects != [("index", "hand_b_only")]:
+            raise Exception(f"Unexpected indexes and triggers after dropping the column: {tableObjects}")
+
+        if dbConn.execute("SELECT * FROM T;").fetchall() != [(1, 3)] or SQLExecution.get_applied_version(dbConn) != 1:
+            raise Exception("The column wasn't dropped, or the migration wasn't recorded.")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "SQL Execution Tests", True)
+def test_tuning_profiles_check_foreign_keys():
+    tempFolder = tempfile.mkdtemp()
+
+    try:
+        for profileName in ["safe", "bulk"]:
+            tuningProfile = SQLExecution.TUNING_PROFILES[profileName]
+            dbConn = sqlite3.connect(os.path.join(tempFolder, f"{profileName}.db"), isolation_level=None)
+
+            try:
+                sqlMigrations = load_example_sql_migrations()
+                SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:3])
+
+                # A pet whose owner was already missing doesn't fail migration #3, which rebuilds Pets
+                dbConn.execute("INSERT INTO Pets (ID, PetName, OwnerID) VALUES (1, 'Rex', 42);")
+                dbConn.execute("PRAGMA foreign_keys = ON;")
+                settingNames = ["foreign_keys"] + list(tuningProfile.pragmas.keys())
+                previousSettings = [dbConn.execute(f"PRAGMA {pragma};").fetchone()[0] for pragma in settingNames]
+
+                if not SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:4], tuningProfile=tuningProfile):
+                    raise Exception(f"The '{profileName}' profile failed on a pet whose owner was already missing.")
+
+                # Every setting is restored afterwards, including the journal mode kept in the file
+                settings = [dbConn.execute(f"PRAGMA {pragma};").fetchone()[0] for pragma in settingNames]
+                if settings != previousSettings:
+                    raise Exception(f"The '{profileName}' profile didn't restore {settingNames}: {previousSettings} became {settings}.")
+
+                # A migration adding another pet without an owner is reported
+                orphanMigration = {"migrationIndex": 4, "sqlStatements": ["INSERT INTO Pets (ID, PetName, OwnerID) VALUES (2, 'Tom', 43);"]}
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    if SQLExecution.apply_pending_migrations(dbConn, sqlMigrations[:4] + [orphanMigration], tuningProfile=tuningProfile):
+                        raise Exception(f"The '{profileName}' profile didn't report the missing owner.")
+
+                if f"Failed to apply migration #{3 if tuningProfile.checksEachMigration else 4}" in output.getvalue() or "Pets rowid 2 -> Owners" not in output.getvalue():
+                    raise Exception(f"The '{profileName}' profile didn't report the new violation: {output.getvalue()}")
+
+                # Safe rolls back the violating migration, bulk only checks after committing it
+                expectedVersion = 3 if tuningProfile.checksEachMigration else 4
+                if SQLExecution.get_applied_version(dbConn) != expectedVersion:
+                    raise Exception(f"Expected the '{profileName}' profile to leave the database at #{expectedVersion}, got #{SQLExecution.get_applied_version(dbConn)}.")
+
+            finally:
+                dbConn.close()
+
+    finally:
+        shutil.rmtree(tempFolder)
+
+    # Counts follow tables through rebuilds and renames
+    tableRenames = SQLMigrations.get_table_renames([
+        "CREATE TABLE NEW_CREATED_TABLE_Animals (ID INTEGER);",
+        "INSERT INTO NEW_CREATED_TABLE_Animals (ID) SELECT ID FROM Pets;",
+        "DROP TABLE Pets;",
+        "ALTER TABLE NEW_CREATED_TABLE_Animals RENAME TO Animals;",
+        "ALTER TABLE Owners RENAME TO RENAMED_Owners;",
+        "ALTER TABLE RENAMED_Owners RENAME TO People;"
+    ])
+    if tableRenames != {"Pets": "Animals", "Owners": "People"}:
+        raise Exception(f"Unexpected table renames: {tableRenames}")
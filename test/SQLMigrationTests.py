@@ -1,56 +1,24 @@
 import functools
 import sqlite3
-import os
 from Schema import *
 from Migrations import *
 import SQLMigrations
+import SchemaVerification
+from SchemaVerification import assert_columns_in_table, assert_foreign_keys_in_table
 from .TestGroup import *
 import collections
 
-### CONSTANTS ###
-DATABASE_PATH = "testDB.db"
-
-
-
 ### UTILITY ###
 def setup_database() -> sqlite3.Connection:
 
-    if os.path.exists(DATABASE_PATH):
-        os.remove(DATABASE_PATH)
-
-    return sqlite3.connect(DATABASE_PATH)
+    # Each test gets its own in-memory database, so tests can run at the same time
+    return sqlite3.connect(":memory:")
 
 
 def assert_tables(dbConn: sqlite3.Connection, tables: list[Table]):
 
-    expectedNames = [table.name for table in tables]
-
     # Add tables from default sqlite tables
-    expectedNames.extend(["sqlite_sequence"])
-
-    actualNames = [item[0] for item in dbConn.execute("""SELECT name FROM sqlite_master WHERE type='table';""").fetchall()]
-    
-    if collections.Counter(actualNames) != collections.Counter(expectedNames):
-        raise Exception(f"Tables are not the same: Actual: {actualNames} VS Expected: {expectedNames}")
-    
-
-def assert_columns_in_table(dbConn: sqlite3.Connection, table: Table):
-
-    expectedNames = [col.name for col in table.columns]
-
-    actualNames = [item[0] for item in dbConn.execute(f"""SELECT name FROM PRAGMA_TABLE_INFO('{table.name}');""").fetchall()]
-
-    if collections.Counter(actualNames) != collections.Counter(expectedNames):
-        raise Exception(f"Columns are not the same for table {table.name}: Actual: {actualNames} VS Expected: {expectedNames}")
-
-
-def assert_foreign_keys_in_table(dbConn: sqlite3.Connection, table: Table):
-    expectedKeys = [fKey.get_key() for fKey in table.foreignKeys]
-    
-    actualKeys = [f"{item[3]}->{item[2]}.{item[4]}" for item in dbConn.execute(f"""SELECT * FROM PRAGMA_FOREIGN_KEY_LIST('{table.name}');""").fetchall()]
-
-    if collections.Counter(actualKeys) != collections.Counter(expectedKeys):
-        raise Exception(f"Foreign Keys are not the same for table {table.name}: Actual: {actualKeys} VS Expected: {expectedKeys}")
+    SchemaVerification.assert_tables(dbConn, tables, ["sqlite_sequence"])
 
 
 def assert_db_data_equal(expected, actual):
@@ -740,4 +708,243 @@ def test_sql_migration_alter_column_with_data(dbConn: sqlite3.Connection):
         assert_columns_in_table(dbConn, table)
         assert_foreign_keys_in_table(dbConn, table)
 
-    assert_db_data_equal([123, 456], newData)
\ No newline at end of file
+    assert_db_data_equal([123, 456], newData)
+
+
+@group_test(allTestGroups, "SQL Migration Tests", True)
+@db_test_case
+def test_sql_migration_rename_and_remove_column_with_data(dbConn: sqlite3.Connection):
+    # Sets up the tables we'll be using
+    firstTable = Table("FirstTable", [
+            Column("NewCol", "INTEGER", ["NOT NULL", "DEFAULT 1"]),
+            Column("SecondCol", "INTEGER", [])
+        ],[])
+    renamedFirstTable = Table("RenamedTable", [
+            Column("SecondCol", "INTEGER", [])
+        ],[])
+
+    # Creates the setup commands and executes them
+    setupCommands = [
+        "CREATE TABLE FirstTable (NewCol INTEGER NOT NULL DEFAULT 1, SecondCol INTEGER);",
+        "INSERT INTO FirstTable VALUES (123, 456);"
+    ]
+
+    for command in setupCommands:
+        dbConn.execute(command)
+
+    # Creates the migration to run - renames the table while rebuilding it
+    migration = SchemaMigration(0, [
+        TableMigration("FirstTable", "RenamedTable", [
+            ColumnMigration("NewCol", None)
+        ], []),
+    ])
+
+    # Sets up the start and end schemas
+    initialSchema = DatabaseSchema([firstTable])
+    endSchema = DatabaseSchema([renamedFirstTable])
+
+    # Runs the migration
+    sqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, initialSchema)
+    
+    for sql in sqlMigration.sqlStatements:
+        dbConn.execute(sql)
+
+    # Gets the data from the renamed table
+    newData = dbConn.execute("SELECT * FROM RenamedTable;").fetchall()
+
+    # Performs assertions
+    actualNames = [item[0] for item in dbConn.execute("""SELECT name FROM sqlite_master WHERE type='table';""").fetchall()]
+    if actualNames != ["RenamedTable"]:
+        raise Exception(f"Tables are not the same: Actual: {actualNames} VS Expected: ['RenamedTable']")
+
+    for table in endSchema.tables:
+        assert_columns_in_table(dbConn, table)
+
+    assert_db_data_equal([456], newData)
+
+
+@group_test(allTestGroups, "SQL Migration Tests", True)
+@db_test_case
+def test_sql_migration_alter_table_fast_paths(dbConn: sqlite3.Connection):
+    # Sets up the tables we'll be using
+    firstTable = Table("FirstTable", [
+            Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]),
+            Column("OldName", "INTEGER", []),
+            Column("Removed", "VARCHAR(255)", ["NOT NULL", "DEFAULT 'a'"])
+        ],[])
+    migratedFirstTable = Table("FirstTable", [
+            Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]),
+            Column("NewName", "INTEGER", []),
+            Column("Added", "VARCHAR(255)", ["NOT NULL", "DEFAULT 'b'"])
+        ],[])
+
+    # Creates the setup commands and executes them
+    setupCommands = [
+        "CREATE TABLE FirstTable (ID INTEGER PRIMARY KEY AUTOINCREMENT, OldName INTEGER, Removed VARCHAR(255) NOT NULL DEFAULT 'a');",
+        "INSERT INTO FirstTable VALUES (1, 2, 'c');"
+    ]
+
+    for command in setupCommands:
+        dbConn.execute(command)
+
+    # Creates the migration to run - every change here can be done with ALTER TABLE
+    migration = SchemaMigration(0, [
+        TableMigration("FirstTable", "FirstTable", [
+            ColumnMigration("OldName", Column("NewName", "INTEGER", [])),
+            ColumnMigration("Removed", None),
+            ColumnMigration(None, Column("Added", "VARCHAR(255)", ["NOT NULL", "DEFAULT 'b'"]))
+        ], []),
+    ])
+
+    initialSchema = DatabaseSchema([firstTable])
+    endSchema = DatabaseSchema([migratedFirstTable])
+
+    # Runs the migration, and makes sure no rebuild was used
+    sqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, initialSchema, (3, 35, 0))
+
+    for sql in sqlMigration.sqlStatements:
+        if not sql.startswith("ALTER TABLE FirstTable "):
+            raise Exception(f"Expected only ALTER TABLE statements, got: {sql}")
+        dbConn.execute(sql)
+
+    newData = dbConn.execute("SELECT ID, NewName, Added FROM FirstTable;").fetchall()
+
+    # Performs assertions
+    assert_tables(dbConn, endSchema.tables)
+
+    for table in endSchema.tables:
+        assert_columns_in_table(dbConn, table)
+
+    assert_db_data_equal([1, 2, 'b'], newData)
+
+    # Older SQLite versions can't drop columns, so the same migration must fall back to a rebuild
+    oldVersionMigration = SQLMigrations.create_sql_for_schema_migration(migration, initialSchema, (3, 25, 0))
+    if not oldVersionMigration.sqlStatements[0].startswith("CREATE TABLE " + SQLMigrations.NEW_TABLE_PREFIX):
+        raise Exception(f"Expected a table rebuild for SQLite 3.25, got: {oldVersionMigration.sqlStatements[0]}")
+
+
+@group_test(allTestGroups, "SQL Migration Tests", True)
+@db_test_case
+def test_sql_migration_drop_indexed_column(dbConn: sqlite3.Connection):
+    pets = Table("Pets", [
+            Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]),
+            Column("Name", "VARCHAR(255)", []),
+            Column("Age", "INTEGER", [])
+        ], [], [Index("IDX_PETS_AGE", ["Age"]), Index("IDX_PETS_ADULT", ["lower(Name)"], False, "Age >= 2")])
+    initialSchema = DatabaseSchema([pets])
+
+    for sql in SQLMigrations.create_sql_for_baseline(initialSchema, 0).sqlStatements:
+        dbConn.execute(sql)
+
+    # An index using the column in its terms or WHERE clause would make ALTER TABLE fail
+    for index in pets.indexes:
+        if SQLMigrations.can_drop_column_with_alter(pets, pets.columns[2], initialSchema, set([pets.indexes[0].name, pets.indexes[1].name]) - set([index.name])):
+            raise Exception(f"Expected index {index.name} to block dropping Age with ALTER TABLE.")
+
+    # Once the migration drops both indexes first, the column is dropped in place
+    migration = SchemaMigration(1, [
+        TableMigration("Pets", "Pets", [ColumnMigration("Age", None)], [], [
+            IndexMigration("IDX_PETS_AGE", None),
+            IndexMigration("IDX_PETS_ADULT", None)
+        ])
+    ])
+
+    sqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, initialSchema, (3, 35, 0))
+    expectedStatements = ["DROP INDEX IDX_PETS_AGE;", "DROP INDEX IDX_PETS_ADULT;", "ALTER TABLE Pets DROP COLUMN Age;"]
+    if sqlMigration.sqlStatements != expectedStatements:
+        raise Exception(f"Expected {expectedStatements}, got: {sqlMigration.sqlStatements}")
+
+    for sql in sqlMigration.sqlStatements:
+        dbConn.execute(sql)
+
+    assert_columns_in_table(dbConn, Table("Pets", pets.columns[:2], []))
+
+
+@group_test(allTestGroups, "SQL Migration Tests", True)
+@db_test_case
+def test_sql_migration_add_not_null_column_rebuilds(dbConn: sqlite3.Connection):
+    firstTable = Table("FirstTable", [
+            Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]),
+        ],[])
+
+    dbConn.execute("CREATE TABLE FirstTable (ID INTEGER PRIMARY KEY AUTOINCREMENT);")
+
+    # A NOT NULL column without a default can't be added with ALTER TABLE
+    migration = SchemaMigration(0, [
+        TableMigration("FirstTable", "FirstTable", [
+            ColumnMigration(None, Column("Added", "INTEGER", ["NOT NULL"]))
+        ], []),
+    ])
+
+    sqlMigration = SQLMigrations.create_sql_for_schema_migration(migration, DatabaseSchema([firstTable]))
+    if not sqlMigration.sqlStatements[0].startswith("CREATE TABLE " + SQLMigrations.NEW_TABLE_PREFIX):
+        raise Exception(f"Expected a table rebuild, got: {sqlMigration.sqlStatements[0]}")
+
+    for sql in sqlMigration.sqlStatements:
+        dbConn.execute(sql)
+
+    assert_columns_in_table(dbConn, Table("FirstTable", [Column("ID", "INTEGER", []), Column("Added", "INTEGER", [])], []))
+
+
+@group_test(allTestGroups, "SQL Migration Tests", True)
+@db_test_case
+def test_sql_migration_indexes(dbConn: sqlite3.Connection):
+    pets = Table("Pets", [
+            Column("ID", "INTEGER", ["PRIMARY KEY AUTOINCREMENT"]),
+            Column("Name", "VARCHAR(255)", []),
+            Column("Age", "INTEGER", [])
+        ], [], [Index("IDX_PETS_NAME", ["Name"], True), Index("IDX_PETS_AGE", ["Age"])])
+    owners = Table("Owners", [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column("Email", "TEXT", [])], [],
+                   [Index("IDX_OWNERS_EMAIL", ["Email"])])
+    initialSchema = DatabaseSchema([pets, owners])
+
+    for sql in SQLMigrations.create_sql_for_baseline(initialSchema, 0).sqlStatements:
+        dbConn.execute(sql)
+    dbConn.execute("INSERT INTO Pets (Name, Age) VALUES ('Rex', 3), ('Tom', 5);")
+
+    # Pets is rebuilt (Age changes type), keeps one index and drops one. Owners only changes an
+    # index, and Vets is a new table with an index.
+    migration = SchemaMigration(1, [
+        TableMigration("Pets", "Animals", [ColumnMigration("Age", Column("Age", "INTEGER", ["NOT NULL", "DEFAULT 0"]))], [], [
+            IndexMigration("IDX_PETS_AGE", None),
+            IndexMigration(None, Index("IDX_ANIMALS_ADULT", ["lower(Name)"], False, "Age >= 2"))
+        ]),
+        TableMigration("Owners", "Owners", [], [], [
+            IndexMigration("IDX_OWNERS_EMAIL", Index("IDX_OWNERS_EMAIL", ["Email COLLATE NOCASE"], True))
+        ]),
+        TableMigration(None, "Vets", [ColumnMigration(None, Column("ID", "INTEGER", ["PRIMARY KEY"]))], [], [
+            IndexMigration(None, Index("IDX_PETS_AGE", ["ID DESC"]))
+        ]),
+    ])
+    endSchema = DatabaseSchema([table.copy() for table in initialSchema.tables])
+    if len(migration.migrate_schema(endSchema)) > 0:
+        raise Exception("Index migration gives an invalid schema.")
+
+    sqlStatements = SQLMigrations.create_sql_for_schema_migration(migration, initialSchema).sqlStatements
+
+    # Owners isn't rebuilt, and indexes are only created once the tables have their data and names
+    if any(sql.startswith("CREATE TABLE " + SQLMigrations.NEW_TABLE_PREFIX + "Owners") for sql in sqlStatements):
+        raise Exception("Changing only an index rebuilt the table.")
+
+    firstIndexCreate = min([i for i, sql in enumerate(sqlStatements) if sql.startswith("CREATE") and " INDEX " in sql])
+    lastTableChange = max([i for i, sql in enumerate(sqlStatements) if sql.startswith("INSERT INTO") or sql.startswith("ALTER TABLE") or sql.startswith("CREATE TABLE")])
+    if firstIndexCreate < lastTableChange:
+        raise Exception(f"Indexes are created before the tables are finished: {sqlStatements}")
+
+    for sql in sqlStatements:
+        dbConn.execute(sql)
+
+    assert_tables(dbConn, endSchema.tables)
+    for table in endSchema.tables:
+        assert_columns_in_table(dbConn, table)
+        SchemaVerification.assert_indexes_in_table(dbConn, table)
+
+    assert_db_data_equal([(1, 'Rex', 3), (2, 'Tom', 5)], dbConn.execute("SELECT ID, Name, Age FROM Animals;").fetchall())
+
+    # The kept unique index still works after the rebuild
+    try:
+        dbConn.execute("INSERT INTO Animals (Name, Age) VALUES ('Rex', 1);")
+    except sqlite3.IntegrityError:
+        return
+
+    raise Exception("Unique index was lost in the table rebuild.")
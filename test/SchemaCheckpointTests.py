@@ -0,0 +1,77 @@
+import os
+import json
+import shutil
+import tempfile
+from Schema import *
+from Migrations import *
+import SchemaCheckpoints
+from .TestGroup import *
+
+### CONSTANTS ###
+EXAMPLE_MIGRATIONS_FOLDER = "new_examples"
+
+
+
+### UTILITY ###
+def load_example_migrations() -> list[SchemaMigration]:
+    migrations = []
+    for fileName in os.listdir(EXAMPLE_MIGRATIONS_FOLDER):
+        if fileName.startswith("Migration_"):
+            with open(os.path.join(EXAMPLE_MIGRATIONS_FOLDER, fileName)) as file:
+                migrations.append(SchemaMigration.from_dict(json.loads(file.read())))
+
+    migrations.sort(key=lambda migration: migration.migrationIndex)
+    return migrations
+
+
+def replay_migrations(migrations: list[SchemaMigration]) -> DatabaseSchema:
+    schema = DatabaseSchema([])
+    for migration in migrations:
+        migration.migrate_schema(schema)
+
+    return schema
+
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Schema Checkpoints", True)
+def test_checkpoint_resume_matches_full_replay():
+    migrations = load_example_migrations()
+    checkpointFolder = tempfile.mkdtemp()
+
+    try:
+        # Builds checkpoints, then resumes from them using a fresh store
+        SchemaCheckpoints.CheckpointStore(checkpointFolder, migrations, 3).get_schema_at_version(migrations[-1].migrationIndex)
+        store = SchemaCheckpoints.CheckpointStore(checkpointFolder, migrations, 3)
+        appliedCount, schema = store.load_latest(len(migrations))
+
+        if appliedCount != 9:
+            raise Exception(f"Expected to resume after 9 migrations, resumed after {appliedCount}.")
+
+        for migration in migrations[appliedCount:]:
+            migration.migrate_schema(schema)
+
+        if not schema.compare_equivalence(replay_migrations(load_example_migrations())):
+            raise Exception("Schema resumed from a checkpoint differs from a full replay.")
+    
+    finally:
+        shutil.rmtree(checkpointFolder)
+
+
+@group_test(allTestGroups, "Schema Checkpoints", True)
+def test_checkpoint_invalidated_by_edited_migration():
+    migrations = load_example_migrations()
+    checkpointFolder = tempfile.mkdtemp()
+
+    try:
+        SchemaCheckpoints.CheckpointStore(checkpointFolder, migrations, 3).get_schema_at_version(migrations[-1].migrationIndex)
+
+        # Editing migration #4 must invalidate every checkpoint after it
+        migrations[4].migrationName = "edited"
+        appliedCount, schema = SchemaCheckpoints.CheckpointStore(checkpointFolder, migrations, 3).load_latest(len(migrations))
+
+        if appliedCount != 3:
+            raise Exception(f"Expected to resume after 3 migrations, resumed after {appliedCount}.")
+    
+    finally:
+        shutil.rmtree(checkpointFolder)
@@ -0,0 +1,120 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from Schema import *
+from Migrations import *
+import SQLExecution
+import SQLMigrations
+import SchemaIntrospection
+from .TestGroup import *
+from .SchemaCheckpointTests import load_example_migrations, replay_migrations
+from .SQLExecutionTests import load_example_sql_migrations
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Schema Introspection Tests", True)
+def test_introspect_matches_replayed_schema():
+
+    # The example history, and a baseline of the schema format example (with indexes, defaults and
+    # foreign key actions), must both read back without drift
+    with open("DBSchemaFormat.json") as schemaFile:
+        formatSchema = DatabaseSchema.from_json(schemaFile.read())
+    formatSchema.add_table(MIGRATIONS_TABLE.copy())
+
+    for expectedSchema, sqlMigrations in [(replay_migrations(load_example_migrations()), load_example_sql_migrations()),
+                                          (formatSchema, [SQLMigrations.create_sql_for_baseline(formatSchema, 0).__dict__])]:
+        dbConn = sqlite3.connect(":memory:", isolation_level=None)
+        try:
+            SQLExecution.apply_pending_migrations(dbConn, sqlMigrations)
+            actualSchema, notes = SchemaIntrospection.introspect_database(dbConn)
+
+            if len(notes) > 0:
+                raise Exception(f"Unexpected introspection notes: {notes}")
+
+            differences = SchemaIntrospection.find_schema_drift(expectedSchema, actualSchema)
+            if len(differences) > 0:
+                raise Exception(f"Drift found in a freshly migrated database: {differences}")
+
+            if len(actualSchema.validate_self()) > 0:
+                raise Exception("The introspected schema is invalid.")
+
+        finally:
+            dbConn.close()
+
+
+@group_test(allTestGroups, "Schema Introspection Tests", True)
+def test_drift_lists_every_difference():
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        SQLExecution.apply_pending_migrations(dbConn, load_example_sql_migrations())
+        dbConn.execute("DROP TABLE AnimalHospitals;")
+        dbConn.execute("ALTER TABLE Pets ADD COLUMN Age INTEGER DEFAULT 3;")
+        dbConn.execute("CREATE UNIQUE INDEX IDX_OWNER_NAME ON Owners (OwnerName COLLATE NOCASE DESC) WHERE ID > 2;")
+        dbConn.execute("CREATE TABLE Log (Message TEXT NOT NULL, OwnerID INTEGER REFERENCES Owners ON DELETE CASCADE);")
+
+        actualSchema, notes = SchemaIntrospection.introspect_database(dbConn)
+        differences = SchemaIntrospection.find_schema_drift(replay_migrations(load_example_migrations()), actualSchema)
+        expectedDifferences = [
+            "Table AnimalHospitals is missing from the database.",
+            "Table Log is in the database, but not in the migrations.",
+            "Index IDX_OWNER_NAME on Owners is in the database, but not in the migrations.",
+            "Column Pets.Age is in the database, but not in the migrations."
+        ]
+        if differences != expectedDifferences:
+            raise Exception(f"Unexpected differences: {differences}")
+
+        # Foreign keys without a column list reference the primary key
+        logTable = actualSchema.get_table("Log")
+        if [str(index) for index in actualSchema.get_table("Owners").indexes] != ["UNIQUE INDEX IDX_OWNER_NAME (OwnerName COLLATE NOCASE DESC) WHERE ID > 2"]:
+            raise Exception(f"Wrong introspected index: {[str(index) for index in actualSchema.get_table('Owners').indexes]}")
+        if [(fKey.localName, fKey.tableName, fKey.externalName, fKey.onDelete) for fKey in logTable.foreignKeys] != [("OwnerID", "Owners", "ID", "CASCADE")]:
+            raise Exception(f"Wrong introspected foreign key: {[str(fKey) for fKey in logTable.foreignKeys]}")
+
+        # Changed columns are reported trait by trait
+        expectedSchema = replay_migrations(load_example_migrations())
+        expectedSchema.get_table("Pets").get_column("PetName").constraints = ("NOT NULL", "DEFAULT 'Rex'")
+        differences = SchemaIntrospection.find_table_drift(expectedSchema.get_table("Pets"), actualSchema.get_table("Pets"))
+        if differences[1:] != ["Column Pets.PetName: NOT NULL is False in the database, but True in the migrations.",
+                               "Column Pets.PetName: DEFAULT is None in the database, but 'Rex' in the migrations."]:
+            raise Exception(f"Unexpected column differences: {differences}")
+
+    finally:
+        dbConn.close()
+
+
+@group_test(allTestGroups, "Schema Introspection Tests", True)
+def test_drift_fingerprints():
+    tempFolder = tempfile.mkdtemp()
+    dbConn = sqlite3.connect(":memory:", isolation_level=None)
+
+    try:
+        SQLExecution.apply_pending_migrations(dbConn, load_example_sql_migrations())
+        fingerprint = SchemaIntrospection.get_master_fingerprint(dbConn)
+
+        # Rows don't change the fingerprint, schema changes do
+        dbConn.execute("INSERT INTO Owners (ID, OwnerName) VALUES (1, 'Owner');")
+        if SchemaIntrospection.get_master_fingerprint(dbConn) != fingerprint:
+            raise Exception("Inserting a row changed the fingerprint.")
+
+        dbConn.execute("CREATE INDEX IDX_OWNER_NAME ON Owners (OwnerName);")
+        if SchemaIntrospection.get_master_fingerprint(dbConn) == fingerprint:
+            raise Exception("Adding an index didn't change the fingerprint.")
+
+        if SchemaIntrospection.is_known_fingerprint(tempFolder, "history", fingerprint):
+            raise Exception("A fingerprint is known before it was saved.")
+
+        for i in range(SchemaIntrospection.FINGERPRINTS_PER_HISTORY + 1):
+            SchemaIntrospection.save_known_fingerprint(tempFolder, "history", f"{fingerprint}{i}")
+
+        knownFingerprints = SchemaIntrospection.read_known_fingerprints(tempFolder)["history"]
+        if len(knownFingerprints) != SchemaIntrospection.FINGERPRINTS_PER_HISTORY or f"{fingerprint}0" in knownFingerprints:
+            raise Exception(f"Expected only the newest fingerprints to be kept, got {knownFingerprints}")
+
+        if SchemaIntrospection.is_known_fingerprint(tempFolder, "other history", f"{fingerprint}1"):
+            raise Exception("A fingerprint is known for a different migration history.")
+
+    finally:
+        dbConn.close()
+        shutil.rmtree(tempFolder)
@@ -1,4 +1,9 @@
+import os
+import json
+import collections
 from Schema import *
+from Migrations import *
+import DataValidation
 from .TestGroup import *
 
 ### CONSTANTS ###
@@ -69,3 +74,253 @@ def test_db_schema_serialization_equivalence():
     
     if not equivalent:
         raise Exception("Comparison of old and parsed schemas failed.")
+
+
+@group_test(allTestGroups, "Schema Indexes", True)
+def test_schema_indexes_follow_changes():
+    owners = Table("Owners", [Column("ID", "INTEGER", []), Column("Name", "TEXT", [])], [])
+    pets = Table("Pets", [Column("ID", "INTEGER", []), Column("OwnerID", "INTEGER", [])], [
+            ForeignKey("OwnerID", "Owners", "ID", None, None)
+        ])
+    schema = DatabaseSchema([owners, pets])
+
+    if pets.foreignKeys[0].tableRef is not owners or schema.get_referencing_tables("Owners") != set([pets]):
+        raise Exception("Foreign keys were not linked when creating the schema.")
+
+    # Renaming the referenced column and table must unlink the foreign key once relinked
+    owners.rename_column(owners.get_column("ID"), "OwnerID")
+    schema.rename_table(owners, "People")
+    schema.relink_foreign_keys(schema.get_referencing_tables("Owners"))
+
+    if owners.get_column("ID") != None or owners.get_column("OwnerID") is not owners.columns[0]:
+        raise Exception("Column index was not updated after a rename.")
+
+    if schema.get_table("Owners") != None or schema.get_table("People") is not owners:
+        raise Exception("Table index was not updated after a rename.")
+
+    if pets.foreignKeys[0].tableRef != None or pets.foreignKeys[0].externalRef != None:
+        raise Exception("Foreign key still references a renamed table.")
+
+    # Removing a table must remove it from the reverse index
+    schema.remove_table(pets)
+    if schema.get_table("Pets") != None or len(schema.get_referencing_tables("Owners")) != 0:
+        raise Exception("Indexes were not updated after removing a table.")
+
+
+@group_test(allTestGroups, "Schema Indexes", True)
+def test_schema_indexes_match_after_migrations():
+    migrationFiles = sorted([fileName for fileName in os.listdir("new_examples") if fileName.startswith("Migration_")],
+                            key=lambda fileName: int(fileName.split("_")[1].split(".")[0]))
+    schema = DatabaseSchema([])
+
+    for fileName in migrationFiles:
+        with open(os.path.join("new_examples", fileName)) as file:
+            SchemaMigration.from_dict(json.loads(file.read())).migrate_schema(schema)
+
+        # Incrementally maintained indexes and references must match a freshly built schema
+        rebuiltSchema = DatabaseSchema.from_dict(schema.to_dict())
+        if sorted(schema.tablesByName.keys()) != sorted(rebuiltSchema.tablesByName.keys()):
+            raise Exception(f"Table index differs after {fileName}.")
+
+        for table in schema.tables:
+            rebuiltTable = rebuiltSchema.get_table(table.name)
+            if sorted(table.columnsByName.keys()) != sorted(rebuiltTable.columnsByName.keys()):
+                raise Exception(f"Column index of {table.name} differs after {fileName}.")
+
+            if sorted([referencing.name for referencing in schema.get_referencing_tables(table.name)]) != sorted([referencing.name for referencing in rebuiltSchema.get_referencing_tables(table.name)]):
+                raise Exception(f"Tables referencing {table.name} differ after {fileName}.")
+
+            for fKey, rebuiltFKey in zip(table.foreignKeys, rebuiltTable.foreignKeys):
+                if (fKey.tableRef == None) != (rebuiltFKey.tableRef == None) or (fKey.externalRef == None) != (rebuiltFKey.externalRef == None):
+                    raise Exception(f"Foreign key {fKey.get_key()} is linked differently after {fileName}.")
+
+
+@group_test(allTestGroups, "Schema Validation", True)
+def test_validation_duplicates_and_lazy_context():
+    table = Table("Duplicates", [
+            Column("Col", "INTEGER", ["UNIQUE", "UNIQUE"]),
+            Column("Col", "TEXT", []),
+            Column("Other", "TEXT", [])
+        ],[
+            ForeignKey("Other", "Duplicates", "Col", None, None),
+            ForeignKey("Other", "Duplicates", "Col", None, None)
+        ])
+    schema = DatabaseSchema([table, Table("Duplicates", [Column("ID", "INTEGER", [])], [])])
+
+    errors = schema.validate_self()
+    duplicateMessages = collections.Counter([err.errorMessage for err in errors if err.errorType == ErrorType.DUPLICATE])
+    expectedMessages = collections.Counter({
+        "Table name 'Duplicates' is used by another table!": 2,
+        "Column name 'Col' is used by another column!": 2,
+        "Duplicate constraint: 'UNIQUE'": 2,
+        "Duplicate Foreign Key!": 2,
+    })
+
+    if duplicateMessages != expectedMessages:
+        raise Exception(f"Unexpected duplicate errors: {dict(duplicateMessages)}")
+
+    # Context is only rendered when it's used, and points at the right column
+    renderCount = []
+    def render_context():
+        renderCount.append(1)
+        return "Rendered"
+
+    lazyError = ValidationError(ErrorType.INVALID_VALUE, "Lazy", render_context)
+    if len(renderCount) != 0 or lazyError.context != "Rendered" or lazyError.context != "Rendered" or len(renderCount) != 1:
+        raise Exception("Error context was not rendered lazily and exactly once.")
+
+    columnErrors = [err for err in errors if err.errorMessage == "Column name 'Col' is used by another column!"]
+    if "Col TEXT" not in columnErrors[1].context.split("^^^")[0].splitlines()[-2]:
+        raise Exception(f"Error context indicates the wrong column:\n{columnErrors[1].context}")
+
+
+@group_test(allTestGroups, "Schema Validation", True)
+def test_datatype_affinity_and_validation():
+    expectedAffinities = {
+        "int": "INTEGER",
+        "BIGINT": "INTEGER",
+        "varchar(255)": "TEXT",
+        "Native Character(20)": "TEXT",
+        "DOUBLE PRECISION": "REAL",
+        "decimal(10,5)": "NUMERIC",
+        "BLOB": "BLOB",
+        "NotAType": None,
+    }
+
+    # Checks twice, so cached results are checked too
+    for i in range(2):
+        for datatype, affinity in expectedAffinities.items():
+            if DataValidation.resolve_affinity(datatype) != affinity:
+                raise Exception(f"Expected affinity {affinity} for '{datatype}', got {DataValidation.resolve_affinity(datatype)}.")
+
+            if DataValidation.validate_datatype(datatype) != (affinity != None):
+                raise Exception(f"Datatype '{datatype}' validated incorrectly.")
+
+        for constraint, valid in {"not null": True, "PRIMARY KEY AUTOINCREMENT": True, "default 0": True, "NOT A CONSTRAINT": False}.items():
+            if DataValidation.validate_constraint(constraint) != valid:
+                raise Exception(f"Constraint '{constraint}' validated incorrectly.")
+
+        for constraint, valid in {"set null": True, "NO ACTION": True, "DELETE": False}.items():
+            if DataValidation.validate_fkey_constraint(constraint) != valid:
+                raise Exception(f"Foreign key constraint '{constraint}' validated incorrectly.")
+
+
+@group_test(allTestGroups, "Schema Dict Serialization", True)
+def test_compact_objects_stay_compatible():
+    schema = DatabaseSchema.from_dict({"tables": [
+        {"name": "Owners", "columns": [{"name": "ID", "type": "INTEGER", "constraints": ["PRIMARY KEY"]}]},
+        {"name": "Pets", "columns": [{"name": "OwnerID", "type": "INTEGER", "constraints": ["NOT NULL", "UNIQUE"]}],
+         "foreign_keys": [{"local_name": "OwnerID", "table_name": "Owners", "foreign_name": "ID"}]}
+    ]})
+
+    # Constraints are stored as tuples, but serialize and display as lists
+    column = schema.get_table("Pets").get_column("OwnerID")
+    if column.to_dict()["constraints"] != ["NOT NULL", "UNIQUE"] or str(column) != "OwnerID INTEGER ['NOT NULL', 'UNIQUE']":
+        raise Exception(f"Column serializes differently: {column.to_dict()} / {str(column)}")
+
+    if column.copy().constraints is not column.constraints or not column.copy().compare_equivalence(column):
+        raise Exception("Copied column doesn't share its constraints.")
+
+    # Rebuilding from a dict (as the parse cache does) keeps the objects and relinks foreign keys
+    parsedSchema = DatabaseSchema.from_dict(schema.to_dict())
+    fKey = parsedSchema.get_table("Pets").foreignKeys[0]
+    if not parsedSchema.compare_equivalence(schema) or fKey.tableRef is not parsedSchema.get_table("Owners") or fKey.externalRef == None:
+        raise Exception("Schema rebuilt from a dict differs from the original.")
+
+
+@group_test(allTestGroups, "Schema Fingerprints", True)
+def test_fingerprints_follow_changes():
+    table = Table("Pets", [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column("Name", "TEXT", [])],
+                  [ForeignKey("ID", "Owners", "ID", "CASCADE", None)])
+
+    # Member order doesn't matter, names of the table itself don't either
+    reordered = Table("Animals", [Column("Name", "TEXT", []), Column("ID", "INTEGER", ["PRIMARY KEY"])],
+                      [ForeignKey("ID", "Owners", "ID", "CASCADE", None)])
+    if table.get_fingerprint() != reordered.get_fingerprint() or not table.compare_contents(reordered):
+        raise Exception("Tables with the same members have different contents.")
+
+    # Every way of changing a table through its methods or a migration resets its fingerprint
+    changes = [
+        lambda tbl: tbl.add_column(Column("Age", "INTEGER", [])),
+        lambda tbl: tbl.remove_column(tbl.get_column("Name")),
+        lambda tbl: tbl.rename_column(tbl.get_column("Name"), "Nickname"),
+        lambda tbl: tbl.add_foreign_key(ForeignKey("Name", "Owners", "Name", None, None)),
+        lambda tbl: tbl.remove_foreign_key(tbl.foreignKeys[0]),
+        TableMigration("Pets", "Pets", [ColumnMigration("Name", Column("Name", "TEXT", ["NOT NULL"]))], []).migrate_table,
+        TableMigration("Pets", "Pets", [], [FKeyMigration("ID->Owners.ID", ForeignKey("ID", "Owners", "ID", "SET NULL", None))]).migrate_table,
+    ]
+
+    for i, change in enumerate(changes):
+        changedTable = table.copy()
+        oldFingerprint = changedTable.get_fingerprint()
+        change(changedTable)
+
+        if changedTable.get_fingerprint() == oldFingerprint or changedTable.compare_contents(table):
+            raise Exception(f"Change #{i} left the table's fingerprint unchanged.")
+
+        if changedTable.get_fingerprint() != changedTable.copy().get_fingerprint():
+            raise Exception(f"Change #{i} left a stale fingerprint.")
+
+
+@group_test(allTestGroups, "Schema Validation", True)
+def test_index_serialization_and_validation():
+    table = Table("Pets", [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column("Name", "TEXT", [])], [], [
+            Index("IDX_PETS_NAME", ["Name COLLATE NOCASE DESC", "lower(Name)"], True, "Name IS NOT NULL"),
+            Index("IDX_PETS_ID", ["ID"])
+        ])
+
+    # Indexes round trip through dicts, and take part in comparisons
+    parsedTable = Table.from_dict(table.to_dict())
+    if not parsedTable.compare_equivalence(table):
+        raise Exception("Indexes don't serialize to the same table.")
+
+    parsedTable.indexes[0].unique = False
+    parsedTable.indexes[0].invalidate_fingerprint()
+    parsedTable.invalidate_fingerprint()
+    if parsedTable.compare_contents(table):
+        raise Exception("Tables with different indexes compare as equal.")
+
+    if DatabaseSchema([table]).validate_self() != []:
+        raise Exception(f"Valid indexes give errors: {[str(err) for err in DatabaseSchema([table]).validate_self()]}")
+
+    # Names are unique across every index and table, and every column a term uses must exist
+    invalidSchema = DatabaseSchema([
+        Table("Owners", [Column("ID", "INTEGER", [])], [], [Index("IDX_SHARED", ["ID"]), Index("Pets", ["ID"])]),
+        Table("Pets", [Column("ID", "INTEGER", [])], [], [
+            Index("IDX_SHARED", ["ID"]),
+            Index("IDX_MISSING", ["Missing DESC", "abs(Missing)"]),
+            Index("IDX_EMPTY", []),
+            Index("IDX_REPEATED", ["ID", "ID"]),
+            Index("sqlite_autoindex_Pets_1", ["ID"])
+        ]),
+    ])
+    errorMessages = collections.Counter([err.errorMessage for err in invalidSchema.validate_self()])
+    expectedMessages = collections.Counter({
+        "Index name 'IDX_SHARED' is used by another index or table!": 2,
+        "Index name 'Pets' is used by another index or table!": 1,
+        "Index is referencing a nonexistent column: 'Missing'!": 2,
+        "Index has no columns!": 1,
+        "Duplicate indexed column: 'ID'": 2,
+        "Index name 'sqlite_autoindex_Pets_1' is reserved by SQLite!": 1,
+    })
+
+    if errorMessages != expectedMessages:
+        raise Exception(f"Unexpected index errors: {dict(errorMessages)}")
+
+
+@group_test(allTestGroups, "Schema Validation", True)
+def test_index_expressions_and_where_validation():
+    table = Table("T", [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column("A", "INTEGER", []), Column("B", "TEXT", [])], [], [
+            Index("IDX_B", ["B"], False, "A IS NOT NULL"),
+            Index("IDX_EXPRESSION", ["lower(b) COLLATE NOCASE", "coalesce(\"A\", T.ID) DESC"], False, "B LIKE 'A%' AND CAST(A AS INTEGER) > 0")
+        ])
+    schema = DatabaseSchema([table])
+
+    if schema.validate_self() != []:
+        raise Exception(f"Valid index expressions give errors: {[str(err) for err in schema.validate_self()]}")
+
+    # Removing a column only used by the WHERE clause or an expression leaves the indexes invalid
+    migration = SchemaMigration(1, [TableMigration("T", "T", [ColumnMigration("A", None)], [])])
+    errorMessages = [err.errorMessage for err in migration.migrate_schema(schema)]
+    if errorMessages != ["Index is referencing a nonexistent column: 'A'!"] * 3:
+        raise Exception(f"Expected the removed column to be reported for each index using it, got: {errorMessages}")
@@ -0,0 +1,69 @@
+import copy
+import sqlite3
+from Schema import *
+from Migrations import *
+import SchemaVerification
+from .TestGroup import *
+from .SchemaCheckpointTests import load_example_migrations
+from .SQLExecutionTests import load_example_sql_migrations
+
+
+### TEST CASES ###
+@group_test(allTestGroups, "Schema Verification Tests", True)
+def test_verify_example_migrations():
+    migrations = load_example_migrations()
+    verifiedMigrations = SchemaVerification.verify_sql_migrations(migrations, load_example_sql_migrations())
+
+    if [verifiedMigration.migrationIndex for verifiedMigration in verifiedMigrations] != [migration.migrationIndex for migration in migrations]:
+        raise Exception(f"Expected every example migration to be verified, got {[verifiedMigration.migrationIndex for verifiedMigration in verifiedMigrations]}")
+
+
+@group_test(allTestGroups, "Schema Verification Tests", True)
+def test_verify_stops_at_first_mismatch():
+    migrations = load_example_migrations()
+
+    # Creates Pets without its PetName column
+    brokenSqlMigrations = copy.deepcopy(load_example_sql_migrations())
+    brokenStatements = brokenSqlMigrations[7]["sqlStatements"]
+    brokenStatements[4] = brokenStatements[4].replace("\n\tPetName VARCHAR(255),", "")
+
+    try:
+        SchemaVerification.verify_sql_migrations(migrations, brokenSqlMigrations)
+        raise Exception("Verification passed with a broken SQL migration.")
+    except SchemaVerification.VerificationError as err:
+        if err.migrationIndex != 7 or "Pets" not in str(err):
+            raise Exception(f"Expected migration #7 to fail on Pets, got #{err.migrationIndex}: {err}")
+
+        if [verifiedMigration.migrationIndex for verifiedMigration in err.verifiedMigrations] != list(range(7)):
+            raise Exception("Migrations before the broken one weren't all verified.")
+
+    # Missing SQL migrations and failing statements are reported for the migration they belong to
+    failingSqlMigrations = load_example_sql_migrations()
+    failingSqlMigrations[9] = dict(failingSqlMigrations[9], sqlStatements=["DROP TABLE NotATable;"])
+
+    for brokenSqlMigrations, expectedIndex in [(load_example_sql_migrations()[:3], 3), (failingSqlMigrations, 9)]:
+        try:
+            SchemaVerification.verify_sql_migrations(migrations, brokenSqlMigrations)
+            raise Exception("Verification passed with a broken SQL migration.")
+        except SchemaVerification.VerificationError as err:
+            if err.migrationIndex != expectedIndex:
+                raise Exception(f"Expected migration #{expectedIndex} to fail, got #{err.migrationIndex}: {err}")
+
+
+@group_test(allTestGroups, "Schema Verification Tests", True)
+def test_column_types_compared():
+    dbConn = sqlite3.connect(":memory:")
+    try:
+        dbConn.execute("CREATE TABLE Things (ID INTEGER PRIMARY KEY, Name varchar(255));")
+        table = Table("Things", [Column("ID", "INTEGER", ["PRIMARY KEY"]), Column("Name", "VARCHAR(255)", [])], [])
+        SchemaVerification.assert_database_matches_schema(dbConn, DatabaseSchema([table]))
+
+        table.columns[1].datatype = "TEXT"
+        try:
+            SchemaVerification.assert_database_matches_schema(dbConn, DatabaseSchema([table]))
+            raise Exception("A column with a different type wasn't noticed.")
+        except SchemaVerification.SchemaMismatchError:
+            pass
+
+    finally:
+        dbConn.close()
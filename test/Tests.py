@@ -1,39 +1,148 @@
+import io
+import time
+import contextlib
+import concurrent.futures
 from Migrations import *
 from Schema import *
 from ColouredText import *
 from .TestGroup import TestGroup, allTestGroups
 from . import SchemaTests
 from . import SQLMigrationTests
+from . import SchemaCheckpointTests
+from . import SQLExecutionTests
+from . import MigrationSquashTests
+from . import CreateMigrationTests
+from . import CombinedMigrationsTests
+from . import BenchmarkTests
+from . import ProfilingTests
+from . import SchemaVerificationTests
+from . import SchemaIntrospectionTests
+from . import ParseCacheTests
+from . import MigrationLoadingTests
 
 
-def run_all_tests():
+### CONSTANTS ###
+SLOWEST_TESTS_SHOWN = 5
 
-    for testGroup in allTestGroups.values():
-        run_test_group(testGroup)
 
 
-def run_test_group(testGroup: TestGroup):
-    print(pad_header(f"Testing: {testGroup.name}"))
+### CLASSES ###
+class TestCaseResult:
+    name: str
+    passed: bool
+    errorMessage: str
+    duration: float
+    output: str
+
+    def __init__(self, name: str, passed: bool, errorMessage: str, duration: float, output: str):
+        self.name = name
+        self.passed = passed
+        self.errorMessage = errorMessage
+        self.duration = duration
+        self.output = output
+
+
 
-    totalTests = len(testGroup.funcs)
-    failedTests = 0
+### FUNCTIONS ###
+def run_test_case(groupName: str, caseIndex: int, capturesOutput: bool) -> TestCaseResult:
 
-    for testCase in testGroup.funcs:
+    # Runs a test case by its position in its group, so it can be sent to another process
+    # (functions registered with group_test are looked up again after importing the tests there).
+    # Output is captured when the test runs alongside others, so it isn't interleaved.
+    testCase = allTestGroups[groupName].funcs[caseIndex]
+    output = io.StringIO()
+    errorMessage = None
+
+    startTime = time.perf_counter()
+    with contextlib.redirect_stdout(output) if capturesOutput else contextlib.nullcontext():
         try:
-            print(pad_ok(f"TESTING: {testCase.__name__}"))
             testCase()
-            print(pad_pass("PASSED."))
         except Exception as e:
-            print(pad_err(f"FAILED: {str(e)}"))
-            failedTests += 1
+            errorMessage = str(e)
+
+    return TestCaseResult(testCase.__name__, errorMessage == None, errorMessage, time.perf_counter() - startTime, output.getvalue())
+
+
+def print_test_result(result: TestCaseResult):
+    if result.passed:
+        print(pad_pass(f"PASSED. ({result.duration*1000:.1f}ms)"))
+    else:
+        print(pad_err(f"FAILED: {result.errorMessage} ({result.duration*1000:.1f}ms)"))
+
+
+def print_group_results(groupResults: list[TestCaseResult]):
+    failedTests = len([result for result in groupResults if not result.passed])
 
     print(pad_header(f"Results:"))
     if failedTests != 0:
-        print(pad_err(f"Failed {failedTests}/{totalTests} tests."))
+        print(pad_err(f"Failed {failedTests}/{len(groupResults)} tests."))
 
     else:
-        print(pad_success(f"No errors! Passed all {totalTests} tests!"))
+        print(pad_success(f"No errors! Passed all {len(groupResults)} tests!"))
 
     print("")
 
-    
+
+def run_all_tests(jobs: int = 1):
+
+    # Runs every registered test, using up to [jobs] processes. Results are printed in the same
+    # order either way. Each test must set up its own state (eg. an in-memory database), as
+    # tests may run at the same time.
+    startTime = time.perf_counter()
+
+    if jobs <= 1:
+        allResults = []
+        for testGroup in allTestGroups.values():
+            allResults.extend(run_test_group(testGroup))
+    else:
+        allResults = run_test_groups_in_parallel(list(allTestGroups.values()), jobs)
+
+    # Summarizes the whole run, along with the tests that took longest
+    failedCount = len([result for result in allResults if not result.passed])
+    print(pad_header(f"Ran {len(allResults)} tests in {(time.perf_counter()-startTime)*1000:.1f}ms using {max(1, jobs)} job(s)."))
+    for result in sorted(allResults, key=lambda result: result.duration, reverse=True)[:SLOWEST_TESTS_SHOWN]:
+        print(pad_ok(f"{result.duration*1000:8.1f}ms  {result.name}"))
+
+    if failedCount != 0:
+        print(pad_err(f"Failed {failedCount}/{len(allResults)} tests."))
+    else:
+        print(pad_success(f"No errors! Passed all {len(allResults)} tests!"))
+
+
+def run_test_group(testGroup: TestGroup) -> list[TestCaseResult]:
+    print(pad_header(f"Testing: {testGroup.name}"))
+
+    groupResults = []
+    for i, testCase in enumerate(testGroup.funcs):
+        print(pad_ok(f"TESTING: {testCase.__name__}"))
+        result = run_test_case(testGroup.name, i, False)
+        print_test_result(result)
+        groupResults.append(result)
+
+    print_group_results(groupResults)
+    return groupResults
+
+
+def run_test_groups_in_parallel(testGroups: list[TestGroup], jobs: int) -> list[TestCaseResult]:
+
+    # Every test case is submitted at once, then results are printed group by group as they finish
+    allResults = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        groupFutures = [[executor.submit(run_test_case, testGroup.name, i, True) for i in range(len(testGroup.funcs))]
+                        for testGroup in testGroups]
+
+        for testGroup, caseFutures in zip(testGroups, groupFutures):
+            print(pad_header(f"Testing: {testGroup.name}"))
+
+            groupResults = []
+            for future in caseFutures:
+                result = future.result()
+                print(pad_ok(f"TESTING: {result.name}"))
+                print(result.output, end="")
+                print_test_result(result)
+                groupResults.append(result)
+
+            print_group_results(groupResults)
+            allResults.extend(groupResults)
+
+    return allResults